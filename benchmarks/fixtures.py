@@ -0,0 +1,86 @@
+# Offline fixtures for the benchmarks
+#
+# Responses in the formats the collectors read, for any number of years of history:
+# the ECB SDMX history file, the Alpha Vantage BRENT json and the frame of a
+# yf.download call. They are generated from a fixed seed, so every run benchmarks
+# the same bytes, and kept in benchmarks/fixtures/ after the first run.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+END_DATE = pd.Timestamp('2025-06-30')
+SEED = 42
+
+
+def business_days(years:int) -> pd.DatetimeIndex:
+    return pd.bdate_range(END_DATE - pd.DateOffset(years=years), END_DATE)
+
+
+def random_walk(n:int, start:float, scale:float, seed:int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.abs(start + np.cumsum(rng.normal(0, scale, n))) + scale
+
+
+def _cached(name, build, mode=''):
+    path = os.path.join(FIXTURES_DIR, name)
+    if not os.path.exists(path):
+        os.makedirs(FIXTURES_DIR, exist_ok=True)
+        content = build()
+        with open(path, f'w{mode}') as f:
+            f.write(content)
+    with open(path, f'r{mode}') as f:
+        return f.read()
+
+
+def ecb_history_xml(years:int, currency:str='usd') -> bytes:
+    """an ECB <currency>.xml history file, oldest observation first"""
+    def build():
+        dates = business_days(years)
+        values = random_walk(len(dates), 1.1, 0.005, SEED)
+        observations = '\n'.join(
+            f'<Obs TIME_PERIOD="{date:%Y-%m-%d}" OBS_VALUE="{value:.4f}" OBS_STATUS="A" OBS_CONF="F"/>'
+            for date, value in zip(dates, values))
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<message:GenericData xmlns="http://www.ecb.europa.eu/vocabulary/stats/exr/1" '
+            'xmlns:message="http://www.SDMX.org/resources/SDMXML/schemas/v2_0/message">\n'
+            f'<message:Header><message:ID>EXR-HIST_{END_DATE:%Y-%m-%d}</message:ID></message:Header>\n'
+            f'<message:DataSet><Series FREQ="D" CURRENCY="{currency.upper()}" CURRENCY_DENOM="EUR">\n'
+            f'{observations}\n</Series></message:DataSet></message:GenericData>\n').encode()
+    return _cached(f'{currency}_{years}y.xml', build, mode='b')
+
+
+def alpha_vantage_json(years:int) -> dict:
+    """an Alpha Vantage BRENT reply, newest record first, with the '.' of missing values"""
+    def build():
+        dates = business_days(years)[::-1]
+        values = random_walk(len(dates), 80, 1.5, SEED + 1)
+        data = [{'date': f'{date:%Y-%m-%d}', 'value': '.' if i % 97 == 13 else f'{value:.2f}'}
+                for i, (date, value) in enumerate(zip(dates, values))]
+        return json.dumps({'name': 'Crude Oil Prices Brent', 'interval': 'daily',
+                           'unit': 'dollars per barrel', 'data': data})
+    return json.loads(_cached(f'brent_{years}y.json', build))
+
+
+def yfinance_download(years:int, tickers=('BZ=F', '^VIX')) -> pd.DataFrame:
+    """the frame of yf.download(tickers, group_by='column'): (price, ticker) columns"""
+    dates = business_days(years)
+    columns = pd.MultiIndex.from_product([['Close', 'High', 'Low', 'Open', 'Volume'], list(tickers)],
+                                         names=['Price', 'Ticker'])
+    data = {}
+    for i, ticker in enumerate(tickers):
+        close = random_walk(len(dates), 80 if i == 0 else 18, 1.2, SEED + 2 + i)
+        data[('Close', ticker)] = close
+        data[('High', ticker)] = close * 1.01
+        data[('Low', ticker)] = close * 0.99
+        data[('Open', ticker)] = close
+        data[('Volume', ticker)] = np.full(len(dates), 1000.0)
+    df = pd.DataFrame(data, index=pd.DatetimeIndex(dates, name='Date'))[columns]
+    # a few days where only one of the markets traded
+    df.iloc[5::50, df.columns.get_loc(('Close', tickers[-1]))] = np.nan
+    return df
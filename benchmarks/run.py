@@ -0,0 +1,239 @@
+# Benchmarks of the ingest, store and analytics hot paths
+#
+# Runs offline on the fixtures of benchmarks/fixtures.py, times every case
+# (median of --repeat runs) and measures its peak memory with tracemalloc,
+# then compares the results with the stored baseline:
+#
+#   python -m benchmarks.run                    # run and compare with benchmarks/baseline.json
+#   python -m benchmarks.run --save-baseline    # run and store the results as the new baseline
+#   python -m benchmarks.run --years 2 --only ecb
+#
+# exits with status 1 when a case is slower or uses more memory than the
+# baseline by more than --threshold.
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use('Agg')
+
+import pandas as pd
+from scrapy.http import XmlResponse
+
+from benchmarks import fixtures
+from core.analytics import SeriesMatrix, RollingCorrelation
+from core.data_handler import (HdfStore, CurrencyCollector, RestJsonCollector, MarketTickerCollector,
+                               save_to_hdf, load_from_hdf)
+from core.schema import SeriesSchema
+from scrape_finance.spiders.ecb_hist import EcbHistSpider
+from visualize import VisualizeBrent
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+YEARS = (2, 10, 30)
+TICKERS = {'BZ_oil': 'BZ=F', 'vix': '^VIX'}
+
+
+class RecordedRestJsonCollector(RestJsonCollector):
+    """RestJsonCollector that reads a recorded reply instead of calling the api"""
+    def __init__(self, reply, **kwargs):
+        super().__init__('https://www.alphavantage.co/query?function=BRENT', **kwargs)
+        self.reply = reply
+
+    def _request(self):
+        return self.reply
+
+
+def start_date(years):
+    return (fixtures.END_DATE - pd.DateOffset(years=years)).date()
+
+
+def parse_ecb(years):
+    response = XmlResponse(url='https://www.ecb.europa.eu/usd.xml', body=fixtures.ecb_history_xml(years))
+    spider = EcbHistSpider(currencies='usd')
+    return list(spider.parse(response, currency='USD'))
+
+
+def collected_series(years):
+    """the four series as the collectors build them, in their schemas"""
+    currency_df = CurrencyCollector(start_date=start_date(years))._items_frame(parse_ecb(years))
+    brent_df = RecordedRestJsonCollector(fixtures.alpha_vantage_json(years), column='brent_value',
+                                         start_date=start_date(years)).collect_values()
+    market = MarketTickerCollector(TICKERS, {name: start_date(years) for name in TICKERS})
+    frames = market.split_download(fixtures.yfinance_download(years))
+    series = {'currency': currency_df, 'brent': brent_df, **frames}
+    return {name: SeriesSchema(name).apply(df) if name != 'currency'
+            else SeriesSchema(name, column='usd_value').apply(df) for name, df in series.items()}
+
+
+def build_store(years, path, derived=False):
+    for name, df in collected_series(years).items():
+        save_to_hdf({'name': name, 'df': df}, path=path)
+    store = HdfStore(path)
+    if derived:
+        store.update_derived()
+    return store
+
+
+def cases(years, workdir):
+    """{case name: (setup, run)}. setup() prepares the input of a run and is not timed"""
+    path = os.path.join(workdir, f'bench_{years}y.h5')
+
+    def fresh_path():
+        if os.path.exists(path):
+            os.remove(path)
+        return path
+
+    def series_to_save():
+        return fresh_path(), collected_series(years)
+
+    def save_all(state):
+        path, series = state
+        for name, df in series.items():
+            save_to_hdf({'name': name, 'df': df}, path=path)
+
+    def stored(derived=False):
+        def setup():
+            return build_store(years, fresh_path(), derived=derived)
+        return setup
+
+    def visualize(store):
+        visual = VisualizeBrent(store=store)
+        visual.normalized_df
+        visual.rolling_weekly
+        visual.rolling_monthly
+        visual.rolling_volatility(window=20)
+        visual.correlation(volatility_window=30)
+        return visual
+
+    def analytics(store):
+        matrix = SeriesMatrix.from_store(store)
+        returns = matrix.returns()
+        matrix.normalized().rolling_mean(30)
+        returns.rolling_std(20)
+        returns.rolling_corr(30)
+        return returns.corr()
+
+    def rolling_correlation(store):
+        rolling = RollingCorrelation.compute(SeriesMatrix.from_store(store), window=90)
+        rolling.at(rolling.dates[-1])
+        return rolling.alerts(change=0.4, days=20, since=rolling.dates[0])
+
+    return {
+        'ecb_parse': (lambda: None, lambda _: parse_ecb(years)),
+        'ecb_frame': (lambda: parse_ecb(years),
+                      lambda items: CurrencyCollector(start_date=start_date(years))._items_frame(items)),
+        'alpha_vantage_frame': (lambda: fixtures.alpha_vantage_json(years),
+                                lambda reply: RecordedRestJsonCollector(reply, column='brent_value',
+                                                                        start_date=start_date(years)).collect_values()),
+        'yfinance_frame': (lambda: fixtures.yfinance_download(years),
+                           lambda data: MarketTickerCollector(TICKERS, {name: start_date(years) for name in TICKERS})
+                           .split_download(data)),
+        'hdf_save': (series_to_save, save_all),
+        'hdf_resave': (lambda: (build_store(years, fresh_path()).path, collected_series(years)), save_all),
+        'hdf_load': (stored(), lambda store: load_from_hdf(store.path)),
+        'visualize_pipeline': (stored(derived=True), visualize),
+        'analytics_matrix': (stored(derived=True), analytics),
+        'rolling_correlation': (stored(derived=True), rolling_correlation),
+    }
+
+
+def measure(setup, run, repeat):
+    """median and min seconds of run over repeat runs, and the peak MB of one more traced run"""
+    times = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            state = setup()
+            t0 = time.perf_counter()
+            run(state)
+            times.append(time.perf_counter() - t0)
+
+        state = setup()
+        tracemalloc.start()
+        run(state)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {'median_s': round(statistics.median(times), 5),
+            'min_s': round(min(times), 5),
+            'peak_mb': round(peak / 2**20, 3)}
+
+
+def compare(results, baseline, threshold):
+    """returns the regressions: [(case, metric, baseline value, value)]"""
+    regressions = []
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        for metric in ('median_s', 'peak_mb'):
+            base = baseline[case][metric]
+            # tiny values are dominated by noise
+            floor = 0.002 if metric == 'median_s' else 0.05
+            if result[metric] > max(base, floor) * (1 + threshold):
+                regressions.append((case, metric, base, result[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='offline benchmarks of the ingest, store and analytics paths')
+    parser.add_argument('--years', type=int, nargs='+', default=list(YEARS), help='years of history')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case')
+    parser.add_argument('--only', default=None, help='run only the cases whose name contains this')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown / memory growth, 0.25 = 25%%')
+    parser.add_argument('--output', default=None, help='also write the results to this json file')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='scrape_bench_')
+    results = {}
+    try:
+        for years in args.years:
+            for name, (setup, run) in cases(years, workdir).items():
+                case = f'{name}[{years}y]'
+                if args.only and args.only not in case:
+                    continue
+                results[case] = measure(setup, run, args.repeat)
+                result = results[case]
+                print(f'{case:<28} {result["median_s"] * 1000:>10.1f} ms  (min {result["min_s"] * 1000:.1f})'
+                      f'  peak {result["peak_mb"]:>8.2f} MB', flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f'baseline saved to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'no baseline at {args.baseline}, run with --save-baseline to create it')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for case, metric, base, value in regressions:
+        print(f'REGRESSION {case} {metric}: {base} -> {value} ({value / max(base, 1e-9) - 1:+.0%})')
+    if not regressions:
+        print(f'no regressions against {args.baseline} (threshold {args.threshold:.0%})')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
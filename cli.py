@@ -0,0 +1,228 @@
+# Command line entry point
+#
+#   python cli.py scrape                         # collect every source since its last stored date
+#   python cli.py backfill --start 2024-01-01    # collect again from a date, revised values are replaced
+#   python cli.py load --series brent vix --start 2025-01-01 --output brent_vix.csv
+#   python cli.py report --chart volatility --output volatility.png
+#   python cli.py report --chart rolling-correlation --window 90 --alerts 0.4
+#   python cli.py schedule                       # keep running, collect each source when it publishes
+#
+# Every subcommand imports only what it uses: the scrape path never loads matplotlib,
+# and `load` never loads scrapy or yfinance. Nothing runs at import time.
+
+import argparse
+import logging
+import os
+import sys
+
+
+STORES = ('hdf', 'arrow')
+CHARTS = ('volatility', 'brent-volatility', 'trend', 'trend-ytd', 'heatmap', 'volatility-heatmap',
+          'rolling-heatmap', 'rolling-correlation')
+
+
+def open_store(args):
+    if args.store == 'arrow':
+        from core.storage import ArrowStore, ARROW_PATH
+        return ArrowStore(args.path or ARROW_PATH)
+    from core.data_handler import HdfStore, DATA_PATH
+    return HdfStore(args.path or DATA_PATH)
+
+
+def select_sources(args):
+    """the sources of the csv, only the --series keys when given"""
+    from core.sources import load_sources, SOURCES_PATH
+    import core.data_handler  # registers the fetchers
+
+    sources = load_sources(args.sources or SOURCES_PATH)
+    if args.series:
+        unknown = set(args.series) - {source.key for source in sources}
+        if unknown:
+            raise SystemExit(f'unknown series: {", ".join(sorted(unknown))}')
+        sources = [source for source in sources if source.key in args.series]
+    return sources
+
+
+def print_collected(df_list):
+    """one line per source, returns 1 if any source failed"""
+    failed = False
+    for df_dict in df_list:
+        if df_dict.get('stored'):
+            rows = 'written while collected'
+        else:
+            rows = f'{len(df_dict["df"])} rows' if df_dict['df'] is not None else '-'
+        print(f'{df_dict["name"]:<12} {df_dict["status"]:<11} {df_dict["elapsed"]:>8.2f}s  {rows}'
+              + (f'  {df_dict["error"]}' if df_dict['error'] else ''))
+        failed = failed or df_dict['status'] in ('error', 'timeout')
+    return 1 if failed else 0
+
+
+def scrape(args):
+    from core.data_handler import scrape_orchestrator
+    store = open_store(args)
+    # a running scheduler may be writing the store, wait for its run to end
+    with store.transaction(timeout=args.lock_timeout):
+        df_list = scrape_orchestrator(os.getenv('ALPHA_VANTAGE_API_KEY'), concurrent=not args.sequential,
+                                      sources=select_sources(args), store=store)
+    return print_collected(df_list)
+
+
+def backfill(args):
+    from core.data_handler import backfill as run_backfill
+    store = open_store(args)
+    with store.transaction(timeout=args.lock_timeout):
+        df_list = run_backfill(os.getenv('ALPHA_VANTAGE_API_KEY'), args.start, concurrent=not args.sequential,
+                               sources=select_sources(args), store=store)
+    return print_collected(df_list)
+
+
+def load(args):
+    import pandas as pd
+
+    store = open_store(args)
+    if args.combined:
+        df = store.load_combined(args.start, args.end)
+        if df is None:
+            raise SystemExit('the store has no combined table yet, run `scrape` first')
+        if args.series:
+            df = df[[column for column in df.columns if column.rsplit('_', 1)[0] in args.series]]
+    else:
+        names = [name for name in store.series() if not args.series or name in args.series]
+        frames = store.load(args.start, args.end, series=names)
+        for name, frame in zip(names, frames):
+            span = f'{frame.index.min().date()} to {frame.index.max().date()}' if len(frame) else 'empty'
+            print(f'{name:<12} {len(frame):>7} rows  {span}  {", ".join(frame.columns)}')
+        df = pd.concat(frames, axis=1, join='outer', sort=True) if frames else pd.DataFrame()
+
+    if args.output:
+        if args.output.endswith('.parquet'):
+            df.to_parquet(args.output)
+        else:
+            df.to_csv(args.output)
+        print(f'{len(df)} rows written to {args.output}')
+    elif args.combined:
+        print(df.tail(args.tail).to_string())
+    return 0
+
+
+def report(args):
+    import matplotlib
+    if args.output:
+        # no window is opened, the chart goes to the file
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from visualize import VisualizeBrent
+
+    visual = VisualizeBrent(start=args.start, end=args.end, store=open_store(args))
+    draw = {'volatility': visual.recent_volatility_combined,
+            'brent-volatility': visual.recent_volatility_brent,
+            'trend': visual.long_term_trend_generator,
+            'trend-ytd': lambda: visual.long_term_trend_generator(ytd=True),
+            'heatmap': visual.heatmap_generator,
+            'volatility-heatmap': visual.heatmap_volatility,
+            'rolling-heatmap': lambda: visual.heatmap_rolling(window=args.window),
+            'rolling-correlation': lambda: visual.rolling_correlation_chart(window=args.window)}[args.chart]
+    if args.alerts is not None:
+        alerts = visual.correlation_alerts(window=args.window, change=args.alerts, days=args.alert_days)
+        for alert in alerts.itertuples():
+            print(f'{alert.date.date()} {alert.a} / {alert.b}: correlation {alert.previous:+.2f} -> '
+                  f'{alert.correlation:+.2f} in {args.alert_days} days')
+        if alerts.empty:
+            print(f'no {args.window} days correlation moved by {args.alerts} or more in {args.alert_days} days')
+    draw()
+    if args.output:
+        plt.gcf().savefig(args.output, bbox_inches='tight')
+        print(f'{args.chart} chart saved to {args.output}')
+    else:
+        plt.show()
+    return 0
+
+
+def schedule(args):
+    import signal
+    from core.scheduler import Scheduler
+
+    scheduler = Scheduler(os.getenv('ALPHA_VANTAGE_API_KEY'), store=open_store(args), sources=select_sources(args),
+                          margin=args.margin, retries=args.retries, backoff=args.backoff, lock_timeout=args.lock_timeout,
+                          concurrent=not args.sequential)
+    if args.dry_run:
+        scheduler.schedule()
+        for job in scheduler.jobs:
+            print(f'{job.cadence.text:<32} next run {job.due.isoformat(timespec="minutes")}  '
+                  f'{", ".join(source.key for source in job.sources)}')
+        return 0
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: scheduler.stop())
+    scheduler.run_forever(run_now=args.run_now)
+    return 0
+
+
+def parser():
+    store_args = argparse.ArgumentParser(add_help=False)
+    store_args.add_argument('--store', choices=STORES, default='hdf', help='storage backend, Default=hdf')
+    store_args.add_argument('--path', default=None, help='hd5 file or arrow folder, Default=the data folder')
+
+    range_args = argparse.ArgumentParser(add_help=False)
+    range_args.add_argument('--start', default=None, help='first date, e.g. 2024-01-01')
+    range_args.add_argument('--end', default=None, help='last date')
+
+    source_args = argparse.ArgumentParser(add_help=False)
+    source_args.add_argument('--series', nargs='+', default=None, help='store keys, e.g. brent vix. Default=all')
+    source_args.add_argument('--sources', default=None, help='sources csv, Default=data/urls.csv')
+    source_args.add_argument('--sequential', action='store_true', help='fetch one source after the other')
+    source_args.add_argument('--lock-timeout', type=float, default=600,
+                             help='seconds to wait while another run writes the store, Default=600')
+
+    main_parser = argparse.ArgumentParser(prog='cli.py', description='collects and charts oil market data')
+    main_parser.add_argument('--log-level', default=os.getenv('SCRAPE_LOG_LEVEL', 'INFO'),
+                             help='level of the core.* loggers, DEBUG shows samples of the collected frames')
+    commands = main_parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('scrape', parents=[store_args, source_args],
+                                  help='collect every source since its last stored date')
+    command.set_defaults(run=scrape)
+
+    command = commands.add_parser('backfill', parents=[store_args, source_args],
+                                  help='collect the sources again from a date, revised values replace stored ones')
+    command.add_argument('--start', required=True, help='first date to collect, e.g. 2024-01-01')
+    command.set_defaults(run=backfill)
+
+    command = commands.add_parser('load', parents=[store_args, range_args], help='read the stored series')
+    command.add_argument('--series', nargs='+', default=None, help='store keys, e.g. brent vix. Default=all')
+    command.add_argument('--combined', action='store_true', help='read the combined table instead of the series')
+    command.add_argument('--output', default=None, help='write to a .csv or .parquet file')
+    command.add_argument('--tail', type=int, default=10, help='rows of the combined table to print')
+    command.set_defaults(run=load)
+
+    command = commands.add_parser('report', parents=[store_args, range_args], help='draw a chart')
+    command.add_argument('--chart', choices=CHARTS, default='volatility')
+    command.add_argument('--output', default=None, help='save to this image file instead of showing it')
+    command.add_argument('--window', type=int, default=90, help='days of the rolling correlation charts, Default=90')
+    command.add_argument('--alerts', type=float, default=None, metavar='CHANGE',
+                         help='also print the pairs whose rolling correlation moved by CHANGE (e.g. 0.4) or more')
+    command.add_argument('--alert-days', type=int, default=20, help='days the --alerts change is measured over')
+    command.set_defaults(run=report)
+
+    command = commands.add_parser('schedule', parents=[store_args, source_args],
+                                  help='keep running and collect every source after it publishes')
+    command.add_argument('--margin', type=float, default=1800, help='seconds after the publication time, Default=1800')
+    command.add_argument('--retries', type=int, default=3, help='retries of a source per publication, Default=3')
+    command.add_argument('--backoff', type=float, default=600, help='seconds before the first retry, Default=600')
+    command.add_argument('--run-now', action='store_true', help='collect every source once at start')
+    command.add_argument('--dry-run', action='store_true', help='print the next runs and exit')
+    command.set_defaults(run=schedule)
+    return main_parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    # the api key and the SCRAPE_* settings may come from a .env file
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s: %(message)s')
+    logging.getLogger('core').setLevel(args.log_level.upper())
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
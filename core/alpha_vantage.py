@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.metrics import count
+from core.replay import install as install_replay
+
+
+BASE_URL = 'https://www.alphavantage.co/query'
+CACHE_DIR = './data/cache/alpha_vantage'
+
+# keys of a json reply that hold a message instead of data
+THROTTLE_KEYS = ('Note', 'Information')
+
+
+class AlphaVantageClient:
+    """client for the Alpha Vantage query api.
+    uses one pooled session with retries on 429/5xx replies, retries with backoff when the
+    api answers with a throttling message, and keeps every reply in an on-disk cache.
+    a cached reply is reused until it expires, so repeated runs within a day make no calls.
+    when the api cannot be reached or keeps throttling, the last cached reply is returned.
+      args:
+        api_key: str Alpha Vantage API Key
+        cache_dir: folder for the cached replies
+        ttl: seconds a cached reply is fresh. Default=None, fresh for the rest of the (UTC) day
+        retries: number of retries on throttling replies
+        backoff: seconds to wait before the first retry, doubled on each retry
+        timeout: seconds per request"""
+
+    def __init__(self, api_key, cache_dir=CACHE_DIR, ttl=None, retries:int=2, backoff:float=15, timeout=30):
+        self.api_key = api_key
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.calls = 0
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=('GET',), respect_retry_after_header=True)
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retry))
+        install_replay(self.session)
+
+    def _cache_path(self, params):
+        # the api key is not part of the cache key
+        name = '_'.join(f'{key}-{value}' for key, value in sorted(params.items())).lower()
+        digest = hashlib.sha1(name.encode()).hexdigest()[:8]
+        return os.path.join(self.cache_dir, f'{params["function"].lower()}_{digest}.json')
+
+    def _read_cache(self, path):
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_cache(self, path, payload, headers):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {'fetched_at': datetime.now(timezone.utc).isoformat(),
+                 'etag': headers.get('ETag'),
+                 'last_modified': headers.get('Last-Modified'),
+                 'payload': payload}
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def _is_fresh(self, entry):
+        fetched_at = datetime.fromisoformat(entry['fetched_at'])
+        now = datetime.now(timezone.utc)
+        if self.ttl is None:
+            return fetched_at.date() == now.date()
+        return (now - fetched_at).total_seconds() < self.ttl
+
+    @staticmethod
+    def is_throttled(payload):
+        return not isinstance(payload, dict) or any(key in payload for key in THROTTLE_KEYS)
+
+    def query(self, function, use_cache:bool=True, revalidate:bool=False, **params):
+        """calls an api function, e.g. query('BRENT', interval='daily').
+        revalidate: call the api even if the cached reply is fresh, e.g. to retry a series
+          that was published late. the cached reply is still sent for revalidation and is the fallback
+        returns the json reply as a dict, or None if there is neither a reply nor a cached one"""
+        params = {'function': function, **params}
+        path = self._cache_path(params)
+        cached = self._read_cache(path) if use_cache else None
+        if cached is not None and not revalidate and self._is_fresh(cached):
+            return cached['payload']
+
+        # conditional request, a 304 reply revalidates the cached payload
+        headers = {}
+        if cached is not None:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        wait = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                self.calls += 1
+                r = self.session.get(BASE_URL, params={**params, 'apikey': self.api_key},
+                                     headers=headers, timeout=self.timeout)
+                if r.status_code == 304 and cached is not None:
+                    self._write_cache(path, cached['payload'], r.headers)
+                    return cached['payload']
+                r.raise_for_status()
+                count('bytes', len(r.content), function.lower())
+                payload = r.json()
+            except (requests.RequestException, ValueError) as exc:
+                # the exception text holds the url, and with it the api key
+                print(f'alpha vantage {function} request failed: {type(exc).__name__}')
+                break
+
+            if not self.is_throttled(payload):
+                self._write_cache(path, payload, r.headers)
+                return payload
+
+            message = next((payload[key] for key in THROTTLE_KEYS if key in payload), payload)
+            print(f'alpha vantage {function} throttled (attempt {attempt + 1}): {message}')
+            if attempt < self.retries:
+                count('retries', 1, function.lower())
+                time.sleep(wait)
+                wait *= 2
+
+        if cached is not None:
+            print(f'alpha vantage {function}: using cached reply from {cached["fetched_at"]}')
+            return cached['payload']
+        return None
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(api_key, **kwargs) -> AlphaVantageClient:
+    """returns a shared client per api key, so the pooled session is reused across runs"""
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = AlphaVantageClient(api_key, **kwargs)
+    return _clients[api_key]
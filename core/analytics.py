@@ -0,0 +1,442 @@
+# Analytics on a matrix of aligned series
+#
+# The series are held as one C-contiguous float64 array of shape (days, series) with a shared
+# date axis. Every statistic is computed for all series and all window ends at once with array
+# operations: sliding means, variances and cross products from cumulative sums, the full-period
+# correlation from matrix products, so the cost does not grow with the window and there is no
+# per-window or per-column python loop.
+#
+# Missing values (NaN) follow pandas: a window that holds one gives NaN for that series
+# (for that pair, in a correlation), and the full-period correlation uses the days both series have.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def _window_sums(values, window:int):
+    """sums over the last `window` rows of every row, from cumulative sums.
+    NaN for the rows before the first full window"""
+    if window < 1 or window > len(values):
+        return np.full(values.shape, np.nan)
+    out = np.cumsum(values, axis=0, dtype=np.float64)
+    # numpy buffers the overlapping operands, so this reads the cumulative sums before they change
+    out[window:] -= out[:-window]
+    out[:window - 1] = np.nan
+    return out
+
+
+def _incomplete(missing, window:int, shape):
+    """True where the window ending at a row is not full yet or holds a missing value.
+    missing is None when no value is missing"""
+    incomplete = np.ones(shape, dtype=bool)
+    if window < 1 or window > shape[0]:
+        return incomplete
+    if missing is None:
+        incomplete[window - 1:] = False
+        return incomplete
+    counts = np.cumsum(missing, axis=0, dtype=np.int32)
+    incomplete[window - 1] = counts[window - 1] > 0
+    np.greater(counts[window:], counts[:-window], out=incomplete[window:])
+    return incomplete
+
+
+def _blank_incomplete(out, missing, window:int):
+    """sets the rows of out whose window is not full or holds a missing value to NaN"""
+    out[:window - 1] = np.nan
+    if missing is not None:
+        out[_incomplete(missing, window, out.shape)] = np.nan
+
+
+def _constant_windows(values, window:int):
+    """True where no row of the window ending at a row differs from the row before.
+    rounding can leave a constant window a tiny variance instead of 0, so they are found exactly"""
+    changed = np.zeros(values.shape)
+    changed[1:] = values[1:] != values[:-1]
+    return _window_sums(changed, window - 1) == 0
+
+
+def _centered(values):
+    """(values minus the mean of their column with 0 for missing values, missing mask or None, column means).
+    sums of centered values stay small, so differences of their cumulative sums keep their precision"""
+    missing = np.isnan(values)
+    if not missing.any():
+        center = values.mean(axis=0) if len(values) else np.zeros(values.shape[1])
+        return values - center, None, center
+    counts = (~missing).sum(axis=0)
+    center = np.where(missing, 0.0, values).sum(axis=0) / np.maximum(counts, 1)
+    return np.where(missing, 0.0, values - center), missing, center
+
+
+def returns(values):
+    """daily change of every series, values[t] / values[t-1] - 1. the first row is NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty_like(values)
+    out[:1] = np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(values[1:], values[:-1], out=out[1:])
+    out[1:] -= 1
+    return out
+
+
+def normalized(values, factor:float=100):
+    """min-max scaling of every series to 0..factor over the whole period"""
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        low = np.nanmin(values, axis=0) if len(values) else np.zeros(values.shape[1])
+        high = np.nanmax(values, axis=0) if len(values) else np.zeros(values.shape[1])
+        return (values - low) / (high - low) * factor
+
+
+def rolling_mean(values, window:int):
+    """mean over the last window rows of every row and series, NaN like pandas rolling(window).mean()"""
+    values = np.asarray(values, dtype=np.float64)
+    centered, missing, center = _centered(values)
+    means = _window_sums(centered, window) / window + center
+    _blank_incomplete(means, missing, window)
+    return means
+
+
+def rolling_std(values, window:int, ddof:int=1):
+    """standard deviation over the last window rows of every row and series,
+    NaN like pandas rolling(window).std(). a constant window is exactly 0"""
+    values = np.asarray(values, dtype=np.float64)
+    centered, missing, _ = _centered(values)
+    sums = _window_sums(centered, window)
+    # the variance is built in place, these matrices are as large as the input
+    stds = _window_sums(np.square(centered, out=centered), window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        np.square(sums, out=sums)
+        sums /= window
+        stds -= sums
+        stds /= window - ddof
+    np.clip(stds, 0, None, out=stds)
+    if window > 1:
+        stds[_constant_windows(values, window)] = 0
+    np.sqrt(stds, out=stds)
+    _blank_incomplete(stds, missing, window)
+    return stds
+
+
+def rolling_corr(values, window:int, pairs=None, dtype=np.float64, block_rows:int=None):
+    """correlation matrix of the series over the last window rows of every row, shape (days, series, series).
+    a pair is NaN until the window is full, while either series has a missing value in it,
+    or when either series is constant over it, like pandas rolling(window).corr() pairwise.
+    the sums of the cross products come from cumulative sums, a block of rows at a time.
+      args:
+        pairs: (rows, columns) index arrays of the pairs to compute, e.g. np.triu_indices(k, 1).
+          the result is then (days, pairs). Default=None, every pair
+        dtype: of the result, e.g. np.float32 for a compact history
+        block_rows: rows per block. Default=None, about 16M cross products per block"""
+    values = np.asarray(values, dtype=np.float64)
+    days, k = values.shape
+    if pairs is None:
+        left, right = np.repeat(np.arange(k), k), np.tile(np.arange(k), k)
+    else:
+        left, right = (np.asarray(index) for index in pairs)
+    out = np.full((days, len(left)), np.nan, dtype=dtype)
+
+    if 2 <= window <= days and len(left):
+        centered, missing, _ = _centered(values)
+        sums = _window_sums(centered, window)
+        variance = _window_sums(np.square(centered), window) - sums * sums / window
+        constant = _constant_windows(values, window)
+        invalid = _incomplete(missing, window, variance.shape) | constant | (variance <= 0)
+        scale = np.sqrt(np.clip(variance, 0, None))
+
+        block_rows = block_rows or max(2**24 // len(left), window)
+        for start in range(window - 1, days, block_rows):
+            end = min(start + block_rows, days)
+            # the rows of the windows that end in the block
+            rows = centered[start - window + 1:end]
+            products = rows[:, left] * rows[:, right]
+            np.cumsum(products, axis=0, out=products)
+            products[window:] -= products[:-window]
+            cov = products[window - 1:]
+            cov -= sums[start:end, left] * sums[start:end, right] / window
+            with np.errstate(invalid='ignore', divide='ignore'):
+                cov /= scale[start:end, left] * scale[start:end, right]
+            cov[invalid[start:end, left] | invalid[start:end, right]] = np.nan
+            np.clip(cov, -1, 1, out=out[start:end])
+
+    return out if pairs is not None else out.reshape(days, k, k)
+
+
+def corr(values):
+    """correlation matrix of the series over the whole period. every pair uses the rows
+    where both have a value, like pandas DataFrame.corr()"""
+    values = np.asarray(values, dtype=np.float64)
+    centered, missing, _ = _centered(values)
+    present = np.ones(values.shape) if missing is None else (~missing).astype(np.float64)
+    # per pair, over the rows both have: count, sums, sums of squares and of products
+    n = present.T @ present
+    sum_x = centered.T @ present
+    sum_xx = (centered * centered).T @ present
+    sum_xy = centered.T @ centered
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sum_xy - sum_x * sum_x.T / n
+        var_x = sum_xx - sum_x * sum_x / n
+        result = cov / np.sqrt(var_x * var_x.T)
+    result[(n < 2) | (var_x <= 0) | (var_x.T <= 0)] = np.nan
+    return np.clip(result, -1, 1)
+
+
+class SeriesMatrix:
+    """aligned series as one C-contiguous float64 matrix, one row per date and one column per series,
+    with the statistics of core.analytics computed for all series at once.
+    build it from a frame (e.g. the combined table) or from a store, and turn results back
+    into frames with to_frame.
+      args:
+        values: (days, series) array
+        dates: the date of each row
+        columns: the name of each series"""
+
+    def __init__(self, values, dates, columns):
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+        self.dates = pd.DatetimeIndex(dates, name='date')
+        self.columns = list(columns)
+        if self.values.shape != (len(self.dates), len(self.columns)):
+            raise ValueError(f'values of shape {self.values.shape} do not match '
+                             f'{len(self.dates)} dates and {len(self.columns)} columns')
+
+    @classmethod
+    def from_frame(cls, df):
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        return cls(df.to_numpy(dtype=np.float64), df.index, df.columns)
+
+    @classmethod
+    def from_store(cls, store, start=None, end=None, columns:list=None):
+        """the combined table of a store, or its series joined on date and forward filled
+        when the table is not built yet. optionally only some columns"""
+        df = store.load_combined(start=start, end=end)
+        if df is None:
+            frames = store.load(start=start, end=end)
+            df = frames[0].join(frames[1:], how='outer').sort_index().ffill().bfill()
+        return cls.from_frame(df if columns is None else df[columns])
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __repr__(self):
+        span = f'{self.dates[0].date()} to {self.dates[-1].date()}' if len(self) else 'empty'
+        return f'SeriesMatrix({len(self)} days x {len(self.columns)} series, {span})'
+
+    def select(self, columns:list):
+        """the matrix of some of the series"""
+        index = [self.columns.index(column) for column in columns]
+        return SeriesMatrix(self.values[:, index], self.dates, columns)
+
+    def to_frame(self, values=None):
+        """a DataFrame of values (Default=None, the series themselves), shaped like the matrix.
+        the frame is a view of the array, not a copy"""
+        return pd.DataFrame(self.values if values is None else values, index=self.dates, columns=self.columns,
+                            copy=False)
+
+    def returns(self):
+        return SeriesMatrix(returns(self.values), self.dates, self.columns)
+
+    def normalized(self, factor:float=100):
+        return SeriesMatrix(normalized(self.values, factor), self.dates, self.columns)
+
+    def rolling_mean(self, window:int):
+        return SeriesMatrix(rolling_mean(self.values, window), self.dates, self.columns)
+
+    def rolling_std(self, window:int):
+        return SeriesMatrix(rolling_std(self.values, window), self.dates, self.columns)
+
+    def rolling_corr(self, window:int):
+        """(days, series, series) correlation matrices of the windows ending on each date"""
+        return rolling_corr(self.values, window)
+
+    def corr(self):
+        """the correlation matrix over the whole period, as a DataFrame"""
+        return pd.DataFrame(corr(self.values), index=self.columns, columns=self.columns)
+
+
+class RollingCorrelation:
+    """correlation matrices of the daily % change of the series, one for the window ending on every date.
+    the matrices are symmetric with ones on the diagonal, so only the pairs above the diagonal are kept,
+    as float32: an array of shape (days, pairs), a quarter of the full float64 (days, series, series) array.
+    look up a date with at(), a pair over time with pair(), the full array with cube().
+    compute() builds the history from cumulative sums of the cross products; update() then adds new days one at a time
+    with the incremental covariance of core.rolling.RollingWindow, O(series^2) per day.
+      args:
+        window: days per window
+        dates: the window end dates
+        columns: the series
+        values: (days, pairs) correlations of the pairs in the order of pairs()"""
+
+    def __init__(self, window:int, dates, columns, values=None):
+        self.window = window
+        self.dates = pd.DatetimeIndex(dates, name='date')
+        self.columns = list(columns)
+        self.upper = np.triu_indices(len(self.columns), 1)
+        n_pairs = len(self.upper[0])
+        self.values = (np.full((len(self.dates), n_pairs), np.nan, dtype=np.float32) if values is None
+                       else np.ascontiguousarray(values, dtype=np.float32))
+        if self.values.shape != (len(self.dates), n_pairs):
+            raise ValueError(f'values of shape {self.values.shape} do not match '
+                             f'{len(self.dates)} dates and {n_pairs} pairs')
+        # the last values and the current window, for update()
+        self.last_row = None
+        self.rolling = None
+
+    @classmethod
+    def compute(cls, matrix:SeriesMatrix, window:int=30):
+        """the rolling correlations of the daily % change of every series in matrix"""
+        from core.rolling import RollingWindow
+
+        changes = returns(matrix.values)
+        # a change from a zero price is treated as missing, like in update(), instead of an inf
+        # that would spoil the cumulative sums of every later window
+        changes[~np.isfinite(changes)] = np.nan
+        result = cls(window, matrix.dates, matrix.columns)
+        result.values = rolling_corr(changes, window, pairs=result.upper, dtype=np.float32)
+        if len(matrix):
+            result.last_row = matrix.values[-1].copy()
+            result.rolling = RollingWindow(window, len(result.columns))
+            # the first row has no change
+            for row in changes[max(len(changes) - window, 1):]:
+                result.rolling.push(row)
+        return result
+
+    def update(self, matrix:SeriesMatrix) -> int:
+        """adds the days of matrix after the last date, one incremental update per day.
+        matrix holds the same series; rows up to the last date are skipped, so it may overlap.
+        returns the number of days added"""
+        from core.rolling import RollingWindow
+
+        if list(matrix.columns) != self.columns:
+            raise ValueError('update() needs the series the correlations were computed for, '
+                             f'got {matrix.columns}, expected {self.columns}')
+        new = matrix.dates > self.dates[-1] if len(self.dates) else np.ones(len(matrix), dtype=bool)
+        rows = matrix.values[new]
+        if not len(rows):
+            return 0
+        if self.rolling is None:
+            self.rolling = RollingWindow(self.window, len(self.columns))
+        added = np.empty((len(rows), self.values.shape[1]), dtype=np.float32)
+        for i, row in enumerate(rows):
+            # the first day has no change, its window is not full
+            if self.last_row is not None:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    change = row / self.last_row - 1
+                change[~np.isfinite(change)] = np.nan
+                self.rolling.push(change)
+            self.last_row = row
+            corr = self.rolling.corr()
+            if self.rolling.full:
+                # like compute(), a series that is constant over the window has no correlation
+                constant = np.ptp(np.array(self.rolling.rows), axis=0) == 0
+                corr[constant, :] = corr[:, constant] = np.nan
+            with np.errstate(invalid='ignore'):
+                added[i] = np.clip(corr[self.upper], -1, 1)
+        self.values = np.concatenate([self.values, added])
+        self.dates = self.dates.append(matrix.dates[new])
+        return len(rows)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __repr__(self):
+        span = f'{self.dates[0].date()} to {self.dates[-1].date()}' if len(self) else 'empty'
+        return f'RollingCorrelation({self.window} days, {len(self.columns)} series, {span})'
+
+    def pairs(self) -> list:
+        """the (series, series) pairs of the columns of values"""
+        return [(self.columns[i], self.columns[j]) for i, j in zip(*self.upper)]
+
+    def _pair_index(self, a, b):
+        i, j = sorted((self.columns.index(a), self.columns.index(b)))
+        if i == j:
+            raise ValueError(f'{a} is paired with itself')
+        k = len(self.columns)
+        # position of (i, j) in the row-major upper triangle
+        return i * (2 * k - i - 1) // 2 + j - i - 1
+
+    def _row(self, date):
+        """the row of the last date up to date"""
+        row = self.dates.searchsorted(pd.Timestamp(date), side='right') - 1
+        if row < 0:
+            raise KeyError(f'no correlations up to {date}, the first date is {self.dates[0].date()}')
+        return row
+
+    def at(self, date=None) -> pd.DataFrame:
+        """the correlation matrix of the window ending on date, or the last date before it.
+        Default=None, the last date"""
+        row = len(self) - 1 if date is None else self._row(date)
+        k = len(self.columns)
+        corr = np.eye(k)
+        corr[self.upper] = self.values[row]
+        corr[self.upper[1], self.upper[0]] = self.values[row]
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def pair(self, a, b, start=None, end=None) -> pd.Series:
+        """the correlation of series a and b over time, optionally only a date window"""
+        series = pd.Series(self.values[:, self._pair_index(a, b)], index=self.dates, name=f'{a}~{b}')
+        return series.loc[start:end]
+
+    def to_frame(self) -> pd.DataFrame:
+        """one column per pair, named 'a~b'"""
+        return pd.DataFrame(self.values, index=self.dates, columns=[f'{a}~{b}' for a, b in self.pairs()])
+
+    def cube(self, start=None, end=None) -> np.ndarray:
+        """the full (days, series, series) float32 matrices, optionally only a date window"""
+        rows = slice(None if start is None else self.dates.searchsorted(pd.Timestamp(start)),
+                     None if end is None else self.dates.searchsorted(pd.Timestamp(end), side='right'))
+        values = self.values[rows]
+        k = len(self.columns)
+        cube = np.empty((len(values), k, k), dtype=np.float32)
+        cube[:, self.upper[0], self.upper[1]] = values
+        cube[:, self.upper[1], self.upper[0]] = values
+        cube[:, np.arange(k), np.arange(k)] = 1
+        return cube
+
+    def alerts(self, change:float=0.4, days:int=20, since=None) -> pd.DataFrame:
+        """the pairs whose correlation moved by at least change within the last days,
+        on the last date, or on every date from since.
+        returns a frame of date, a, b, correlation, previous (days before) and change, largest moves first"""
+        first = len(self) - 1 if since is None else self.dates.searchsorted(pd.Timestamp(since))
+        # the first date that has a correlation days before it
+        first = max(first, days)
+        moved = self.values[first:] - self.values[first - days:len(self) - days]
+        with np.errstate(invalid='ignore'):
+            rows, pairs = np.nonzero(np.abs(moved) >= change)
+        a, b = self.upper[0][pairs], self.upper[1][pairs]
+        df = pd.DataFrame({'date': self.dates[first + rows],
+                           'a': np.asarray(self.columns, dtype=object)[a],
+                           'b': np.asarray(self.columns, dtype=object)[b],
+                           'correlation': self.values[first + rows, pairs],
+                           'previous': self.values[first + rows - days, pairs],
+                           'change': moved[rows, pairs]})
+        return df.reindex(df['change'].abs().sort_values(ascending=False).index).reset_index(drop=True)
+
+    def save(self, path):
+        """writes the correlations and the state of update() to a .npz file, replaced at once"""
+        from core.storage import replace_durably
+
+        state = self.rolling.to_dict() if self.rolling is not None else None
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, values=self.values, dates=self.dates.to_numpy(), columns=np.array(self.columns),
+                     window=self.window, last_row=self.last_row if self.last_row is not None else np.array([]),
+                     rolling=np.array(json.dumps(state)))
+        replace_durably(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """the saved correlations, None if there are none at path"""
+        from core.rolling import RollingWindow
+
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as saved:
+            result = cls(int(saved['window']), saved['dates'], saved['columns'].tolist(),
+                         saved['values'])
+            result.last_row = saved['last_row'] if len(saved['last_row']) else None
+            state = json.loads(str(saved['rolling']))
+        result.rolling = RollingWindow.from_dict(state) if state is not None else None
+        return result
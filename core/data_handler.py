@@ -1,327 +1,1023 @@
-import scrapy
-from scrapy.crawler import CrawlerProcess
-from scrapy.signalmanager import dispatcher
-from scrapy import signals
-import yfinance as yf
-
-from scrape_finance.spiders.ecb_daily import EcbDailySpider
-from scrape_finance.spiders.ecb_hist import EcbHistSpider
+# scrapy and yfinance are imported by the collectors that use them,
+# so reading the store does not load them
+from scrape_finance.sdmx import observations_to_frame, parse_currencies, wide_frame
+
+from core.runner import run_sources, DEFAULT_TIMEOUT
+from core.rolling import RollingStats
+from core.alpha_vantage import get_client
+from core.sources import FETCHERS, register_fetcher, load_sources
+from core.storage import BaseStore, StoredSeries, fill_missing, unchanged_rows, replace_durably
+from core.schema import validate_frame, migrate_columns, added_columns
+from core.metrics import span, count, get_metrics, log_frame
+from core.replay import curl_session, install as install_replay
 
 import requests
 import os
+import json
+import logging
+import shutil
+import threading
 import pandas as pd
-import time
-from datetime import datetime
-from dotenv import load_dotenv
+from datetime import datetime, timedelta
+from itertools import takewhile
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+DATA_PATH = './data/oil_market_data.h5'
+# all series joined on date, maintained by scrape_orchestrator
+COMBINED_KEY = '/combined'
+# rolling means and volatility of the combined table, one row per date
+ROLLING_KEY = '/rolling'
+DERIVED_KEYS = (COMBINED_KEY, ROLLING_KEY)
+
+# a series that is not in the store yet is collected from this many years back
+HISTORY_YEARS = 2
+
+
+ALPHA_VANTAGE_HOST = 'www.alphavantage.co'
+BRENT_URL = 'https://www.alphavantage.co/query?function=BRENT&interval=daily&apikey='
+
+# yahoo finance tickers per series name
+MARKET_TICKERS = {'BZ_oil': 'BZ=F', 'vix': '^VIX'}
+
+_yf_session = None
+_yf_session_lock = threading.Lock()
+
+def get_yf_session():
+    """one browser-impersonating session shared by every yfinance download in the process.
+    records or replays its responses in the SCRAPE_REPLAY mode"""
+    global _yf_session
+    with _yf_session_lock:
+        if _yf_session is None:
+            _yf_session = curl_session(impersonate='chrome')
+    return _yf_session
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """pooled requests session shared by the rest api collectors.
+    records or replays its responses in the SCRAPE_REPLAY mode"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = install_replay(requests.Session())
+    return _http_session
+
+
+def default_start_date():
+    """first date to collect for a series without stored data"""
+    today = pd.Timestamp(datetime.today().date())
+    return (today - pd.DateOffset(years=HISTORY_YEARS)).date()
+
 
-load_dotenv()
-ALPHA_API_KEY = os.getenv('ALPHA_VANTAGE_API_KEY')
 class CurrencyCollector:
-    """activates a Scrapy Crawler process to get either current date or 
-     historical EUR/USD quotes from the ECB official website
-      args: hist:bool. Default=False, for current quote
+    """runs a Scrapy crawl on the shared scrape engine to get the
+     euro reference rates from start_date until today from the ECB official website.
+     can be run any number of times in the same process.
+      args: start_date: date. Default=None, for the last HISTORY_YEARS.
+        when only today is missing the daily reference page is scraped,
+        otherwise the historical xml files, one per currency, downloaded in parallel
+       currencies: 'usd', 'usd,jpy', a list, or 'all' for every ECB reference currency. Default='usd'
+       store, schema: a store backend and the schema of the series. when given, the 
+        quotes are written to the store by the item pipeline while the crawl runs
+       revalidate: revalidate cached ECB files even before the next publication, for a retry
        returns: 
-        a list of historical quotes or a dict with current date quote """
-    def __init__(self, hist:bool=False):
-        self.currency_results = []
-        self.daily_currency_results = None
-        self.process = CrawlerProcess()
-        self.hist = hist
+        self.currency_df: a DataFrame with a <currency>_value column per currency, 
+         aligned on date, newest first, when there is no store.
+        self.stored: a StoredSeries, when there is a store """
+    def __init__(self, start_date=None, timeout=DEFAULT_TIMEOUT, currencies='usd', 
+                 store:BaseStore=None, schema=None, revalidate:bool=False):
+        self.currencies = parse_currencies(currencies)
+        from core.scrape_engine import get_engine
+        self.engine = get_engine()
+        self.timeout = timeout
+        self.start_date = start_date or default_start_date()
+        self.store = store
+        self.schema = schema
+        self.revalidate = revalidate
+        self.name = schema.key if schema is not None else 'currency'
         self.currency_df = None
-        self.start_date = None
-
+        self.stored = None
 
-    def _collect_hist_item(self, item):
-        if self.hist:
-            try:
-                datetime_obj = datetime.strptime(item['date'],"%Y-%m-%d").date()
-                if datetime_obj >= self.start_date:
-                    item['date'] = datetime_obj
-                    item['value'] = float(item['value'])
-                    self.currency_results.append(item)
-            except KeyError: 
-                pass
+    def _store_kwargs(self):
+        if self.store is None:
+            return {}
+        return {'store': self.store, 'schema': self.schema, 'start_date': self.start_date}
 
     def hist_scraper(self):
-        # set start date 
-        today = datetime.today().date()
-        self.start_date = today.replace(year=(today.year -2 ))
-        
-        # set callback and callback signal
-        dispatcher.connect(self._collect_hist_item, signal=signals.item_scraped)
-        
+        from scrape_finance.spiders.ecb_hist import EcbHistSpider
         #start crawl:
-        self.process.crawl(EcbHistSpider)
+        return self.engine.crawl(EcbHistSpider, timeout=self.timeout, currencies=self.currencies, 
+                                 revalidate=self.revalidate, **self._store_kwargs())
 
-    def _collect_daily_currency(self, item):
-        item['date'] = datetime.strptime(item['date'],"%d %B %Y").date()
-        self.currency_results.append(item)
-    
     def daily_scraper(self):
-        # set callback and callback signal
-        dispatcher.connect(self._collect_daily_currency, signal=signals.item_scraped)
-        
+        from scrape_finance.spiders.ecb_daily import EcbDailySpider
         #start crawl:
-        self.process.crawl(EcbDailySpider)
+        return self.engine.crawl(EcbDailySpider, timeout=self.timeout, currencies=self.currencies, 
+                                 revalidate=self.revalidate, **self._store_kwargs())
+
+    def _items_frame(self, items):
+        """joins the items of either spider per currency and converts them in one pass per currency"""
+        from scrape_finance.items import CurrencyItem
+        observations = {}
+        for item in items:
+            dates, values = observations.setdefault(item['currency'], ([], []))
+            if isinstance(item, CurrencyItem):
+                dates.append(item['date'])
+                values.append(item['value'])
+            else:
+                dates.extend(item['dates'])
+                values.extend(item['values'])
+        return wide_frame(observations_to_frame(dates, values, currency, self.start_date) 
+                          for currency, (dates, values) in observations.items())
+
+    def _count_crawl(self, crawl):
+        """adds the downloaded bytes and the retried requests of a finished crawl to the metrics"""
+        stats = getattr(crawl, 'stats', {})
+        count('bytes', stats.get('downloader/response_bytes', 0), self.name)
+        count('retries', stats.get('retry/count', 0), self.name)
+
+    def _run_stored(self, crawl):
+        """waits for a crawl that writes to the store through the item pipeline, and for its writes.
+        the batches written before a failed write or a timeout stay written, 
+        the error is kept in self.stored"""
+        with span('fetch', self.name):
+            crawl.result()
+        self._count_crawl(crawl)
+        stats = crawl.stats
+        failed = [key[len('ecb/failed/'):].lower() for key in stats if key.startswith('ecb/failed/')]
+        error = None
+        if 'store/error' in stats:
+            error = f'writing {self.schema.key} failed: {stats["store/error"]}'
+        elif 'crawl/timed_out' in stats:
+            error = (f'crawl timed out after {stats["crawl/timed_out"]} seconds, '
+                     f'{stats.get("store/dropped", 0)} rows not written')
+        # the currencies that did not fail are complete, unless the crawl was cut short
+        self._track_missing(failed, complete=error is None)
+        if failed and error is None:
+            error = f'{", ".join(sorted(failed))} not collected'
+        self.stored = StoredSeries(stats.get('store/written_from'), stats.get('store/rows', 0), error)
+        print(f'{self.schema.key}: {self.stored.rows} rows written while crawling')
+        if error:
+            print(error)
+
+    def _track_missing(self, failed, complete):
+        """marks the columns of the failed currencies as missing from start_date, so the next run
+        collects them again. when complete, the marks of the other columns from start_date on are cleared"""
+        key = self.schema.key
+        missing = self.store.missing().get(key, {})
+        start = pd.Timestamp(self.start_date)
+        failed = {f'{currency}_value' for currency in failed}
+        columns = dict(missing)
+        for column in failed:
+            columns[column] = min(columns.get(column, start), start)
+        if complete:
+            columns = {column: date for column, date in columns.items() if date < start or column in failed}
+        if columns != missing:
+            self.store.set_missing(key, columns)
+            if columns:
+                print(f'{key}: {", ".join(sorted(columns))} missing, collected again by the next run')
 
     def run(self):
-        if self.hist:
-            self.hist_scraper()
-        else: 
-            self.daily_scraper()
-        self.process.start()
-
-        # set dataframe:
-        self.currency_df = pd.DataFrame(data=self.currency_results)
-        self.currency_df.set_index('date', inplace=True)
-        self.currency_df.index = pd.to_datetime(self.currency_df.index)
-        self.currency_df.sort_index(ascending=False, inplace=True)
-        self.currency_df.rename(columns={'value': 'usd_value'}, inplace=True)
-        self.currency_df['usd_value'] = pd.to_numeric(self.currency_df['usd_value'], errors='coerce')
-
-        print(f'currency dataframe {self.currency_df}')
-        print(f'currency types {self.currency_df.dtypes}')
-
-
-class BrentPriceCollector:
-    """collects historical or current commodity prices for Brent Crude Oil, 
-    using Alpha vantage API.
+        # the daily page only holds the latest reference rates, so any earlier
+        # missing day comes from the history files
+        only_latest = self.start_date >= datetime.today().date()
+        crawl = self.daily_scraper() if only_latest else self.hist_scraper()
+        if self.store is not None:
+            self._run_stored(crawl)
+            return
+
+        with span('fetch', self.name):
+            items = crawl.result()
+        self._count_crawl(crawl)
+        with span('transform', self.name):
+            self.currency_df = self._items_frame(items)
+        log_frame(logger, self.name, self.currency_df)
+
+
+class RestJsonCollector:
+    """collects a daily series from start_date until today from a REST api that replies with
+    a json list of {date, value} records, like the Alpha Vantage commodity functions.
+    Alpha Vantage urls go through the shared, caching api client.
+          args: 
+          url: api url. an empty 'apikey' parameter is filled in with api_key
+          api_key: str API Key
+          column: name of the value column
+          data_path: key of the records list in the json reply
+          date_field, value_field: keys of the date and value in a record
+          start_date: date. Default=None, for the last HISTORY_YEARS
+          name: the series name in the metrics. Default=None, for column
+          revalidate: call the api even if a fresh reply is cached, for a retry
+    returns: 
+        self.df: a DataFrame of values per date, newest first. 
+        empty when the api is throttled and nothing is cached """
+
+    def __init__(self, url, api_key=None, column='value', data_path='data', date_field='date', 
+                 value_field='value', start_date=None, timeout=DEFAULT_TIMEOUT, name=None, revalidate:bool=False):
+        self.url = url
+        self.revalidate = revalidate
+        self.name = name or column
+        self.api_key = api_key
+        self.column = column
+        self.data_path = data_path
+        self.date_field = date_field
+        self.value_field = value_field
+        self.timeout = timeout
+        self.data = None
+        self.raw_data = None
+        self.start_date = start_date or default_start_date()
+        self.df = None
+
+    def _request(self):
+        parts = urlsplit(self.url)
+        query = dict(parse_qsl(parts.query, keep_blank_values=True))
+        if 'apikey' in query and not query['apikey']:
+            query['apikey'] = self.api_key
+
+        if parts.netloc == ALPHA_VANTAGE_HOST:
+            query.pop('apikey', None)
+            function = query.pop('function')
+            client = get_client(self.api_key, timeout=self.timeout)
+            return client.query(function, revalidate=self.revalidate, **query) or {}
+
+        r = get_http_session().get(urlunsplit(parts._replace(query=urlencode(query))), timeout=self.timeout)
+        r.raise_for_status()
+        count('bytes', len(r.content), self.name)
+        return r.json()
+
+    def collect_values(self):
+        with span('fetch', self.name):
+            self.data = self._request()
+        if self.data_path not in self.data:
+            print(f'no {self.column} data from {urlsplit(self.url).netloc}: {self.data}')
+        records = self.data.get(self.data_path, [])
+        
+        with span('parse', self.name):
+            # iso dates compare as strings. when the records are newest first (as from alpha vantage,
+            # which returns the full history) only the head of the list, up to start date, is read
+            start = self.start_date.isoformat()
+            if records and records[0][self.date_field] >= records[-1][self.date_field]:
+                self.raw_data = list(takewhile(lambda item: item[self.date_field] >= start, records))
+            else:
+                self.raw_data = [item for item in records if item[self.date_field] >= start]
+
+        with span('transform', self.name):
+            # convert to Pandas df with date as index, newest first: 
+            values = [item[self.value_field] for item in self.raw_data]
+            pd_dates = pd.to_datetime([item[self.date_field] for item in self.raw_data])
+            # convert to float, handle non-numeric as 'NaN'
+            self.df = pd.DataFrame(
+                        data={self.column: pd.to_numeric(values, errors='coerce')},
+                        index=pd.DatetimeIndex(pd_dates, name='date'))
+            self.df.sort_index(ascending=False, inplace=True)
+        log_frame(logger, self.name, self.df)
+        return self.df
+
+
+class BrentPriceCollector(RestJsonCollector):
+    """collects commodity prices for Brent Crude Oil from start_date until today, 
+    using Alpha vantage API through the shared, caching api client.
           args: 
           api_key: str Alpha Vantage API Key
-          hist:bool. Default=False, for current quote
+          start_date: date. Default=None, for the last HISTORY_YEARS
     returns: 
-        a dict of historical quotes per date or a dict with current date quote """
+        a DataFrame of quotes per date, newest first. 
+        empty when the api is throttled and nothing is cached """
 
-    def __init__(self, api_key, hist:bool=False):
-        self.api_key = api_key
-        self.hist = hist
-        self.json_data = None
-        self.brent_raw_data = None
-        self.start_date = None
-        self.brent_df = None
+    def __init__(self, api_key, start_date=None, timeout=DEFAULT_TIMEOUT):
+        super().__init__(BRENT_URL, api_key, column='brent_value', start_date=start_date, timeout=timeout)
 
     def get_brent_quotes(self):
+        return self.collect_values()
 
-        # call Alpha Vantage 'BRENT' function api with single day interval: 
-        url = f'https://www.alphavantage.co/query?function=BRENT&interval=daily&apikey={self.api_key}'
-        r = requests.get(url)
-        self.data = r.json()
-        
-        # choose historical or current trading data
-        self.brent_raw_data = self.data['data'] 
-
-        # convert to Pandas df with date as index, filter for 2 years: 
-        if self.hist: 
-            
-            today = pd.to_datetime(datetime.today().date())
-            self.start_date = today - pd.DateOffset(years=2)
-            values = [item['value'] for item in self.brent_raw_data]
-            pd_dates = pd.to_datetime([item['date'] for item in self.brent_raw_data])
-            brent_df = pd.DataFrame(
-                        data={'date': pd_dates, 'brent_value': values},
-                        index=pd_dates)
-            
-            # sort out last 2 years
-            self.brent_df = brent_df.loc[brent_df.index >= self.start_date]
-            
-        else: 
-            last_day_value = self.brent_raw_data[0]
-            value = float(last_day_value['value'])
-            date = pd.to_datetime(last_day_value['date'])
-            self.brent_df = pd.DataFrame(
-                data={'date':date,'brent_value': value},
-                index=[date]  
-            )
-            
-        # convert to float, handle non-numeric as 'NaN'
-        self.brent_df['brent_value'] = pd.to_numeric(self.brent_df['brent_value'], errors='coerce')
-        self.brent_df.set_index('date', inplace=True)
-        self.brent_df.index = pd.to_datetime(self.brent_df.index)
-        print(f'brent dataframe {self.brent_df}')
-        print(f'brent types {self.brent_df.dtypes}')
-
-class OilForwardValueCollector:
+    @property
+    def brent_df(self):
+        return self.df
+
+    @property
+    def brent_raw_data(self):
+        return self.raw_data
+
+
+class MarketTickerCollector:
     """
-    collects values for the combined index of close-value of Brent-Crude Future transactions
+    collects daily close values of several Yahoo Finance tickers, 
+    with a single batched and threaded yf.download call on the shared session
     args: 
-          hist:bool. Default=False, for current quote, true for historical
+          tickers: dict of {name: ticker}. Default=None, for MARKET_TICKERS
+          start_dates: dict of {name: date}. a missing name is collected for the last HISTORY_YEARS
     returns: 
-        a dict of historical quotes per date or a dict with current date quote """
+        self.frames: a dict of {name: DataFrame of close values per date, newest first} """
     
-    def __init__(self, hist:bool = False):
-        self.ticker = 'BZ=F'
-        self.hist = hist
-        self.oil_future_df = None
-        self.start_date = None
+    def __init__(self, tickers:dict=None, start_dates:dict=None, timeout=DEFAULT_TIMEOUT):
+        self.tickers = dict(tickers or MARKET_TICKERS)
+        self.timeout = timeout
+        start_dates = start_dates or {}
+        self.start_dates = {name: start_dates.get(name) or default_start_date() for name in self.tickers}
+        self.frames = {}
     
     def collect_values(self):
-
-        session = requests.Session()
-        session.headers.update({
-            'User-Agent': 'Mozilla/5.0'
-        })    
-
-        if self.hist: 
-            # set start date to 2 years past: 
-            today = datetime.today().date()
-            self.start_date = today.replace(year=(today.year -2 ))
-            
-            # get quotes
-            data = yf.download(self.ticker, start=self.start_date, end=today, interval="1d")
-        
+        import yfinance as yf
+
+        # one call for all tickers, from the earliest start date. end date is exclusive
+        end = datetime.today().date() + timedelta(days=1)
+        with span('fetch', 'yfinance'):
+            data = yf.download(list(self.tickers.values()), start=min(self.start_dates.values()), end=end,
+                               interval='1d', group_by='column', threads=True,
+                               session=get_yf_session(), timeout=self.timeout)
+        with span('transform', 'yfinance'):
+            return self.split_download(data)
+
+    def split_download(self, data):
+        """splits the frame of a yf.download call into self.frames, one frame per series"""
+        # the result has (price, ticker) columns, keep the close price of every ticker
+        if 'Close' in data.columns.get_level_values(0):
+            closes = data['Close']
         else:
-            # get data for last trading day: 
-            data =  yf.download(self.ticker, period='1d', session=session, interval='1d')
-            print(f'data from yf.download oil futures: {data}')
-        
-        # rename columns to <value>_<ticker>; lower case only first letter:
-        data.columns = data.columns.map(lambda col: ('_'.join(col)))
-        data.rename(columns={f'Close_{self.ticker}': f'close_{self.ticker}'}, inplace=True)
-        self.oil_future_df = data[[f'close_{self.ticker}']]
-        self.oil_future_df.index.name ='date'
-        self.oil_future_df.sort_index(ascending=False, inplace=True)
-        print(f'oil future df: {self.oil_future_df}')
-        print(f'oil future df types: {self.oil_future_df.dtypes}')
-
-
-class SentimentIndexCollector:
+            closes = pd.DataFrame(index=data.index)
+        closes = closes.reindex(columns=list(self.tickers.values()))
+        closes.index.name = 'date'
+        closes = closes.sort_index(ascending=False)
+        closes.columns = [f'{name}_value' for name in self.tickers]
+
+        # split into one frame per series, each from its own start date.
+        # dates where only other tickers traded are dropped
+        dates = closes.index
+        for name in self.tickers:
+            column = f'{name}_value'
+            in_range = dates >= pd.Timestamp(self.start_dates[name])
+            self.frames[name] = closes.loc[in_range & closes[column].notna().to_numpy(), [column]]
+            log_frame(logger, name, self.frames[name])
+        return self.frames
+
+
+class OilForwardValueCollector(MarketTickerCollector):
     """
     collects values for the combined index of close-value of Brent-Crude Future transactions
     args: 
-          hist:bool. Default=False, for current quote, true for historical
+          start_date: date. Default=None, for the last HISTORY_YEARS
     returns: 
-        a dict of historical quotes per date or a dict with current date quote """
-    
-    def __init__(self, hist:bool = False):
-        self.ticker = '^VIX'
-        self.hist = hist
-        self.vix = None
-        self.start_date = None
-        self.vix_df = None
+        a DataFrame of close values per date, newest first """
     
-    def collect_values(self):
-        
-        session = requests.Session()
-        session.headers.update({
-            'User-Agent': 'Mozilla/5.0'
-        }) 
-        if self.hist: 
-            # set start date to 2 years past: 
-            today = datetime.today().date()
-            self.start_date = today.replace(year=(today.year -2 ))
-            
-            # get quotes
-            data = yf.download(self.ticker, start=self.start_date, end=today, interval="1d")
-        
-        else:
-            # get data for last trading day: 
-            data =  yf.download(self.ticker, period='1d', interval='1d')
-            print(f'data from yf.download vix sentiment: {data}')
+    def __init__(self, start_date=None, timeout=DEFAULT_TIMEOUT):
+        super().__init__({'BZ_oil': 'BZ=F'}, {'BZ_oil': start_date}, timeout=timeout)
+        self.ticker = 'BZ=F'
 
-        #rename df columns
-        data.columns = data.columns.map(lambda col: '_'.join(col))
-        data.rename(columns={f'Close_{self.ticker}': f'close_{self.ticker}'}, inplace=True)
+    @property
+    def oil_future_df(self):
+        return self.frames.get('BZ_oil')
 
-        #get only close price column
-        self.vix_df = data[[f'close_{self.ticker}']]
-        self.vix_df.index.name ='date'
-        self.vix_df.sort_index(ascending=False, inplace=True)
-        print(f'vix df: {self.vix_df}')
-        print(f'vix df types: {self.vix_df.dtypes}')
 
+class SentimentIndexCollector(MarketTickerCollector):
+    """
+    collects values of the VIX volatility ('fear') index
+    args: 
+          start_date: date. Default=None, for the last HISTORY_YEARS
+    returns: 
+        a DataFrame of close values per date, newest first """
+    
+    def __init__(self, start_date=None, timeout=DEFAULT_TIMEOUT):
+        super().__init__({'vix': '^VIX'}, {'vix': start_date}, timeout=timeout)
+        self.ticker = '^VIX'
 
-def scrape_factory(alpha_api_key, hist=False)->list:
+    @property
+    def vix_df(self):
+        return self.frames.get('vix')
+
+
+def _ecb_columns(params):
+    return [f'{currency}_value' for currency in parse_currencies(params.get('currency', 'usd'))]
+
+@register_fetcher('scrapy', columns=_ecb_columns, writes=True)
+def _fetch_ecb(sources, start_dates, api_key, timeout, store=None, revalidate=False):
+    source = sources[0]
+    ecb = CurrencyCollector(start_date=start_dates.get(source.key), timeout=timeout,
+                            currencies=source.params.get('currency', 'usd'), 
+                            store=store, schema=source.schema, revalidate=revalidate)
+    ecb.run()
+    return {source.key: ecb.stored if store is not None else ecb.currency_df}
+
+@register_fetcher('rest_json')
+def _fetch_rest_json(sources, start_dates, api_key, timeout, store=None, revalidate=False):
+    source = sources[0]
+    collector = RestJsonCollector(source.target, api_key, start_date=start_dates.get(source.key),
+                                  timeout=timeout, name=source.key, revalidate=revalidate,
+                                  **{**source.params, 'column': source.schema.column})
+    return {source.key: collector.collect_values()}
+
+@register_fetcher('yfinance', batch=True)
+def _fetch_market(sources, start_dates, api_key, timeout, store=None, revalidate=False):
+    # yahoo replies are not cached, every call reaches the network
+    market = MarketTickerCollector({source.key: source.target for source in sources}, 
+                                   start_dates=start_dates, timeout=timeout)
+    return market.collect_values()
+
+
+def scrape_factory(alpha_api_key, start_dates:dict=None, concurrent:bool=False, 
+                   timeout=DEFAULT_TIMEOUT, sources:list=None, store:BaseStore=None, revalidate:bool=False)->list:
     """
-    fetches all values for either historical or current.
-    currently - joins all value to a dataframe. 
-    arg: hist: Boolean, default False. False returns current values
-     True to return historical values
+    fetches the values of every source from its start date until today.
+    arg: start_dates: dict of {key: date}. a source that is missing is 
+      collected for the last HISTORY_YEARS, a source starting after today is skipped
+     concurrent: Boolean, default False. True fetches all sources in parallel threads
+     timeout: seconds allowed per source, a number or a dict of {key: seconds}
+     sources: list of Source. Default=None, for the sources in data/urls.csv
+     store: a store backend for the fetchers that write while they collect (the ECB crawl). 
+      Default=None, every fetcher returns its frame
+     revalidate: Boolean, default False. True asks the sources again even if a cached reply is fresh,
+      for a retry of a source that has not published yet
+    returns: a list of {'name', 'df', 'status', 'elapsed', 'error'} dicts, one per source, 
+     where name is the store key and df is in the schema of the source.
+     a source that was written by its fetcher has df=None, 'stored'=True and 'written_from',
+     the earliest date written (None if nothing changed).
+     a failed or timed out source has df=None and does not affect the others
     """
+    start_dates = start_dates or {}
+    sources = load_sources() if sources is None else sources
+    today = datetime.today().date()
+
+    def timeout_for(name):
+        return timeout.get(name, DEFAULT_TIMEOUT) if isinstance(timeout, dict) else timeout
+
+    df_list = []
+    # task name -> the sources it collects
+    groups = {}
+    for source in sources:
+        start = start_dates.get(source.key) or default_start_date()
+        if start > today:
+            df_list.append({'name': source.key, 'df': None, 'status': 'up to date', 
+                            'elapsed': 0, 'error': None})
+            continue
+        # batched fetchers (e.g. all yahoo tickers) get one task for all their sources
+        batch = FETCHERS[source.fetcher][1]
+        groups.setdefault(source.fetcher if batch else source.key, []).append(source)
+
+    def task(name, group):
+        fetch = FETCHERS[group[0].fetcher][0]
+        starts = {source.key: start_dates.get(source.key) for source in group}
+        return lambda: fetch(group, starts, alpha_api_key, timeout_for(name), store=store, revalidate=revalidate)
+
+    tasks = {name: task(name, group) for name, group in groups.items()}
+    # a fetcher that writes to the store is waited for, so its writes are done before the commit
+    drain = {name for name, group in groups.items() if store is not None and FETCHERS[group[0].fetcher][3]}
+    results, report = run_sources(tasks, timeout=timeout, concurrent=concurrent, drain=drain)
+    logger.info('scrape latency report: %s', json.dumps(report))
+
+    for source_report in report['sources']:
+        frames = results[source_report['name']] or {}
+        for source in groups[source_report['name']]:
+            result = frames.get(source.key)
+            df_dict = {'name': source.key,
+                       'df': None,
+                       'status': source_report['status'],
+                       'elapsed': source_report['elapsed'],
+                       'error': source_report['error']}
+            if source_report['status'] != 'ok':
+                count(source_report['status'], 1, source.key)
+            if isinstance(result, StoredSeries):
+                df_dict.update(stored=True, written_from=result.written_from)
+                count('rows', result.rows, source.key)
+                if result.error:
+                    if df_dict['status'] == 'ok':
+                        df_dict['status'] = 'error'
+                        count('error', 1, source.key)
+                    df_dict['error'] = result.error
+            elif result is not None:
+                with span('transform', source.key):
+                    df_dict['df'] = source.schema.apply(result)
+                count('rows', len(df_dict['df']), source.key)
+            df_list.append(df_dict)
+    return df_list
+
+
+def _last_date(store, key):
+    """the high-water mark of a stored series: the last date that was ingested"""
+    if key not in store:
+        return None
+    attrs = store.get_storer(key).attrs
+    if 'last_date' in attrs:
+        return pd.Timestamp(attrs.last_date)
+    # stores written before the mark was kept
+    index = store.select_column(key, 'index')
+    return pd.Timestamp(index.max()) if len(index) else None
 
-    # fetch usd/eur currency data:
-    t0 = time.perf_counter()
-    usd = CurrencyCollector(hist=hist)
-    usd.run()
-    usd_df = usd.currency_df
-    print(f"usd data elapsed time: {time.perf_counter() - t0:.2f} seconds")
-    
-    # fetch Brent index for oil prices: 
-    t1 = time.perf_counter()
-    brent = BrentPriceCollector(alpha_api_key, hist=hist)
-    brent.get_brent_quotes()
-    brent_df = brent.brent_df
-    print(f"brent data elapsed time: {time.perf_counter() - t1:.2f} seconds")
-
-    # fetch future oil transacion index prices:
-    t2 = time.perf_counter()
-    oil = OilForwardValueCollector(hist=hist)
-    oil.collect_values()
-    oil_df = oil.oil_future_df
-    print(f"BZ future data elapsed time: {time.perf_counter() - t2:.2f} seconds")
-
-    # fetch general 'fear' market sentiment index prices:
-    t3 = time.perf_counter()
-    vix = SentimentIndexCollector(hist=hist)
-    vix.collect_values()
-    vix_df = vix.vix_df
-    print(f"VIX future data elapsed time: {time.perf_counter() - t3:.2f} seconds")
-
-    return [{
-        'name': 'currency','df': usd_df}, 
-            {'name':'brent', 'df': brent_df},
-            {'name':'BZ_oil', 'df': oil_df},
-            {'name':'vix', 'df': vix_df}
-            ]
-    
 
-def save_to_hdf(df_dict, hist:bool):
-    """saves market data to hd5 file"""
+def get_last_dates(path=DATA_PATH) -> dict:
+    """returns {name: last ingested date} for every series in the store"""
+    if not os.path.exists(path):
+        return {}
+    with pd.HDFStore(path, mode='r') as store:
+        return {key.lstrip('/'): _last_date(store, key) for key in _series_keys(store)}
+
+
+def _series_keys(store):
+    """store keys of the collected series, without the derived tables"""
+    return [key for key in store.keys() if key not in DERIVED_KEYS]
+
+
+def _bump_revision(store):
+    """counts the writes to the store, so readers can tell when cached results are stale"""
+    attrs = store.root._v_attrs
+    attrs.revision = getattr(attrs, 'revision', 0) + 1
+
+
+def get_missing(path=DATA_PATH) -> dict:
+    """returns {name: {column: date}}, the columns of the series that could not be collected from date on"""
+    if not os.path.exists(path):
+        return {}
+    with pd.HDFStore(path, mode='r') as store:
+        missing = getattr(store.root._v_attrs, 'missing', None) or {}
+    return {name: {column: pd.Timestamp(date) for column, date in columns.items()} 
+            for name, columns in missing.items()}
+
+
+def set_missing(name, columns:dict, path=DATA_PATH):
+    """replaces the missing columns of a series, kept in the attributes of the file"""
+    with pd.HDFStore(path, mode='a') as store:
+        _set_missing(store, name, columns)
+
+
+def _set_missing(store, name, columns:dict):
+    attrs = store.root._v_attrs
+    missing = dict(getattr(attrs, 'missing', None) or {})
+    if columns:
+        missing[name] = {column: pd.Timestamp(date).isoformat() for column, date in columns.items()}
+    elif missing.pop(name, None) is None:
+        return
+    attrs.missing = missing
+
+
+def _mark_added_columns(store, key, added, first_date):
+    """marks the columns a migration added to a stored wide table as missing from its first date,
+    so the next run collects their history instead of starting after the last stored date"""
+    name = key.lstrip('/')
+    missing = getattr(store.root._v_attrs, 'missing', None) or {}
+    columns = {column: pd.Timestamp(date) for column, date in missing.get(name, {}).items()}
+    for column in added:
+        columns[column] = min(columns.get(column, first_date), first_date)
+    _set_missing(store, name, columns)
+    print(f'{name}: {", ".join(added)} added, collected from {first_date.date()} by the next run')
+
+
+def get_revision(path=DATA_PATH) -> int:
+    """the write counter of the store, changes whenever any table is written"""
+    if not os.path.exists(path):
+        return 0
+    with pd.HDFStore(path, mode='r') as store:
+        return int(getattr(store.root._v_attrs, 'revision', 0))
+
+
+def _has_table(path, key):
+    with pd.HDFStore(path, mode='r') as store:
+        return key in store
+
+
+def _read_table(store, key, where=None):
+    df = store.select(key, where=where)
+    # tables written by save_to_hdf hold one row per date,
+    # only tables from before the upsert writer need deduplication
+    if not getattr(store.get_storer(key).attrs, 'unique_index', False):
+        df = df[~df.index.duplicated(keep='first')]
+    return df
+
+
+def _ensure_date_index(store, key):
+    """keeps a completely sorted PyTables index on the date column, so date range
+    selections and the upsert lookups don't scan the table"""
+    table = store.get_storer(key).table
+    if not (table.cols.index.is_indexed and table.cols.index.index.is_csi):
+        store.create_table_index(key, columns=['index'], optlevel=9, kind='full')
+
+
+def _drop_stored_duplicates(store, key):
+    """rewrites a table that was appended with repeated dates, keeping the first row per date.
+    runs once per table; upserted tables are marked with the 'unique_index' attribute"""
+    df = store[key]
+    df = df[~df.index.duplicated(keep='first')]
+    last_date = _last_date(store, key)
+    store.put(key, df, format='table')
+    attrs = store.get_storer(key).attrs
+    attrs.last_date = last_date
+    attrs.unique_index = True
+    print(f'{key}: removed repeated dates, {len(df)} rows kept')
+
+
+def _migrate_table(store, key, df):
+    """rewrites a stored series whose value column was renamed or retyped, 
+    e.g. 'close_^VIX' of older runs that is now collected as 'vix_value'.
+    columns added to a wide table are marked as missing from its first date"""
+    head = store.select(key, stop=0)
+    if list(head.columns) == list(df.columns) and (head.dtypes == df.dtypes).all():
+        return
+    attrs = store.get_storer(key).attrs
+    last_date = _last_date(store, key)
+    unique_index = getattr(attrs, 'unique_index', False)
+    stored = store[key]
+    store.put(key, migrate_columns(stored, df, key), format='table')
+    attrs = store.get_storer(key).attrs
+    attrs.last_date = last_date
+    attrs.unique_index = unique_index
+    added = added_columns(head.columns, df.columns)
+    if added and not stored.empty:
+        _mark_added_columns(store, key, added, stored.index.min())
+
+
+def save_to_hdf(df_dict, path=DATA_PATH):
+    """upserts market data into the hd5 file: dates that are not stored yet are appended,
+    stored dates whose values changed are replaced, and unchanged dates are skipped,
+    so saving the same data twice is a no-op. a missing (NaN) value does not replace a stored one.
+    creates the series if it does not exist yet.
+    returns the earliest date that was written, None if nothing was written"""
 
     name = df_dict['name']
     key=f'/{name}'
     df = df_dict['df']
-    path = ('./data/oil_market_data.h5')
     mode = 'a'
     
-    if hist:
-        # check if each of the keys exist in datastore- 
-        
-        with pd.HDFStore(path, mode=mode) as store:
-            if key in store:
-                print(f'data file for {key} already exists. cannot recreate, please collect current data only with "hist=False"')    
-                return
-            store.put(key=key, value=df, format='table')
-            print(f'key {key}\n df: {df}')
-        
-    else:
-        if os.path.exists(path):
-            with pd.HDFStore(path, mode=mode) as store:
-                store.append(key, df, format='table')
-
-        else: 
-            print('data file does not exist. check and initialize with "hist=True"')
+    if df is None or df.empty:
+        print(f'no data collected for {key}')
+        return None
+    
+    # the stored tables use a nanosecond index
+    df = df[~df.index.duplicated(keep='last')]
+    df.index = df.index.astype('datetime64[ns]')
+    validate_frame(df, key)
+    
+    with pd.HDFStore(path, mode=mode) as store:
+        replace_coordinates = []
+        last_date = _last_date(store, key)
+
+        if last_date is not None:
+            _migrate_table(store, key, df)
+            attrs = store.get_storer(key).attrs
+            if not getattr(attrs, 'unique_index', False):
+                _drop_stored_duplicates(store, key)
+
+            # only dates up to the stored range need to be compared
+            overlap = df.loc[df.index <= last_date]
+            if not overlap.empty:
+                stored_dates = store.select_column(key, 'index')
+                stored_dates = stored_dates[stored_dates.isin(overlap.index)]
+                stored = store.select(key, where=stored_dates.index.to_numpy(copy=True))
+                overlap = fill_missing(stored, overlap)
+                unchanged = unchanged_rows(stored, overlap)
+                changed = overlap.index[~unchanged].intersection(stored.index)
+                replace_coordinates = stored_dates.index[stored_dates.isin(changed)].to_numpy(copy=True)
+                df = pd.concat([overlap.loc[~unchanged], df.loc[df.index > last_date]])
+
+        if df.empty:
+            print(f'{key} is up to date, last date: {last_date.date()}')
+            return None
+
+        if len(replace_coordinates):
+            store.remove(key, where=replace_coordinates)
+        store.append(key, df, format='table')
+        _ensure_date_index(store, key)
+
+        attrs = store.get_storer(key).attrs
+        attrs.last_date = max(df.index.max(), last_date) if last_date is not None else df.index.max()
+        attrs.unique_index = True
+        _bump_revision(store)
+        count('rows_written', len(df), name)
+        print(f'key {key}: {len(df) - len(replace_coordinates)} rows added, '
+              f'{len(replace_coordinates)} rows updated, last date: {attrs.last_date.date()}')
+        return df.index.min()
+
+
+def update_combined(path=DATA_PATH, since=None):
+    """maintains the COMBINED_KEY table: every series outer-joined on date,
+    sorted ascending and forward filled, so readers don't have to rebuild the join.
+    rows from since on are rebuilt from the series tables and the older rows are kept;
+    the table is rebuilt completely when since is None, when it does not exist yet
+    or when the set of series changed.
+      args:
+        since: the earliest date that changed in any series"""
+    with pd.HDFStore(path, mode='a') as store:
+        keys = _series_keys(store)
+        if not keys:
             return
+        columns = [column for key in keys for column in store.select(key, stop=0).columns]
+
+        seed = None
+        if since is not None and COMBINED_KEY in store:
+            if list(store.select(COMBINED_KEY, stop=0).columns) != columns:
+                since = None
+            else:
+                # last combined row before the rebuilt range, carries the forward fill over.
+                # the table is kept in date order, so it is the last matching coordinate
+                since = pd.Timestamp(since)
+                before = store.select_as_coordinates(COMBINED_KEY, where=[f"index < '{since.isoformat()}'"])
+                if len(before):
+                    seed = store.select(COMBINED_KEY, where=before[-1:].to_numpy(copy=True))
+        else:
+            since = None
+
+        where = _date_where(start=since)
+        frames = [_read_table(store, key, where) for key in keys]
+        combined_df = frames[0].join(frames[1:], how='outer')
+        combined_df.sort_index(ascending=True, inplace=True)
 
-def scrape_orchestrator(alpha_api_key, hist: bool=False):
-    df_list  = scrape_factory(alpha_api_key, hist=hist)
+        # handle missing values
+        if seed is not None:
+            combined_df = pd.concat([seed, combined_df]).ffill().iloc[1:]
+        else:
+            combined_df = combined_df.ffill().bfill()
+        combined_df.index = combined_df.index.astype('datetime64[ns]')
+        combined_df.index.name = 'date'
+
+        if since is None:
+            if COMBINED_KEY in store:
+                store.remove(COMBINED_KEY)
+        else:
+            store.remove(COMBINED_KEY, where=where)
+        _bump_revision(store)
+        if combined_df.empty:
+            return
+        store.append(COMBINED_KEY, combined_df, format='table')
+        _ensure_date_index(store, COMBINED_KEY)
+
+        attrs = store.get_storer(COMBINED_KEY).attrs
+        attrs.last_date = combined_df.index.max()
+        attrs.unique_index = True
+        print(f'{COMBINED_KEY}: {len(combined_df)} rows rebuilt from {combined_df.index.min().date()}')
+
+
+def rolling_state_path(path=DATA_PATH):
+    """the rolling statistics state is kept as json next to the store"""
+    return f'{os.path.splitext(path)[0]}_rolling.json'
+
+
+def update_rolling_stats(path=DATA_PATH, since=None, state_path=None):
+    """updates the ROLLING_KEY table with the combined rows that are newer than the saved
+    rolling state, one O(1) update per day and series. a rewritten last day (another source
+    of the same day) is rebuilt from the state of the day before. falls back to a full
+    recompute when there is no state, the columns changed, older history was rewritten,
+    or the state does not end where the table does (a write that was cut off).
+      args:
+        since: the earliest date that changed in the combined table
+        state_path: the json file of the state. Default=None, next to the store at path"""
+    state_path = state_path or rolling_state_path(path)
+    stats = RollingStats.load(state_path)
+
+    with pd.HDFStore(path, mode='a') as store:
+        if COMBINED_KEY not in store:
+            return
+        columns = list(store.select(COMBINED_KEY, stop=0).columns)
+        consistent = (stats is not None and stats.columns == columns and ROLLING_KEY in store
+                      and stats.last_date == _last_date(store, ROLLING_KEY))
+        if not consistent or (since is not None and not stats.rewind(since)):
+            stats = RollingStats(columns)
+            if ROLLING_KEY in store:
+                store.remove(ROLLING_KEY)
+            rows = store.select(COMBINED_KEY)
+        elif stats.last_date is None:
+            store.remove(ROLLING_KEY)
+            rows = store.select(COMBINED_KEY)
+        else:
+            after = [f"index > '{stats.last_date.isoformat()}'"]
+            store.remove(ROLLING_KEY, where=after)
+            rows = store.select(COMBINED_KEY, where=after)
+
+        rolling_df = stats.update(rows)
+        if not rolling_df.empty:
+            rolling_df.index = rolling_df.index.astype('datetime64[ns]')
+            rolling_df.index.name = 'date'
+            store.append(ROLLING_KEY, rolling_df, format='table')
+            _ensure_date_index(store, ROLLING_KEY)
+            attrs = store.get_storer(ROLLING_KEY).attrs
+            attrs.last_date = rolling_df.index.max()
+            attrs.unique_index = True
+            _bump_revision(store)
+            print(f'{ROLLING_KEY}: {len(rolling_df)} days updated')
+
+    stats.save(state_path)
+
+
+def load_rolling_stats(path=DATA_PATH, start=None, end=None):
+    """reads the rolling statistics table, None if the store has none yet"""
+    with pd.HDFStore(path, mode='r') as store, span('load', ROLLING_KEY.lstrip('/')):
+        if ROLLING_KEY not in store:
+            return None
+        return store.select(ROLLING_KEY, where=_date_where(start, end))
+
+
+def load_combined(path=DATA_PATH, start=None, end=None):
+    """reads the materialized combined table, optionally only a date window.
+    returns None if the store has no combined table yet"""
+    with pd.HDFStore(path, mode='r') as store, span('load', COMBINED_KEY.lstrip('/')):
+        if COMBINED_KEY not in store:
+            return None
+        return store.select(COMBINED_KEY, where=_date_where(start, end))
+
+
+class HdfStore(BaseStore):
+    """the hd5 file as a store backend, every table is a PyTables table keyed by '/<name>'.
+    writes never touch the file that readers open: the first write of a transaction copies it
+    to '<path>.staged', every write goes to the copy, and the commit renames the copy over
+    the file. a crash leaves the last committed file intact, and a reader that has the file
+    open keeps reading it while the next one is staged. inside a transaction the store reads
+    its own staged writes. a write outside a transaction is a transaction of its own.
+      args: path: the hd5 file"""
+
+    def __init__(self, path=DATA_PATH):
+        self.path = path
+        self._staged_path = None
+
+    @property
+    def lock_path(self) -> str:
+        return f'{self.path}.lock'
+
+    @property
+    def read_path(self) -> str:
+        """the staged copy while this store writes one, else the committed file"""
+        return self._staged_path or self.path
+
+    def _write_path(self) -> str:
+        if self._staged_path is None:
+            staged_path = f'{self.path}.staged'
+            # a copy left by a writer that crashed is never committed, it is overwritten
+            if os.path.exists(self.path):
+                shutil.copyfile(self.path, staged_path)
+            elif os.path.exists(staged_path):
+                os.remove(staged_path)
+            self._staged_path = staged_path
+        return self._staged_path
+
+    def _commit(self):
+        staged_path, self._staged_path = self._staged_path, None
+        if staged_path is not None and os.path.exists(staged_path):
+            replace_durably(staged_path, self.path)
+
+    def _abort(self):
+        staged_path, self._staged_path = self._staged_path, None
+        if staged_path is not None and os.path.exists(staged_path):
+            os.remove(staged_path)
+
+    def series(self) -> list:
+        if not os.path.exists(self.read_path):
+            return []
+        with pd.HDFStore(self.read_path, mode='r') as store:
+            return [key.lstrip('/') for key in _series_keys(store)]
+
+    def last_dates(self) -> dict:
+        return get_last_dates(self.read_path)
+
+    def revision(self) -> int:
+        return get_revision(self.read_path)
+
+    def missing(self) -> dict:
+        return get_missing(self.read_path)
+
+    def set_missing(self, name, columns:dict):
+        with self.transaction():
+            set_missing(name, columns, path=self._write_path())
+
+    def save(self, df_dict):
+        with self.transaction(), span('write', df_dict['name']):
+            return save_to_hdf(df_dict, path=self._write_path())
+
+    def load(self, start=None, end=None, series:list=None) -> list:
+        return load_from_hdf(self.read_path, start=start, end=end, series=series)
+
+    def load_combined(self, start=None, end=None):
+        return load_combined(self.read_path, start=start, end=end)
+
+    def load_rolling_stats(self, start=None, end=None):
+        return load_rolling_stats(self.read_path, start=start, end=end)
+
+    def has_combined(self) -> bool:
+        return os.path.exists(self.read_path) and _has_table(self.read_path, COMBINED_KEY)
+
+    def update_derived(self, since=None):
+        with self.transaction():
+            path = self._write_path()
+            with span('write', COMBINED_KEY.lstrip('/')):
+                update_combined(path, since=since)
+            with span('write', ROLLING_KEY.lstrip('/')):
+                update_rolling_stats(path, since=since, state_path=rolling_state_path(self.path))
+
+
+def _clear_collected(store:BaseStore, df_dict, start=None):
+    """clears the missing marks of the columns that df_dict holds values for, when they were
+    collected from the marked date on. a fetcher that writes to the store tracks its own marks"""
+    marked = store.missing().get(df_dict['name'], {})
+    df = df_dict['df']
+    start = pd.Timestamp(start) if start is not None else None
+    still_missing = {column: date for column, date in marked.items()
+                     if (start is not None and start > date) or column not in df or df[column].isna().all()}
+    if still_missing != marked:
+        store.set_missing(df_dict['name'], still_missing)
+
+
+def _save_collected(df_list, store:BaseStore, start_dates:dict=None):
+    """saves the collected frames of scrape_factory and updates the derived tables
+    from the earliest date that changed.
+      args:
+        start_dates: {name: date} the series were collected from, clears the missing marks
+          they covered. Default=None, collected from scratch"""
+    start_dates = start_dates or {}
+    changed = []
     for df_dict in df_list:
-        save_to_hdf(df_dict, hist=hist)
+        if df_dict.get('stored'):
+            # written while it was collected
+            if df_dict['written_from'] is not None:
+                changed.append(df_dict['written_from'])
+            continue
+        if df_dict['df'] is None:
+            print(f'{df_dict["name"]} was not collected ({df_dict["status"]}): {df_dict["error"]}')
+            continue
+        written_from = store.save(df_dict)
+        if written_from is not None:
+            changed.append(written_from)
+        _clear_collected(store, df_dict, start_dates.get(df_dict['name']))
+
+    if changed:
+        store.update_derived(since=min(changed))
+    elif store.series() and not store.has_combined():
+        store.update_derived()
+
+    get_metrics().flush()
+
+
+def scrape_orchestrator(alpha_api_key, concurrent:bool=True, path=DATA_PATH, sources:list=None, store:BaseStore=None,
+                        revalidate:bool=False):
+    """collects every series from the day after its last stored date and saves it.
+    missed days are filled in by the next run, a new series is collected from scratch,
+    and a series with missing columns (see BaseStore.missing) from the first missing date.
+    the combined table and the rolling statistics are then updated from the earliest date that changed.
+    the run is one store transaction: readers see the store before or after it, never in between
+      args:
+        store: the storage backend, Default=None, the hd5 file at path
+        revalidate: ask the sources again even if a cached reply is fresh, see scrape_factory"""
+    store = store or HdfStore(path)
+    with store.transaction():
+        missing = store.missing()
+        # columns that could not be collected last time are collected again
+        start_dates = {name: min([last_date + pd.Timedelta(days=1), *missing.get(name, {}).values()]).date()
+                       for name, last_date in store.last_dates().items() if last_date is not None}
+        df_list  = scrape_factory(alpha_api_key, start_dates=start_dates, concurrent=concurrent, 
+                                  sources=sources, store=store, revalidate=revalidate)
+        _save_collected(df_list, store, start_dates)
+    return df_list
+
 
+def backfill(alpha_api_key, start, concurrent:bool=True, path=DATA_PATH, sources:list=None, store:BaseStore=None):
+    """collects the sources again from start, whatever is stored, and upserts them:
+    missing dates are added and revised values replace the stored ones.
+      args:
+        start: the first date to collect
+        sources: list of Source. Default=None, every source in data/urls.csv
+        store: the storage backend, Default=None, the hd5 file at path"""
+    store = store or HdfStore(path)
+    sources = load_sources() if sources is None else sources
+    start = pd.Timestamp(start).date()
+    with store.transaction():
+        start_dates = {source.key: start for source in sources}
+        df_list = scrape_factory(alpha_api_key, start_dates=start_dates,
+                                 concurrent=concurrent, sources=sources, store=store)
+        _save_collected(df_list, store, start_dates)
     return df_list
 
-def load_from_hdf(path='./data/oil_market_data.h5'):
+def _date_where(start=None, end=None):
+    """PyTables where terms for a date range on the indexed date column, both ends inclusive"""
+    where = []
+    if start is not None:
+        where.append(f"index >= '{pd.Timestamp(start).isoformat()}'")
+    if end is not None:
+        where.append(f"index <= '{pd.Timestamp(end).isoformat()}'")
+    return where or None
+
+
+def load_from_hdf(path=DATA_PATH, start=None, end=None, series:list=None):
+    """loads the stored series, optionally only a date window and only some series.
+    the date range is selected inside PyTables on the indexed date column, 
+    so only the matching rows are read from disk.
+      args:
+        start, end: dates or strings, inclusive. None for an open end
+        series: list of series names, e.g. ['brent', 'vix']. None for all series
+    returns:
+        a list of DataFrames, in the order of the store keys"""
     df_list = []
+    where = _date_where(start, end)
     
     with pd.HDFStore(path, mode='r') as store: 
-        for key in store.keys():
-            df = store[key]
-            df = df[~df.index.duplicated(keep='first')]
-            #df = df.convert_dtypes(convert_floating=True)
-            df_list.append(df)
+        for key in _series_keys(store):
+            name = key.lstrip('/')
+            if series is not None and name not in series:
+                continue
+            with span('load', name):
+                df_list.append(_read_table(store, key, where))
+            count('rows_loaded', len(df_list[-1]), name)
     
     return df_list
     
 
     
 if __name__ == "__main__":
-    scrape_orchestrator(hist=False)
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s: %(message)s')
+    logging.getLogger('core').setLevel(os.getenv('SCRAPE_LOG_LEVEL', 'INFO'))
+    scrape_orchestrator(os.getenv('ALPHA_VANTAGE_API_KEY'))
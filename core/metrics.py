@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+# where flush() writes the metrics, when set
+JSON_LOG_ENV = 'SCRAPE_METRICS_JSON'
+PROMETHEUS_ENV = 'SCRAPE_METRICS_PROM'
+
+# rows of a frame shown by log_frame, from the head and the tail
+SAMPLE_ROWS = 3
+
+
+class Metrics:
+    """timing spans and counters of the pipeline stages, per source.
+    a span times one stage of one source: fetch, parse, transform, write or load.
+    counters add up rows, bytes and retries. recording only updates a few numbers
+    under a lock; the metrics are written out by flush(), once per run:
+        json_log: a JSON lines file, one line per finished span and one with the counters
+        prometheus: a text file in the Prometheus exposition format, with the totals
+          since the process started (e.g. for the node_exporter textfile collector)
+      args:
+        json_log, prometheus: file paths. Default=None, from the SCRAPE_METRICS_JSON
+          and SCRAPE_METRICS_PROM environment variables, not written when unset"""
+
+    def __init__(self, json_log=None, prometheus=None):
+        self.json_log = json_log or os.getenv(JSON_LOG_ENV)
+        self.prometheus = prometheus or os.getenv(PROMETHEUS_ENV)
+        self._lock = threading.Lock()
+        # (stage, source) -> [runs, errors, seconds, max seconds]
+        self.spans = {}
+        # (name, source) -> total
+        self.counters = {}
+        # finished spans since the last flush
+        self._events = []
+
+    def record(self, stage, source, seconds, error=None):
+        """adds one run of a stage that took seconds"""
+        with self._lock:
+            totals = self.spans.setdefault((stage, source), [0, 0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += error is not None
+            totals[2] += seconds
+            totals[3] = max(totals[3], seconds)
+            if self.json_log:
+                self._events.append({'time': datetime.now(timezone.utc).isoformat(), 'span': stage,
+                                     'source': source, 'seconds': round(seconds, 6), 'error': error})
+
+    @contextmanager
+    def span(self, stage, source):
+        """times the block as one run of stage for source. an exception counts as an error"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        except BaseException as exc:
+            self.record(stage, source, time.perf_counter() - t0, error=type(exc).__name__)
+            raise
+        self.record(stage, source, time.perf_counter() - t0)
+
+    def count(self, name, value=1, source=''):
+        """adds value to the counter name of source, e.g. count('rows', len(df), 'brent')"""
+        if not value:
+            return
+        with self._lock:
+            self.counters[(name, source)] = self.counters.get((name, source), 0) + value
+
+    def snapshot(self) -> dict:
+        """the totals: {'spans': {stage: {source: {...}}}, 'counters': {name: {source: total}}}"""
+        with self._lock:
+            spans = {}
+            for (stage, source), (runs, errors, seconds, longest) in self.spans.items():
+                spans.setdefault(stage, {})[source] = {'runs': runs, 'errors': errors,
+                                                       'seconds': round(seconds, 6), 'max': round(longest, 6)}
+            counters = {}
+            for (name, source), total in self.counters.items():
+                counters.setdefault(name, {})[source] = total
+        return {'spans': spans, 'counters': counters}
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            spans = sorted(self.spans.items())
+            counters = sorted(self.counters.items())
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{name}{{{labels}}} {value}' for labels, value in samples)
+
+        span_labels = [(f'stage="{_escape(stage)}",source="{_escape(source)}"', totals)
+                       for (stage, source), totals in spans]
+        family('scrape_stage_runs_total', 'counter', 'runs of a pipeline stage',
+               [(labels, totals[0]) for labels, totals in span_labels])
+        family('scrape_stage_errors_total', 'counter', 'runs of a pipeline stage that raised',
+               [(labels, totals[1]) for labels, totals in span_labels])
+        family('scrape_stage_seconds_total', 'counter', 'seconds spent in a pipeline stage',
+               [(labels, round(totals[2], 6)) for labels, totals in span_labels])
+        family('scrape_stage_seconds_max', 'gauge', 'longest run of a pipeline stage, in seconds',
+               [(labels, round(totals[3], 6)) for labels, totals in span_labels])
+        for name in sorted({name for (name, _), _ in counters}):
+            family(f'scrape_{name}_total', 'counter', f'{name} per source',
+                   [(f'source="{_escape(source)}"', total) for (counter, source), total in counters
+                    if counter == name])
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        """writes the finished spans and the counters to the json log, and the totals
+        to the Prometheus file. does nothing when neither is configured"""
+        with self._lock:
+            events, self._events = self._events, []
+        if self.json_log:
+            counters = self.snapshot()['counters']
+            events.append({'time': datetime.now(timezone.utc).isoformat(), 'counters': counters})
+            with open(self.json_log, 'a') as f:
+                f.writelines(json.dumps(event) + '\n' for event in events)
+        if self.prometheus:
+            # the textfile collector may read at any time, so the file is replaced at once
+            tmp_path = f'{self.prometheus}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp_path, self.prometheus)
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+            self._events.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics(**kwargs) -> Metrics:
+    """returns the process-wide metrics, creating it on first use.
+    kwargs only apply when it is created"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics(**kwargs)
+    return _metrics
+
+
+def span(stage, source):
+    return get_metrics().span(stage, source)
+
+
+def count(name, value=1, source=''):
+    get_metrics().count(name, value, source)
+
+
+def log_frame(logger, label, df, level=logging.DEBUG, rows=SAMPLE_ROWS):
+    """logs the shape, dtypes and a sample of the first and last rows of df,
+    only if the logger is enabled for level, so a frame is not formatted for nothing"""
+    if not logger.isEnabledFor(level):
+        return
+    if df is None:
+        logger.log(level, '%s: no frame', label)
+        return
+    sample = df if len(df) <= 2 * rows else df.iloc[list(range(rows)) + list(range(-rows, 0))]
+    dtypes = ', '.join(f'{column}={dtype}' for column, dtype in df.dtypes.items())
+    logger.log(level, '%s: %d rows [%s]\n%s', label, len(df), dtypes, sample.to_string())
@@ -0,0 +1,277 @@
+# Record and replay of the upstream http traffic
+#
+# In 'record' mode every response from ECB, Alpha Vantage and Yahoo is kept on disk,
+# in 'replay' mode the responses are served from disk and nothing goes over the network,
+# so the whole pipeline can be profiled and load tested offline. Replayed responses can
+# be slowed down and failed on purpose (injected latency and error rate); the decisions
+# are drawn from the seed, the request and its attempt number, so a replay run is
+# repeatable however the concurrent sources interleave.
+#
+# The transports that take part:
+#   requests:   ReplayAdapter, mounted on a session by install()
+#   yfinance:   curl_session(), a curl_cffi session for yf.download
+#   scrapy:     ScrapeFinanceDownloaderMiddleware (scrape_finance/middlewares.py)
+#
+# configured from the environment:
+#   SCRAPE_REPLAY: 'record' or 'replay', unset for live traffic
+#   SCRAPE_REPLAY_DIR: folder of the recordings, Default=./data/recordings
+#   SCRAPE_REPLAY_LATENCY: seconds added to every replayed response, '0.2' or a range '0.05-0.5'
+#   SCRAPE_REPLAY_ERROR_RATE: share of replayed responses that fail with SCRAPE_REPLAY_ERROR_STATUS (503)
+#   SCRAPE_REPLAY_SEED: seed of the injected latency and errors
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+RECORDINGS_PATH = './data/recordings'
+MODES = ('record', 'replay')
+
+# query parameters that are secret or change between sessions, left out of the recording key
+VOLATILE_PARAMS = ('apikey', 'crumb')
+
+# headers that describe the transfer, not the content. the requests based transports
+# record the decoded body, so these no longer apply to it
+TRANSFER_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding', 'connection')
+
+Recorded = namedtuple('Recorded', ['status', 'headers', 'body'])
+
+
+class RecordingNotFound(LookupError):
+    """replay mode found no recording for a request"""
+
+
+def _parse_latency(value):
+    if value is None or value == '':
+        return (0.0, 0.0)
+    if isinstance(value, (int, float)):
+        return (float(value), float(value))
+    if isinstance(value, (tuple, list)):
+        return (float(value[0]), float(value[1]))
+    low, _, high = str(value).partition('-')
+    return (float(low), float(high or low))
+
+
+class Recordings:
+    """the recorded responses, one <key>.json (status, headers) and <key>.body file per request,
+    in a folder per host, plus the injected faults of replay mode.
+      args:
+        root: folder of the recordings
+        mode: 'record', 'replay', or None for live traffic
+        latency: seconds added to a replayed response, a number or a (min, max) range
+        error_rate: share of replayed responses that fail, 0 to 1
+        error_status: http status of an injected failure. Default=503, retried by every transport
+        seed: seed of the injected latency and errors"""
+
+    def __init__(self, root=RECORDINGS_PATH, mode=None, latency=0, error_rate:float=0,
+                 error_status:int=503, seed=0):
+        if mode not in MODES + (None,):
+            raise ValueError(f'replay mode must be one of {MODES}, got {mode!r}')
+        self.root = root
+        self.mode = mode
+        self.latency = _parse_latency(latency)
+        self.error_rate = float(error_rate)
+        self.error_status = int(error_status)
+        self.seed = seed
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(root=os.getenv('SCRAPE_REPLAY_DIR') or RECORDINGS_PATH,
+                   mode=os.getenv('SCRAPE_REPLAY') or None,
+                   latency=os.getenv('SCRAPE_REPLAY_LATENCY'),
+                   error_rate=os.getenv('SCRAPE_REPLAY_ERROR_RATE') or 0,
+                   error_status=os.getenv('SCRAPE_REPLAY_ERROR_STATUS') or 503,
+                   seed=os.getenv('SCRAPE_REPLAY_SEED') or 0)
+
+    @property
+    def recording(self):
+        return self.mode == 'record'
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    def key(self, method, url, body=b''):
+        """the file name of a request: host and a digest of the method, the url with sorted
+        query parameters (without VOLATILE_PARAMS) and the body"""
+        parts = urlsplit(url)
+        query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                       if name.lower() not in VOLATILE_PARAMS)
+        canonical = urlunsplit(parts._replace(query=urlencode(query), fragment=''))
+        digest = hashlib.sha1(f'{method.upper()} {canonical}\n'.encode() + (body or b'')).hexdigest()
+        return os.path.join(parts.netloc.replace(':', '_') or 'local', digest[:20])
+
+    def save(self, method, url, status, headers:dict, body:bytes, body_request=b''):
+        """records a response. headers is {name: [values]}"""
+        key = self.key(method, url, body_request)
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # the url is kept for reading the recordings; secrets are not written
+        meta = {'method': method.upper(), 'url': self._public_url(url), 'status': int(status),
+                'headers': headers}
+        for suffix, content, mode in (('.body', body, 'wb'), ('.json', json.dumps(meta, indent=1), 'w')):
+            with open(f'{path}{suffix}.tmp', mode) as f:
+                f.write(content)
+            os.replace(f'{path}{suffix}.tmp', f'{path}{suffix}')
+
+    def load(self, method, url, body_request=b'') -> Recorded:
+        key = self.key(method, url, body_request)
+        path = os.path.join(self.root, key)
+        if not os.path.exists(f'{path}.json'):
+            raise RecordingNotFound(f'no recording of {method.upper()} {self._public_url(url)} in {self.root}')
+        with open(f'{path}.json') as f:
+            meta = json.load(f)
+        with open(f'{path}.body', 'rb') as f:
+            body = f.read()
+        return Recorded(meta['status'], meta['headers'], body)
+
+    def fault(self, method, url, body_request=b''):
+        """the injected (delay in seconds, failed) of the next replay of a request"""
+        key = self.key(method, url, body_request)
+        with self._lock:
+            attempt = self._attempts[key] = self._attempts.get(key, 0) + 1
+        rng = random.Random(f'{self.seed}:{key}:{attempt}')
+        delay = rng.uniform(*self.latency) if self.latency[1] > 0 else 0.0
+        return delay, rng.random() < self.error_rate
+
+    def replay(self, method, url, body_request=b'', sleep=True) -> Recorded:
+        """the recorded response of a request, or an error_status response when a failure
+        is injected. sleeps for the injected latency unless sleep=False"""
+        recorded = self.load(method, url, body_request)
+        delay, failed = self.fault(method, url, body_request)
+        if sleep and delay:
+            time.sleep(delay)
+        if failed:
+            return Recorded(self.error_status, {'Retry-After': ['0']}, b'injected failure')
+        return recorded
+
+    @staticmethod
+    def _public_url(url):
+        parts = urlsplit(url)
+        query = [(name, '' if name.lower() in VOLATILE_PARAMS else value)
+                 for name, value in parse_qsl(parts.query, keep_blank_values=True)]
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _header_lists(headers) -> dict:
+    return {name: [value] for name, value in headers.items() if name.lower() not in TRANSFER_HEADERS}
+
+
+class ReplayAdapter(BaseAdapter):
+    """requests transport adapter that records the responses of the wrapped adapter,
+    or replays them from the recordings without a connection.
+      args:
+        recordings: a Recordings in 'record' or 'replay' mode
+        adapter: the adapter that does the live requests when recording. Default=None, an HTTPAdapter"""
+
+    def __init__(self, recordings:Recordings, adapter:BaseAdapter=None):
+        super().__init__()
+        self.recordings = recordings
+        self.adapter = adapter or HTTPAdapter()
+
+    def send(self, request, **kwargs):
+        body = request.body.encode() if isinstance(request.body, str) else (request.body or b'')
+        if self.recordings.recording:
+            response = self.adapter.send(request, **kwargs)
+            self.recordings.save(request.method, request.url, response.status_code,
+                                 _header_lists(response.headers), response.content, body)
+            return response
+        try:
+            recorded = self.recordings.replay(request.method, request.url, body)
+        except RecordingNotFound as exc:
+            raise requests.ConnectionError(str(exc), request=request) from exc
+        return self._response(request, recorded)
+
+    @staticmethod
+    def _response(request, recorded):
+        response = requests.Response()
+        response.status_code = recorded.status
+        response.headers = CaseInsensitiveDict({name: ', '.join(values) for name, values in recorded.headers.items()})
+        response._content = recorded.body
+        response.url = request.url
+        response.request = request
+        response.reason = 'OK' if recorded.status < 400 else 'Replayed Error'
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+def install(session:requests.Session, recordings:Recordings=None) -> requests.Session:
+    """mounts a ReplayAdapter on the http and https prefixes of session, when recording or
+    replaying. when recording, the adapters already mounted do the live requests"""
+    recordings = recordings or get_recordings()
+    if recordings.mode is None:
+        return session
+    for prefix in ('https://', 'http://'):
+        session.mount(prefix, ReplayAdapter(recordings, session.get_adapter(prefix)))
+    return session
+
+
+def curl_session(recordings:Recordings=None, **kwargs):
+    """a curl_cffi session for yfinance that records or replays its responses,
+    a plain curl_cffi session for live traffic. kwargs are passed to the session"""
+    from curl_cffi import requests as curl_requests
+
+    recordings = recordings or get_recordings()
+    if recordings.mode is None:
+        return curl_requests.Session(**kwargs)
+
+    class ReplayCurlSession(curl_requests.Session):
+        def request(self, method, url, params=None, **request_kwargs):
+            full_url = _with_params(url, params)
+            if recordings.recording:
+                response = super().request(method, url, params=params, **request_kwargs)
+                recordings.save(method, full_url, response.status_code,
+                                _header_lists(response.headers), response.content)
+                return response
+            try:
+                recorded = recordings.replay(method, full_url)
+            except RecordingNotFound as exc:
+                raise curl_requests.exceptions.ConnectionError(str(exc)) from exc
+            response = curl_requests.Response()
+            response.url = full_url
+            response.status_code = recorded.status
+            response.ok = recorded.status < 400
+            response.reason = 'OK' if response.ok else 'Replayed Error'
+            for name, values in recorded.headers.items():
+                for value in values:
+                    response.headers[name] = value
+            response.content = recorded.body
+            return response
+
+    return ReplayCurlSession(**kwargs)
+
+
+def _with_params(url, params):
+    """url with params added to its query, as the request will be sent"""
+    if not params:
+        return url
+    parts = urlsplit(url)
+    items = params.items() if isinstance(params, dict) else params
+    query = parse_qsl(parts.query, keep_blank_values=True) + [(name, str(value)) for name, value in items]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+_recordings = None
+_recordings_lock = threading.Lock()
+
+def get_recordings() -> Recordings:
+    """the process-wide recordings, configured from the environment on first use"""
+    global _recordings
+    with _recordings_lock:
+        if _recordings is None:
+            _recordings = Recordings.from_env()
+    return _recordings
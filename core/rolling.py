@@ -0,0 +1,214 @@
+import json
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+class RollingWindow:
+    """sliding window over the rows of k aligned series.
+    the mean vector and the co-moment matrix are updated with Welford's method when
+    a row enters or leaves the window, so a new day costs O(k^2) however long the history is.
+    to keep rounding errors from adding up, they are recomputed from the buffered rows
+    once every `window` updates, which is still constant time per day on average.
+    a row with a NaN or inf makes the moments NaN while it is in the window (like pandas);
+    they are recomputed from the rows once it has left, instead of carrying the NaN along.
+      args:
+        window: number of rows in the window
+        k: number of series"""
+
+    def __init__(self, window:int, k:int):
+        self.window = window
+        self.k = k
+        self.rows = deque()
+        self.mean = np.zeros(k)
+        self.comoment = np.zeros((k, k))
+        self._updates = 0
+        # per series, the rows in the window where it is NaN or inf
+        self._nonfinite = np.zeros(k, dtype=int)
+
+    @property
+    def full(self):
+        return len(self.rows) == self.window
+
+    def _add(self, x):
+        n = len(self.rows)
+        delta = x - self.mean
+        self.mean = self.mean + delta / n
+        self.comoment += np.outer(delta, x - self.mean)
+
+    def _remove(self, y):
+        n = len(self.rows)
+        if n == 0:
+            self.mean = np.zeros(self.k)
+            self.comoment = np.zeros((self.k, self.k))
+            return
+        delta = y - self.mean
+        self.mean = self.mean - delta / n
+        self.comoment -= np.outer(delta, y - self.mean)
+
+    def _resync(self):
+        rows = np.array(self.rows)
+        self.mean = rows.mean(axis=0)
+        centered = rows - self.mean
+        self.comoment = centered.T @ centered
+        self._updates = 0
+
+    def push(self, row):
+        row = np.asarray(row, dtype=float)
+        with np.errstate(invalid='ignore'):
+            if self.full:
+                oldest = self.rows.popleft()
+                self._nonfinite -= ~np.isfinite(oldest)
+                self._remove(oldest)
+            self.rows.append(row)
+            self._nonfinite += ~np.isfinite(row)
+            self._add(row)
+
+            self._updates += 1
+            # a series whose last NaN or inf has left the window still has NaN moments
+            if self._updates >= self.window or (~np.isfinite(self.mean) & (self._nonfinite == 0)).any():
+                self._resync()
+
+    def means(self):
+        """mean per series, NaN until the window is full (like pandas rolling)"""
+        return self.mean.copy() if self.full else np.full(self.k, np.nan)
+
+    def cov(self):
+        if not self.full or self.window < 2:
+            return np.full((self.k, self.k), np.nan)
+        return self.comoment / (self.window - 1)
+
+    def stds(self):
+        return np.sqrt(np.clip(np.diag(self.cov()), 0, None))
+
+    def corr(self):
+        std = self.stds()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.cov() / np.outer(std, std)
+
+    def to_dict(self):
+        return {'window': self.window, 'k': self.k,
+                'rows': [row.tolist() for row in self.rows],
+                'mean': self.mean.tolist(),
+                'comoment': self.comoment.tolist(),
+                'updates': self._updates}
+
+    @classmethod
+    def from_dict(cls, state):
+        rolling = cls(state['window'], state['k'])
+        rolling.rows = deque(np.array(row) for row in state['rows'])
+        rolling.mean = np.array(state['mean'])
+        rolling.comoment = np.array(state['comoment']).reshape(rolling.k, rolling.k)
+        rolling._updates = state['updates']
+        rolling._nonfinite = sum((~np.isfinite(row) for row in rolling.rows), np.zeros(rolling.k, dtype=int))
+        return rolling
+
+
+class RollingStats:
+    """the rolling statistics of the combined table, updated one day at a time:
+    rolling means of the values and rolling std (volatility) of the daily % change.
+    the state is small (the rows of the longest window plus running moments)
+    and is saved as json next to the store, with a copy of it from before the last day,
+    so sources that write the same day at different times can rebuild it incrementally.
+      args:
+        columns: the columns of the combined table
+        value_windows: windows for the rolling means of the values
+        return_windows: windows for the rolling std and correlation of the daily % change"""
+
+    def __init__(self, columns, value_windows=(7, 30), return_windows=(20, 30)):
+        self.columns = list(columns)
+        self.last_date = None
+        self.last_row = None
+        self.previous = None
+        k = len(self.columns)
+        self.values = {window: RollingWindow(window, k) for window in value_windows}
+        self.returns = {window: RollingWindow(window, k) for window in return_windows}
+
+    def stat_columns(self):
+        return ([f'{col}_mean_{window}' for window in self.values for col in self.columns]
+                + [f'{col}_volatility_{window}' for window in self.returns for col in self.columns])
+
+    def push(self, date, row) -> list:
+        """adds one day, returns the statistics of the windows that end on it"""
+        row = np.asarray(row, dtype=float)
+        for rolling in self.values.values():
+            rolling.push(row)
+
+        if self.last_row is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                change = row / self.last_row - 1
+            for rolling in self.returns.values():
+                rolling.push(change)
+
+        self.last_row = row
+        self.last_date = pd.Timestamp(date)
+        return ([value for rolling in self.values.values() for value in rolling.means()]
+                + [value for rolling in self.returns.values() for value in rolling.stds()])
+
+    def update(self, df) -> pd.DataFrame:
+        """pushes the rows of df that are newer than the last pushed date, in date order.
+        returns one row of statistics per pushed day"""
+        df = df.sort_index()
+        if self.last_date is not None:
+            df = df.loc[df.index > self.last_date]
+        values = df[self.columns].to_numpy(dtype=float)
+        stats = [self.push(date, row) for date, row in zip(df.index[:-1], values[:-1])]
+        if len(df):
+            self.previous = self._state()
+            stats.append(self.push(df.index[-1], values[-1]))
+        return pd.DataFrame(stats, index=df.index, columns=self.stat_columns(), dtype=float)
+
+    def rewind(self, since) -> bool:
+        """steps back to the state before since, when since is the last pushed day (a later
+        source of the same day) or newer. returns False when older days changed and
+        the statistics have to be recomputed"""
+        since = pd.Timestamp(since)
+        if self.last_date is None or since > self.last_date:
+            return True
+        if self.previous is None:
+            return False
+        previous = self.from_dict(self.previous)
+        if previous.last_date is not None and previous.last_date >= since:
+            return False
+        self.__dict__.update(previous.__dict__)
+        return True
+
+    def corr(self, window:int):
+        """latest correlation matrix of the daily % change over window days"""
+        return pd.DataFrame(self.returns[window].corr(), index=self.columns, columns=self.columns)
+
+    def _state(self):
+        return {'columns': self.columns,
+                'last_date': None if self.last_date is None else self.last_date.isoformat(),
+                'last_row': None if self.last_row is None else self.last_row.tolist(),
+                'values': [rolling.to_dict() for rolling in self.values.values()],
+                'returns': [rolling.to_dict() for rolling in self.returns.values()]}
+
+    def to_dict(self):
+        return dict(self._state(), previous=self.previous)
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls(state['columns'], value_windows=(), return_windows=())
+        stats.last_date = None if state['last_date'] is None else pd.Timestamp(state['last_date'])
+        stats.last_row = None if state['last_row'] is None else np.array(state['last_row'])
+        stats.values = {s['window']: RollingWindow.from_dict(s) for s in state['values']}
+        stats.returns = {s['window']: RollingWindow.from_dict(s) for s in state['returns']}
+        stats.previous = state.get('previous')
+        return stats
+
+    def save(self, path):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """returns the saved statistics, None if there is no saved state"""
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,99 @@
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+
+DEFAULT_TIMEOUT = 120  # seconds, per source
+
+
+def _start_in_thread(name, fn) -> Future:
+    """runs fn in a daemon thread and returns a future with its result.
+    daemon threads are used so a source that never returns cannot keep
+    the interpreter alive after the orchestrator gave up on it"""
+    future = Future()
+
+    def target():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    threading.Thread(target=target, name=f'source-{name}', daemon=True).start()
+    return future
+
+
+def _source_report(name, status, elapsed, error=None) -> dict:
+    return {'name': name,
+            'status': status,
+            'elapsed': round(elapsed, 3),
+            'error': error}
+
+
+def run_sources(tasks: dict, timeout=DEFAULT_TIMEOUT, concurrent: bool = True, drain=()):
+    """runs a set of named fetch callables, either all at once in threads or one after another.
+    a failing or slow source does not stop the others.
+      args:
+        tasks: dict of {name: callable}. each callable takes no args and returns the fetched object
+        timeout: seconds allowed per source; a number for all sources or a dict of {name: seconds}.
+         only enforced in concurrent mode
+        concurrent: bool. Default=True, False runs the sources sequentially
+        drain: names of the sources that are still waited for after their timeout, because they
+         write to a store the caller commits next. they are reported as timed out, with their result
+    returns:
+        (results, report): results is a dict of {name: result or None},
+        report is a dict with total and per-source latency and status"""
+
+    def timeout_for(name):
+        if isinstance(timeout, dict):
+            return timeout.get(name, DEFAULT_TIMEOUT)
+        return timeout
+
+    results = {}
+    sources = []
+    t0 = time.perf_counter()
+
+    if concurrent:
+        futures = {name: _start_in_thread(name, fn) for name, fn in tasks.items()}
+        finished_at = {}
+        for name, future in futures.items():
+            future.add_done_callback(
+                lambda _, name=name: finished_at.setdefault(name, time.perf_counter()))
+
+        for name, future in futures.items():
+            # every source started at t0, so its deadline is absolute
+            remaining = max(0, t0 + timeout_for(name) - time.perf_counter())
+            try:
+                results[name] = future.result(timeout=remaining)
+                status, error = 'ok', None
+            except FutureTimeout:
+                future.cancel()
+                results[name] = None
+                status, error = 'timeout', f'no result after {timeout_for(name)} seconds'
+                if name in drain:
+                    try:
+                        results[name] = future.result()
+                    except Exception as exc:
+                        error = f'{error}, then {exc!r}'
+            except Exception as exc:
+                results[name] = None
+                status, error = 'error', repr(exc)
+            elapsed = finished_at.get(name, time.perf_counter()) - t0
+            sources.append(_source_report(name, status, elapsed, error))
+
+    else:
+        for name, fn in tasks.items():
+            t1 = time.perf_counter()
+            try:
+                results[name] = fn()
+                status, error = 'ok', None
+            except Exception as exc:
+                results[name] = None
+                status, error = 'error', repr(exc)
+            sources.append(_source_report(name, status, time.perf_counter() - t1, error))
+
+    report = {'mode': 'concurrent' if concurrent else 'sequential',
+              'total': round(time.perf_counter() - t0, 3),
+              'sources': sources}
+    return results, report
@@ -0,0 +1,189 @@
+import logging
+import random
+import threading
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from core.storage import BaseStore, StoreLocked
+
+
+logger = logging.getLogger(__name__)
+
+# days a cadence runs on, 0 is Monday
+CADENCE_DAYS = {'daily': (0, 1, 2, 3, 4, 5, 6), 'weekdays': (0, 1, 2, 3, 4)}
+# the longest the loop sleeps at once, so a suspended machine or a clock change is noticed
+MAX_SLEEP = 60
+
+
+class Cadence:
+    """when a source publishes, as written in the sources csv: '<daily|weekdays> [HH:MM] [timezone]',
+    e.g. 'weekdays 16:00 Europe/Berlin'. without a time the source is collected at midnight UTC"""
+
+    def __init__(self, text):
+        parts = (text or 'daily').split()
+        if parts[0] not in CADENCE_DAYS:
+            raise ValueError(f'cadence {text!r}: expected one of {sorted(CADENCE_DAYS)} first')
+        self.text = ' '.join(parts)
+        self.days = CADENCE_DAYS[parts[0]]
+        hour, minute = (parts[1] if len(parts) > 1 else '00:00').split(':')
+        self.time = time(int(hour), int(minute))
+        self.timezone = ZoneInfo(parts[2] if len(parts) > 2 else 'UTC')
+
+    def __repr__(self):
+        return f'Cadence({self.text!r})'
+
+    def next_run(self, after:datetime, margin:timedelta=timedelta(0)) -> datetime:
+        """the first publication time plus margin that is later than after (an aware datetime)"""
+        day = after.astimezone(self.timezone).date()
+        for _ in range(8):
+            run = datetime.combine(day, self.time, self.timezone) + margin
+            if day.weekday() in self.days and run > after:
+                return run
+            day += timedelta(days=1)
+        raise ValueError(f'cadence {self.text!r} has no run day')
+
+
+def _has_new_rows(df_dict):
+    if df_dict.get('stored'):
+        return df_dict['written_from'] is not None
+    return df_dict['df'] is not None and not df_dict['df'].empty
+
+
+class _Job:
+    """the sources of one cadence, and their next run"""
+
+    def __init__(self, cadence, sources):
+        self.cadence = cadence
+        self.sources = sources
+        self.pending = sources
+        self.due = None
+        self.attempt = 0
+
+
+class Scheduler:
+    """long running service that collects every source at its own publication time,
+    in one warm process: the scrape engine, the http sessions and the store are set up
+    once and reused by every run.
+    sources with the same cadence run together. a source that fails, times out or has no new
+    rows yet (published late) is retried with exponential, jittered backoff, up to retries times,
+    then waits for its next publication. every run holds the store lock, so a run never overlaps
+    another writer of the store (another scheduler, or the cli).
+      args:
+        api_key: Alpha Vantage API Key
+        store: the storage backend. Default=None, the hd5 file
+        sources: list of Source. Default=None, the sources in data/urls.csv
+        margin: seconds after the publication time before a source is collected. Default=1800
+        retries: retries of a source per publication. Default=3
+        backoff: seconds before the first retry, doubled on each retry. Default=600
+        jitter: each retry delay is varied by up to this share, so retries don't line up. Default=0.2
+        lock_timeout: seconds a run waits for the store lock before it is retried. Default=60
+        concurrent: fetch the sources of a run in parallel. Default=True"""
+
+    def __init__(self, api_key=None, store:BaseStore=None, sources:list=None, margin:float=1800,
+                 retries:int=3, backoff:float=600, jitter:float=0.2, lock_timeout:float=60, concurrent:bool=True):
+        from core.data_handler import HdfStore
+        from core.sources import load_sources
+
+        self.api_key = api_key
+        self.store = store or HdfStore()
+        self.margin = timedelta(seconds=margin)
+        self.retries = retries
+        self.backoff = backoff
+        self.jitter = jitter
+        self.lock_timeout = lock_timeout
+        self.concurrent = concurrent
+        self._random = random.Random()
+        self._stop = threading.Event()
+
+        groups = {}
+        for source in (load_sources() if sources is None else sources):
+            groups.setdefault(Cadence(source.cadence).text, []).append(source)
+        self.jobs = [_Job(Cadence(text), group) for text, group in groups.items()]
+
+    @staticmethod
+    def now() -> datetime:
+        return datetime.now().astimezone()
+
+    def schedule(self, now:datetime=None):
+        """sets the next publication run of every job"""
+        now = now or self.now()
+        for job in self.jobs:
+            job.due = job.cadence.next_run(now, self.margin)
+            job.pending = job.sources
+            job.attempt = 0
+
+    def retry_delay(self, attempt) -> float:
+        """seconds before retry number attempt (from 1), with jitter"""
+        delay = self.backoff * 2 ** (attempt - 1)
+        return delay * self._random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def run_job(self, job) -> list:
+        """collects the pending sources of job in one store transaction.
+        returns the sources to retry"""
+        from core.data_handler import scrape_orchestrator
+
+        keys = [source.key for source in job.pending]
+        logger.info('collecting %s (%s, attempt %d)', ', '.join(keys), job.cadence.text, job.attempt + 1)
+        try:
+            with self.store.transaction(timeout=self.lock_timeout):
+                # a retry waits for a late publication, so cached replies are asked again
+                df_list = scrape_orchestrator(self.api_key, concurrent=self.concurrent, sources=job.pending,
+                                              store=self.store, revalidate=job.attempt > 0)
+        except StoreLocked as exc:
+            logger.warning('store is locked, %s', exc)
+            return job.pending
+        except Exception:
+            logger.exception('run of %s failed', ', '.join(keys))
+            return job.pending
+
+        retry = set()
+        for df_dict in df_list:
+            if df_dict['status'] in ('error', 'timeout'):
+                logger.warning('%s: %s %s', df_dict['name'], df_dict['status'], df_dict['error'] or '')
+                retry.add(df_dict['name'])
+            elif df_dict['status'] == 'ok' and not _has_new_rows(df_dict):
+                logger.info('%s: no new rows yet', df_dict['name'])
+                retry.add(df_dict['name'])
+        return [source for source in job.pending if source.key in retry]
+
+    def run_pending(self, now:datetime=None):
+        """runs the jobs that are due and sets their next run"""
+        now = now or self.now()
+        for job in self.jobs:
+            if job.due is None or job.due > now:
+                continue
+            retry = self.run_job(job)
+            if retry and job.attempt < self.retries:
+                job.attempt += 1
+                job.pending = retry
+                job.due = self.now() + timedelta(seconds=self.retry_delay(job.attempt))
+                logger.info('retrying %s at %s', ', '.join(source.key for source in retry),
+                            job.due.isoformat(timespec='seconds'))
+            else:
+                if retry:
+                    logger.warning('giving up on %s until the next publication',
+                                   ', '.join(source.key for source in retry))
+                job.due = job.cadence.next_run(self.now(), self.margin)
+                job.pending = job.sources
+                job.attempt = 0
+                logger.info('next run of %s at %s', job.cadence.text, job.due.isoformat(timespec='seconds'))
+
+    def run_forever(self, run_now:bool=False):
+        """runs until stop() is called.
+          args:
+            run_now: collect every source once at start, then follow the schedule"""
+        self._stop.clear()
+        self.schedule()
+        if run_now:
+            for job in self.jobs:
+                job.due = self.now()
+        for job in self.jobs:
+            logger.info('%s: %s, next run at %s', job.cadence.text,
+                        ', '.join(source.key for source in job.sources), job.due.isoformat(timespec='seconds'))
+        while not self._stop.is_set():
+            self.run_pending()
+            wait = (min(job.due for job in self.jobs) - self.now()).total_seconds()
+            self._stop.wait(min(max(wait, 0), MAX_SLEEP))
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+
+VALUE_DTYPES = ('float32', 'float64')
+
+
+class SchemaError(ValueError):
+    """a frame does not match the schema of its series"""
+
+
+class SeriesSchema:
+    """the typed form of a collected series: one value column named '<key>_value'
+    (or several, for a wide table like the currencies) of a float dtype, 
+    and a unique datetime64[ns] index named 'date', newest first.
+    frames are brought into this form once, when they are collected, and checked
+    again before they are written.
+      args:
+        key: the store key of the series
+        column: name of the value column. Default=None, for '<key>_value'
+        columns: the value columns of a wide table, instead of column
+        dtype: 'float64' or 'float32'. float32 halves the size of a series,
+          and keeps about 7 significant digits, plenty for prices and rates"""
+
+    def __init__(self, key, column=None, dtype='float64', columns:list=None):
+        if dtype not in VALUE_DTYPES:
+            raise SchemaError(f'{key}: unsupported value dtype {dtype!r}, expected one of {VALUE_DTYPES}')
+        self.key = key
+        self.columns = list(columns) if columns else [column or f'{key}_value']
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def column(self):
+        """the value column of a single column series"""
+        return self.columns[0]
+
+    @property
+    def wide(self):
+        return len(self.columns) > 1
+
+    def __repr__(self):
+        columns = f'columns={self.columns!r}' if self.wide else f'column={self.column!r}'
+        return f'SeriesSchema({self.key!r}, {columns}, dtype={self.dtype.name!r})'
+
+    def apply(self, df) -> pd.DataFrame:
+        """returns df in the schema. a single value column under another name
+        (as 'close_BZ=F' of older runs) is renamed; a wide table is aligned to the
+        schema columns, a column that was not collected is all NaN"""
+        if df is None:
+            return None
+        if list(df.columns) != self.columns:
+            if self.wide:
+                df = df.reindex(columns=self.columns)
+            elif len(df.columns) != 1:
+                raise SchemaError(f'{self.key}: expected one value column, got {list(df.columns)}')
+            else:
+                df = df.rename(columns={df.columns[0]: self.column})
+        df = df.astype(self.dtype, copy=False)
+        if df.index.dtype != 'datetime64[ns]':
+            df.index = df.index.astype('datetime64[ns]')
+        df.index.name = 'date'
+        df = df[~df.index.duplicated(keep='last')]
+        if not df.index.is_monotonic_decreasing:
+            df = df.sort_index(ascending=False)
+        return df
+
+    def validate(self, df):
+        """raises SchemaError if df is not in the schema"""
+        if list(df.columns) != self.columns:
+            raise SchemaError(f'{self.key}: expected columns {self.columns}, got {list(df.columns)}')
+        wrong = {col: str(dtype) for col, dtype in df.dtypes.items() if dtype != self.dtype}
+        if wrong:
+            raise SchemaError(f'{self.key}: expected {self.dtype.name} values, got {wrong}')
+        validate_frame(df, self.key)
+
+
+def validate_frame(df, name):
+    """checks what every stored table needs: a unique datetime64[ns] index and float columns"""
+    if df.index.dtype != 'datetime64[ns]':
+        raise SchemaError(f'{name}: expected a datetime64[ns] index, got {df.index.dtype}')
+    if not df.index.is_unique:
+        raise SchemaError(f'{name}: the index holds repeated dates')
+    not_float = {col: str(dtype) for col, dtype in df.dtypes.items() if dtype.name not in VALUE_DTYPES}
+    if not_float:
+        raise SchemaError(f'{name}: expected float columns, got {not_float}')
+
+
+def added_columns(stored_columns, columns) -> list:
+    """the columns that migrate_columns adds as NaN to a stored wide table, e.g. the currencies
+    that are collected since the table was stored. none for a renamed single column table"""
+    stored_columns = list(stored_columns)
+    if not set(stored_columns).intersection(columns):
+        return []
+    return [column for column in columns if column not in stored_columns]
+
+
+def migrate_columns(stored, df, name):
+    """brings a stored table to the columns and dtypes of df:
+    a single column table is renamed and cast, e.g. a series stored as 'close_^VIX' float64 
+    that is now collected as 'vix_value' float32. a table that shares columns with df 
+    (a wide table that gained or lost currencies) is aligned to them, new columns are NaN
+    until they are collected (see added_columns).
+    returns the migrated table, or stored if it already matches"""
+    if list(stored.columns) == list(df.columns) and (stored.dtypes == df.dtypes).all():
+        return stored
+    if stored.columns.intersection(df.columns).empty:
+        if len(stored.columns) != 1 or len(df.columns) != 1:
+            raise SchemaError(f'{name}: stored columns {list(stored.columns)} do not match {list(df.columns)}')
+        stored = stored.rename(columns={stored.columns[0]: df.columns[0]})
+    print(f'{name}: migrating stored columns {list(stored.columns)} to {list(df.columns)}')
+    return stored.reindex(columns=df.columns).astype(df.dtypes.to_dict())
+
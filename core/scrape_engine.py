@@ -0,0 +1,154 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from scrapy import signals
+from scrapy.crawler import CrawlerRunner
+from scrapy.settings import Settings
+from twisted.python.failure import Failure
+
+
+SETTINGS_MODULE = 'scrape_finance.settings'
+
+
+class ScrapeEngine:
+    """keeps one Twisted reactor running in a background thread, so Scrapy spiders
+    can be crawled again and again inside the same interpreter.
+    items are returned per crawl through a future (or an async generator),
+    not through the global signal dispatcher.
+      args:
+        settings: dict of Scrapy settings, applied on top of the project settings"""
+
+    def __init__(self, settings:dict=None):
+        self.settings = Settings()
+        self.settings.setmodule(SETTINGS_MODULE, priority='project')
+        if settings:
+            self.settings.setdict(settings, priority='cmdline')
+        self.reactor = None
+        self.runner = None
+        self._thread = None
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run_reactor(self):
+        # the reactor (and its asyncio loop) is installed in this thread,
+        # so it does not take over the event loop of the calling thread
+        from scrapy.utils.reactor import install_reactor
+        reactor_path = self.settings.get('TWISTED_REACTOR')
+        if reactor_path:
+            install_reactor(reactor_path, self.settings.get('ASYNCIO_EVENT_LOOP'))
+
+        from twisted.internet import reactor
+        self.reactor = reactor
+        self.runner = CrawlerRunner(self.settings)
+        reactor.callWhenRunning(self._started.set)
+        reactor.run(installSignalHandlers=False)
+
+    def start(self):
+        """starts the reactor thread, if it is not running yet"""
+        with self._lock:
+            if not self.running:
+                self._started.clear()
+                self._thread = threading.Thread(
+                    target=self._run_reactor, name='scrape-engine', daemon=True)
+                self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        """stops the reactor. a stopped reactor cannot be restarted in this interpreter"""
+        if self.running:
+            self.reactor.callFromThread(self.reactor.stop)
+            self._thread.join()
+
+    def _schedule_crawl(self, spider_cls, on_item, on_done, timeout, kwargs):
+        """runs in the reactor thread"""
+        crawler = self.runner.create_crawler(spider_cls)
+
+        def item_scraped(item, response, spider):
+            on_item(item)
+
+        # weak=False keeps the closure alive; it is disconnected again when the crawl ends
+        crawler.signals.connect(item_scraped, signal=signals.item_scraped, weak=False)
+        timer = None
+        if timeout:
+            def cut_off():
+                # tells the item pipelines to drop the writes that did not start yet
+                crawler.stats.set_value('crawl/timed_out', timeout)
+                crawler.stop()
+            timer = self.reactor.callLater(timeout, cut_off)
+
+        def finished(result):
+            crawler.signals.disconnect(item_scraped, signal=signals.item_scraped)
+            if timer is not None and timer.active():
+                timer.cancel()
+            on_done(result, crawler)
+
+        self.runner.crawl(crawler, **kwargs).addBoth(finished)
+
+    def crawl(self, spider_cls, timeout=None, **kwargs) -> Future:
+        """crawls a spider once.
+          args:
+            spider_cls: the scrapy.Spider class to run
+            timeout: seconds before the crawl is closed, None for no limit
+            kwargs: passed to the spider
+        returns:
+            a concurrent.futures.Future with the list of scraped items. 
+            its `stats` attribute holds the crawl stats once it is done"""
+        self.start()
+        future = Future()
+        future.set_running_or_notify_cancel()
+        items = []
+
+        def on_done(result, crawler):
+            future.stats = crawler.stats.get_stats()
+            if isinstance(result, Failure):
+                future.set_exception(result.value)
+            else:
+                future.set_result(items)
+
+        self.reactor.callFromThread(
+            self._schedule_crawl, spider_cls, items.append, on_done, timeout, kwargs)
+        return future
+
+    async def stream(self, spider_cls, timeout=None, **kwargs):
+        """async generator version of crawl(), yields each item as soon as it is scraped"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def on_item(item):
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        def on_done(result, crawler):
+            loop.call_soon_threadsafe(queue.put_nowait, _CrawlDone(result))
+
+        self.reactor.callFromThread(
+            self._schedule_crawl, spider_cls, on_item, on_done, timeout, kwargs)
+        while not isinstance(item := await queue.get(), _CrawlDone):
+            yield item
+        if isinstance(item.result, Failure):
+            raise item.result.value
+
+
+class _CrawlDone:
+    """end of stream marker, carries the crawl result"""
+    def __init__(self, result):
+        self.result = result
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine(settings:dict=None) -> ScrapeEngine:
+    """returns the process-wide scrape engine, creating it on first use.
+    settings only apply when the engine is created"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ScrapeEngine(settings)
+    return _engine
@@ -0,0 +1,78 @@
+import csv
+
+from core.schema import SeriesSchema
+
+
+SOURCES_PATH = './data/urls.csv'
+
+# fetcher type: (fetch function, batched, schema columns function, writes to the store)
+FETCHERS = {}
+
+
+class Source:
+    """one collected series, as declared in the sources csv
+      args:
+        name: name of the source
+        fetcher: fetcher type, one of FETCHERS (scrapy, rest_json, yfinance)
+        target: what the fetcher reads: a url, an api url or a ticker.
+          empty for the scrapy fetcher, its spiders build the ECB urls per currency
+        key: the store key of the series
+        cadence: when the source publishes, e.g. 'daily 16:00 Europe/Berlin'
+        params: dict of extra fetcher parameters. 'column' and 'dtype' set the schema of the series,
+          a fetcher that collects a wide table declares its columns from the params"""
+
+    def __init__(self, name, fetcher, target, key, cadence='daily', params:dict=None):
+        self.name = name
+        self.fetcher = fetcher
+        self.target = target
+        self.key = key
+        self.cadence = cadence or 'daily'
+        self.params = dict(params or {})
+        _, _, columns, _ = FETCHERS.get(fetcher, (None, False, None, False))
+        self.schema = SeriesSchema(key, column=self.params.get('column'), dtype=self.params.pop('dtype', 'float64'),
+                                   columns=columns(self.params) if columns else None)
+
+    def __repr__(self):
+        return f'Source({self.name!r}, fetcher={self.fetcher!r}, target={self.target!r}, key={self.key!r})'
+
+
+def parse_params(text:str) -> dict:
+    """'currency=usd;data_path=data' -> {'currency': 'usd', 'data_path': 'data'}"""
+    params = {}
+    for pair in filter(None, (text or '').split(';')):
+        name, _, value = pair.partition('=')
+        params[name.strip()] = value.strip()
+    return params
+
+
+def load_sources(path=SOURCES_PATH) -> list:
+    """reads the sources csv: name,fetcher,target,params,key,cadence"""
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    sources = []
+    for row in rows:
+        if row['fetcher'] not in FETCHERS:
+            raise ValueError(f'source {row["name"]}: unknown fetcher {row["fetcher"]!r}, '
+                             f'expected one of {sorted(FETCHERS)}')
+        if row['fetcher'] == 'scrapy' and row['target']:
+            raise ValueError(f'source {row["name"]}: the scrapy fetcher takes no target, '
+                             f'the ECB urls are built per currency from the currency param')
+        sources.append(Source(row['name'], row['fetcher'], row['target'], row['key'],
+                              cadence=row.get('cadence'), params=parse_params(row.get('params'))))
+    return sources
+
+
+def register_fetcher(fetcher:str, batch:bool=False, columns=None, writes:bool=False):
+    """registers a fetch function for a fetcher type.
+    the function is called as fetch(sources, start_dates, api_key, timeout, store=None, revalidate=False) and returns
+    {key: DataFrame}, or {key: StoredSeries} when it wrote the series to the store itself.
+    a batched fetcher gets all sources of its type in one call, otherwise
+    it is called once per source, so the sources run in parallel.
+    columns: for a fetcher that collects a wide table, a function of the source params
+    that returns the value columns.
+    writes: the fetcher writes to the store while it collects, so it is waited for even after
+    its timeout: its writes must be done before the caller commits the store"""
+    def decorator(fetch):
+        FETCHERS[fetcher] = (fetch, batch, columns, writes)
+        return fetch
+    return decorator
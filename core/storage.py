@@ -0,0 +1,709 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from core.metrics import span, count
+from core.rolling import RollingStats
+from core.schema import validate_frame, migrate_columns, added_columns
+
+
+ARROW_PATH = './data/oil_market_data'
+
+# tables derived from the series, kept by the store next to them
+COMBINED_TABLE = 'combined'
+ROLLING_TABLE = 'rolling'
+DERIVED_TABLES = (COMBINED_TABLE, ROLLING_TABLE)
+
+# a series that was written to the store while it was collected:
+# the earliest date written (None if nothing changed), the number of rows handed to the store
+# and why the collection was incomplete (None if it was not)
+StoredSeries = namedtuple('StoredSeries', ['written_from', 'rows', 'error'], defaults=[None])
+
+
+def unchanged_rows(stored, df):
+    """boolean mask of the rows in df that are stored with the same values (NaN equals NaN)"""
+    is_stored = df.index.isin(stored.index)
+    stored = stored.reindex(df.index)[df.columns]
+    same = (stored == df) | (stored.isna() & df.isna())
+    return same.all(axis=1).to_numpy() & is_stored
+
+
+def fill_missing(stored, df):
+    """fills the NaN values of df from the stored rows of the same dates, so a value that was
+    not collected this time (e.g. a currency whose file failed) does not erase a stored one"""
+    return df.fillna(stored.reindex(index=df.index, columns=df.columns))
+
+
+def replace_durably(tmp_path, path):
+    """moves a fully written file over path: flushes it to disk, renames it,
+    then flushes the folder, so after a crash path is either the old or the new file"""
+    with open(tmp_path, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class StoreLocked(RuntimeError):
+    """another process holds the lock of the store"""
+
+
+class StoreLock:
+    """an exclusive flock on a lockfile next to the store, so two runs never write it at once.
+    the lock is released when the holder exits, even when it crashes.
+    the holder's pid and start time are written to the file, to see who holds it.
+    used as a context manager:
+        with store.lock(timeout=60):
+            ...
+      args:
+        path: the lockfile
+        timeout: seconds to wait for the lock. Default=None, raise StoreLocked at once if it is held"""
+
+    def __init__(self, path, timeout=None):
+        self.path = path
+        self.timeout = timeout
+        self._file = None
+
+    def acquire(self):
+        import fcntl
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a+')
+        deadline = time.monotonic() + (self.timeout or 0)
+        while True:
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    self._file.seek(0)
+                    holder = self._file.read().strip()
+                    self._file.close()
+                    self._file = None
+                    raise StoreLocked(f'{self.path} is held by {holder or "another process"}')
+                time.sleep(0.2)
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(f'pid {os.getpid()} since {datetime.now().isoformat(timespec="seconds")}\n')
+        self._file.flush()
+        return self
+
+    def release(self):
+        import fcntl
+
+        if self._file is not None:
+            self._file.truncate(0)
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+_transaction_guard = threading.Lock()
+
+
+class BaseStore:
+    """interface of the market data storage backends.
+    a store keeps one table per collected series plus the derived combined table
+    (all series joined on date and forward filled) and the rolling statistics table.
+    every table has a date index and at most one row per date"""
+
+    def series(self) -> list:
+        """names of the collected series"""
+        raise NotImplementedError
+
+    def last_dates(self) -> dict:
+        """returns {name: last ingested date} for every series in the store"""
+        raise NotImplementedError
+
+    def revision(self) -> int:
+        """write counter of the store, changes whenever any table is written"""
+        raise NotImplementedError
+
+    def missing(self) -> dict:
+        """returns {name: {column: date}}, the columns of a wide series that could not be collected
+        from date on (e.g. a currency whose file failed) while the others were written.
+        the next run collects the series again from the earliest of these dates"""
+        raise NotImplementedError
+
+    def set_missing(self, name, columns:dict):
+        """replaces the missing columns of a series with {column: date}, {} when it is complete"""
+        raise NotImplementedError
+
+    def save(self, df_dict):
+        """upserts {'name': series name, 'df': DataFrame}: new dates are added, changed dates replaced,
+        a missing (NaN) value does not replace a stored one.
+        returns the earliest date that was written, None if nothing was written"""
+        raise NotImplementedError
+
+    def load(self, start=None, end=None, series:list=None) -> list:
+        """the stored series as a list of DataFrames, optionally only a date window and only some series"""
+        raise NotImplementedError
+
+    def load_combined(self, start=None, end=None):
+        """the combined table, None if it is not built yet"""
+        raise NotImplementedError
+
+    def load_rolling_stats(self, start=None, end=None):
+        """the rolling statistics table, None if it is not built yet"""
+        raise NotImplementedError
+
+    def has_combined(self) -> bool:
+        raise NotImplementedError
+
+    def update_derived(self, since=None):
+        """updates the combined and rolling tables from since, the earliest date that changed
+        in any series. None rebuilds them completely"""
+        raise NotImplementedError
+
+    @property
+    def lock_path(self) -> str:
+        """the lockfile that writers of this store hold, see StoreLock"""
+        raise NotImplementedError
+
+    def lock(self, timeout=None):
+        """a StoreLock on this store, to be held while writing"""
+        return StoreLock(self.lock_path, timeout=timeout)
+
+    @contextmanager
+    def transaction(self, timeout=None):
+        """the writes of the block as one unit, from a single writer: holds the store lock,
+        and the backend commits the writes when the block ends or drops them when it raises.
+        readers don't take the lock, they keep reading the last committed state.
+        a transaction inside a transaction of the same store joins it.
+          args:
+            timeout: seconds to wait for the lock. Default=None, raise StoreLocked at once if it is held"""
+        with _transaction_guard:
+            joined = getattr(self, '_transaction_depth', 0) > 0
+            if joined:
+                self._transaction_depth += 1
+        if joined:
+            try:
+                yield self
+            finally:
+                self._transaction_depth -= 1
+            return
+
+        with self.lock(timeout=timeout):
+            self._transaction_depth = 1
+            try:
+                yield self
+                self._commit()
+            except BaseException:
+                self._abort()
+                raise
+            finally:
+                self._transaction_depth = 0
+
+    def _commit(self):
+        """makes the writes of the transaction visible to readers"""
+
+    def _abort(self):
+        """drops the writes of a transaction that raised"""
+
+
+class ArrowStore(BaseStore):
+    """columnar store: one folder per table, partitioned by year, each partition
+    made of Parquet (or Arrow IPC) files named after the first and last date they hold:
+        <root>/<table>/year=2025/20250102_20251231_<token>.parquet
+    a daily run only adds a small file to the current year, nothing is rewritten;
+    a year is compacted into one file when it collects too many files or a stored date changes.
+    date range reads skip the partitions and files outside the range by their names,
+    filter the row groups by their date statistics, and memory map the files.
+    dates are stored as arrow date32, int32 day numbers, half the size of a timestamp.
+    the tables, their files and the write counter are listed in <root>/_meta.json, and readers
+    only read the listed files. a transaction writes new files next to the listed ones and
+    keeps its listing in memory; the commit replaces _meta.json and then removes the files
+    it replaced, an abort removes the files it wrote. files that a crashed writer left behind
+    are not listed, and are removed by the next transaction.
+    needs pyarrow (pip install pyarrow).
+      args:
+        root: folder of the store
+        file_format: 'parquet' (compressed) or 'ipc' (uncompressed Arrow IPC, zero copy reads)
+        max_files: files per year partition before it is compacted"""
+
+    def __init__(self, root=ARROW_PATH, file_format='parquet', max_files:int=32):
+        try:
+            import pyarrow
+            import pyarrow.compute
+            import pyarrow.parquet
+        except ImportError as exc:
+            raise ImportError('ArrowStore needs pyarrow, install it with: pip install pyarrow') from exc
+        if file_format not in ('parquet', 'ipc'):
+            raise ValueError(f'unknown file format {file_format!r}, expected parquet or ipc')
+        self.pa = pyarrow
+        self.root = root
+        self.file_format = file_format
+        self.extension = '.parquet' if file_format == 'parquet' else '.arrow'
+        self.max_files = max_files
+        self.meta_path = os.path.join(root, '_meta.json')
+        self.rolling_state_path = os.path.join(root, '_rolling.json')
+        # the listing of the transaction, the files it wrote and the listed files it replaced
+        self._staged = None
+        self._created = []
+        self._obsolete = []
+
+    # metadata and transactions
+
+    def _committed_meta(self):
+        if not os.path.exists(self.meta_path):
+            return {'revision': 0, 'tables': {}, 'files': {}}
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        # stores written before the files were listed
+        if 'files' not in meta:
+            meta['files'] = {name: self._listed_files(name) for name in meta['tables']}
+        return meta
+
+    def _read_meta(self):
+        """the listing of the transaction while this store writes one, else the committed one"""
+        return copy.deepcopy(self._staged) if self._staged is not None else self._committed_meta()
+
+    def _stage(self):
+        """the listing the writes go to, the first write of a transaction copies the committed one"""
+        if getattr(self, '_transaction_depth', 0) == 0:
+            raise RuntimeError('ArrowStore writes must run inside store.transaction()')
+        if self._staged is None:
+            self._staged = self._committed_meta()
+            self._remove_unlisted()
+        return self._staged
+
+    def _write_meta(self, meta):
+        meta['files'] = self._stage()['files']
+        meta['revision'] += 1
+        self._staged = meta
+
+    def _commit(self):
+        staged, self._staged = self._staged, None
+        obsolete, self._obsolete, self._created = self._obsolete, [], []
+        if staged is None:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f'{self.meta_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(staged, f, indent=1)
+        replace_durably(tmp_path, self.meta_path)
+        # readers that still hold the replaced files keep them open or mapped
+        for path in obsolete:
+            self._remove_file(path)
+
+    def _abort(self):
+        created, self._created, self._obsolete, self._staged = self._created, [], [], None
+        for path in created:
+            self._remove_file(path)
+
+    def _remove_file(self, path):
+        full_path = os.path.join(self.root, path)
+        if os.path.exists(full_path):
+            os.remove(full_path)
+        year_dir = os.path.dirname(full_path)
+        for directory in (year_dir, os.path.dirname(year_dir)):
+            if os.path.isdir(directory) and not os.listdir(directory):
+                os.rmdir(directory)
+
+    def _remove_unlisted(self):
+        """removes the files of writers that crashed before their commit"""
+        listed = {path for paths in self._staged['files'].values() for path in paths}
+        for name in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            for path in self._listed_files(name, extensions=(self.extension, '.tmp')):
+                if path not in listed:
+                    self._remove_file(path)
+
+    def _set_table(self, meta, name, df, last_date=None):
+        meta['tables'][name] = {'columns': list(df.columns),
+                                'dtypes': [dtype.name for dtype in df.dtypes],
+                                'last_date': pd.Timestamp(last_date or df.index.max()).isoformat()}
+
+    @property
+    def lock_path(self) -> str:
+        return f'{os.path.normpath(self.root)}.lock'
+
+    def series(self) -> list:
+        # sorted like the keys of the hd5 file, so both backends join the columns in the same order
+        return sorted(name for name in self._read_meta()['tables'] if name not in DERIVED_TABLES)
+
+    def last_dates(self) -> dict:
+        tables = self._read_meta()['tables']
+        return {name: pd.Timestamp(tables[name]['last_date']) for name in self.series()}
+
+    def revision(self) -> int:
+        return self._read_meta()['revision']
+
+    def missing(self) -> dict:
+        return {name: {column: pd.Timestamp(date) for column, date in columns.items()}
+                for name, columns in self._read_meta().get('missing', {}).items()}
+
+    def set_missing(self, name, columns:dict):
+        with self.transaction():
+            self._set_missing(name, columns)
+
+    def _set_missing(self, name, columns:dict):
+        meta = self._read_meta()
+        missing = meta.setdefault('missing', {})
+        if columns:
+            missing[name] = {column: pd.Timestamp(date).isoformat() for column, date in columns.items()}
+        elif missing.pop(name, None) is None:
+            return
+        self._write_meta(meta)
+
+    # partitions and files
+
+    def _table_dir(self, name):
+        return os.path.join(self.root, name)
+
+    def _year_dir(self, name, year):
+        return os.path.join(self._table_dir(name), f'year={year}')
+
+    def _listed_files(self, name, extensions=None):
+        """paths (relative to the root) of the files in the folder of a table"""
+        table_dir = self._table_dir(name)
+        if not os.path.isdir(table_dir):
+            return []
+        paths = []
+        for year_entry in sorted(os.listdir(table_dir)):
+            if not year_entry.startswith('year='):
+                continue
+            for entry in sorted(os.listdir(os.path.join(table_dir, year_entry))):
+                if entry.endswith(tuple(extensions or (self.extension,))):
+                    paths.append(f'{name}/{year_entry}/{entry}')
+        return paths
+
+    def _table_files(self, name, meta=None):
+        """{year: [(first date, last date, path)]} of the listed files of a table, in date order"""
+        if meta is None:
+            meta = self._staged if self._staged is not None else self._committed_meta()
+        years = {}
+        for path in sorted(meta['files'].get(name, [])):
+            year_entry, entry = path.split('/')[-2:]
+            first, last = entry[:-len(self.extension)].split('_')[:2]
+            years.setdefault(int(year_entry[len('year='):]), []).append((pd.Timestamp(first), pd.Timestamp(last), path))
+        return years
+
+    def _years(self, name):
+        return sorted(self._table_files(name))
+
+    def _files(self, name, year):
+        """[(first date, last date, path)] of a year partition, in date order"""
+        return self._table_files(name).get(year, [])
+
+    def _write_file(self, name, df):
+        """writes the rows of one year as a new file of its partition and lists it, returns its path.
+        every file gets a new name, so a file that readers may hold is never overwritten"""
+        files = self._stage()['files'].setdefault(name, [])
+        year = df.index.min().year
+        os.makedirs(self._year_dir(name, year), exist_ok=True)
+        path = f'{name}/year={year}/{df.index.min():%Y%m%d}_{df.index.max():%Y%m%d}_{os.urandom(4).hex()}{self.extension}'
+        self._created.append(path)
+        files.append(path)
+        df = df.sort_index()
+        df.index = df.index.astype('datetime64[ns]')
+        df.index.name = 'date'
+        table = self.pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+        table = table.set_column(0, 'date', table['date'].cast(self.pa.date32()))
+        full_path = os.path.join(self.root, path)
+        tmp_path = f'{full_path}.tmp'
+        if self.file_format == 'parquet':
+            self.pa.parquet.write_table(table, tmp_path, compression='zstd')
+        else:
+            with self.pa.OSFile(tmp_path, 'wb') as sink, self.pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, full_path)
+        return path
+
+    def _retire(self, name, path):
+        """unlists a file; it is removed at once if this transaction wrote it, else by the commit"""
+        self._stage()['files'][name].remove(path)
+        if path in self._created:
+            self._created.remove(path)
+            self._remove_file(path)
+        else:
+            self._obsolete.append(path)
+
+    def _read_file(self, path, start=None, end=None):
+        path = os.path.join(self.root, path)
+        pa = self.pa
+        if self.file_format == 'parquet':
+            filters = []
+            if start is not None:
+                filters.append(('date', '>=', pd.Timestamp(start).date()))
+            if end is not None:
+                filters.append(('date', '<=', pd.Timestamp(end).date()))
+            return pa.parquet.read_table(path, memory_map=True, filters=filters or None)
+
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        mask = None
+        for op, bound in ((pa.compute.greater_equal, start), (pa.compute.less_equal, end)):
+            if bound is not None:
+                term = op(table['date'], pa.scalar(pd.Timestamp(bound).date(), type=pa.date32()))
+                mask = term if mask is None else pa.compute.and_(mask, term)
+        return table if mask is None else table.filter(mask)
+
+    def _read_year(self, files, start=None, end=None):
+        """arrow tables of the files of a year partition that overlap the date range"""
+        return [self._read_file(path, start, end) for first, last, path in files
+                if (start is None or last >= pd.Timestamp(start)) and (end is None or first <= pd.Timestamp(end))]
+
+    def read_table(self, name, start=None, end=None):
+        """reads a table, optionally only a date window. None if the table does not exist"""
+        for attempt in range(3):
+            try:
+                return self._read_table(name, start, end)
+            except FileNotFoundError:
+                # a commit removed the files that were listed when the read started, read the new ones
+                if self._staged is not None or attempt == 2:
+                    raise
+
+    def _read_table(self, name, start=None, end=None):
+        meta = self._staged if self._staged is not None else self._committed_meta()
+        if name not in meta['tables']:
+            return None
+        start_year = None if start is None else pd.Timestamp(start).year
+        end_year = None if end is None else pd.Timestamp(end).year
+        tables = []
+        for year, files in sorted(self._table_files(name, meta).items()):
+            if (start_year is None or year >= start_year) and (end_year is None or year <= end_year):
+                tables.extend(self._read_year(files, start, end))
+        if not tables:
+            info = meta['tables'][name]
+            return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in zip(info['columns'], info['dtypes'])},
+                                index=pd.DatetimeIndex([], dtype='datetime64[ns]', name='date'))
+        df = self.pa.concat_tables(tables).to_pandas(date_as_object=False).set_index('date')
+        df.index = df.index.astype('datetime64[ns]')
+        return df.sort_index()
+
+    def _rewrite_year(self, name, year, df):
+        """replaces a year partition with one file holding df, removes it if df is empty"""
+        old_files = [path for first, last, path in self._files(name, year)]
+        if not df.empty:
+            self._write_file(name, df)
+        for path in old_files:
+            self._retire(name, path)
+
+    def _append(self, name, df):
+        """adds the rows of df, all newer than the stored ones, as new files per year"""
+        for year, rows in df.groupby(df.index.year):
+            self._write_file(name, rows)
+            if len(self._files(name, year)) > self.max_files:
+                self._rewrite_year(name, year, self.read_table(name, f'{year}-01-01', f'{year}-12-31'))
+
+    # series
+
+    def save(self, df_dict):
+        with self.transaction(), span('write', df_dict['name']):
+            return self._upsert(df_dict)
+
+    def _upsert(self, df_dict):
+        name = df_dict['name']
+        df = df_dict['df']
+        if df is None or df.empty:
+            print(f'no data collected for {name}')
+            return None
+
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        df.index = df.index.astype('datetime64[ns]')
+        validate_frame(df, name)
+        meta = self._read_meta()
+        last_date = meta['tables'].get(name, {}).get('last_date')
+        last_date = pd.Timestamp(last_date) if last_date else None
+        if last_date is not None:
+            self._migrate(meta, name, df)
+
+        written = []
+        updated = 0
+        if last_date is not None:
+            # dates up to the stored range rewrite their year, if any of them changed
+            overlap = df.loc[df.index <= last_date]
+            for year, rows in overlap.groupby(overlap.index.year):
+                stored = self.read_table(name, f'{year}-01-01', f'{year}-12-31')
+                rows = fill_missing(stored, rows)
+                unchanged = unchanged_rows(stored, rows)
+                if unchanged.all():
+                    continue
+                changed = rows.loc[~unchanged]
+                updated += int(changed.index.isin(stored.index).sum())
+                merged = pd.concat([stored.drop(changed.index, errors='ignore'), changed]).sort_index()
+                self._rewrite_year(name, year, merged)
+                written.append(changed.index.min())
+            df = df.loc[df.index > last_date]
+
+        if not df.empty:
+            self._append(name, df)
+            written.append(df.index.min())
+
+        if not written:
+            print(f'{name} is up to date, last date: {last_date.date()}')
+            return None
+
+        new_last_date = df.index.max() if not df.empty else last_date
+        self._set_table(meta, name, df, new_last_date)
+        self._write_meta(meta)
+        count('rows_written', len(df) + updated, name)
+        print(f'{name}: {len(df)} rows added, {updated} rows updated, last date: {new_last_date.date()}')
+        return min(written)
+
+    def _migrate(self, meta, name, df):
+        """rewrites a stored series whose value column was renamed or retyped.
+        columns added to a wide table are marked as missing from its first date,
+        so the next run collects their history"""
+        info = meta['tables'][name]
+        if info['columns'] == list(df.columns) and info['dtypes'] == [dtype.name for dtype in df.dtypes]:
+            return
+        years = self._years(name)
+        first_date = self._files(name, years[0])[0][0] if years else None
+        for year in years:
+            stored = self.read_table(name, f'{year}-01-01', f'{year}-12-31')
+            self._rewrite_year(name, year, migrate_columns(stored, df, name))
+        self._set_table(meta, name, df, info['last_date'])
+
+        added = added_columns(info['columns'], df.columns)
+        if added and first_date is not None:
+            columns = meta.setdefault('missing', {}).setdefault(name, {})
+            for column in added:
+                columns[column] = min(pd.Timestamp(columns.get(column, first_date)), first_date).isoformat()
+            print(f'{name}: {", ".join(added)} added, collected from {first_date.date()} by the next run')
+
+    def _load(self, name, start=None, end=None):
+        with span('load', name):
+            df = self.read_table(name, start, end)
+        count('rows_loaded', len(df) if df is not None else 0, name)
+        return df
+
+    def load(self, start=None, end=None, series:list=None) -> list:
+        return [self._load(name, start, end) for name in self.series()
+                if series is None or name in series]
+
+    def load_combined(self, start=None, end=None):
+        return self._load(COMBINED_TABLE, start, end)
+
+    def load_rolling_stats(self, start=None, end=None):
+        return self._load(ROLLING_TABLE, start, end)
+
+    def has_combined(self) -> bool:
+        return COMBINED_TABLE in self._read_meta()['tables']
+
+    # derived tables
+
+    def _replace_from(self, name, df, since):
+        """replaces the rows of a table from since on with df"""
+        since = pd.Timestamp(since)
+        for year in self._years(name):
+            if year < since.year:
+                continue
+            kept = self.read_table(name, f'{year}-01-01', since - pd.Timedelta(days=1)) if year == since.year else None
+            rows = df.loc[df.index.year == year]
+            if kept is not None and not kept.empty:
+                rows = pd.concat([kept, rows])
+            self._rewrite_year(name, year, rows)
+        remaining_years = set(self._years(name))
+        for year, rows in df.groupby(df.index.year):
+            if year not in remaining_years:
+                self._write_file(name, rows)
+
+    def _drop(self, name):
+        for path in list(self._stage()['files'].get(name, [])):
+            self._retire(name, path)
+
+    def update_combined(self, since=None):
+        """maintains the combined table: every series outer-joined on date,
+        sorted ascending and forward filled. rows from since on are rebuilt,
+        everything when since is None or the set of series changed"""
+        meta = self._read_meta()
+        names = self.series()
+        if not names:
+            return
+        columns = [column for name in names for column in meta['tables'][name]['columns']]
+        if COMBINED_TABLE not in meta['tables'] or meta['tables'][COMBINED_TABLE]['columns'] != columns:
+            since = None
+
+        seed = None
+        if since is not None:
+            since = pd.Timestamp(since)
+            before = self.read_table(COMBINED_TABLE, end=since - pd.Timedelta(days=1))
+            if not before.empty:
+                seed = before.iloc[-1:]
+
+        frames = [self.read_table(name, start=since) for name in names]
+        combined_df = frames[0].join(frames[1:], how='outer').sort_index()
+        if seed is not None:
+            combined_df = pd.concat([seed, combined_df]).ffill().iloc[1:]
+        else:
+            combined_df = combined_df.ffill().bfill()
+        combined_df.index.name = 'date'
+
+        if since is None:
+            self._drop(COMBINED_TABLE)
+            self._append(COMBINED_TABLE, combined_df)
+        else:
+            self._replace_from(COMBINED_TABLE, combined_df, since)
+        if not combined_df.empty:
+            self._set_table(meta, COMBINED_TABLE, combined_df, combined_df.index.max())
+        self._write_meta(meta)
+        if not combined_df.empty:
+            print(f'{COMBINED_TABLE}: {len(combined_df)} rows rebuilt from {combined_df.index.min().date()}')
+
+    def update_rolling_stats(self, since=None):
+        """appends the rolling statistics of the combined rows newer than the saved state,
+        a rewritten last day is rebuilt from the state of the day before.
+        recomputes them when there is no state, the columns changed, older history was rewritten
+        or the state does not end where the table does (a write that was cut off)"""
+        meta = self._read_meta()
+        if COMBINED_TABLE not in meta['tables']:
+            return
+        stats = RollingStats.load(self.rolling_state_path)
+        columns = meta['tables'][COMBINED_TABLE]['columns']
+        consistent = (stats is not None and stats.columns == columns and ROLLING_TABLE in meta['tables']
+                      and stats.last_date == pd.Timestamp(meta['tables'][ROLLING_TABLE]['last_date']))
+        stored_last_date = stats.last_date if consistent else None
+        if not consistent or (since is not None and not stats.rewind(since)):
+            stats = RollingStats(columns)
+        if stats.last_date is None:
+            self._drop(ROLLING_TABLE)
+            rows = self.read_table(COMBINED_TABLE)
+        else:
+            rows = self.read_table(COMBINED_TABLE, start=stats.last_date + pd.Timedelta(days=1))
+
+        rolling_df = stats.update(rows)
+        if not rolling_df.empty:
+            rolling_df.index.name = 'date'
+            if stored_last_date is not None and rolling_df.index.min() <= stored_last_date:
+                self._replace_from(ROLLING_TABLE, rolling_df, rolling_df.index.min())
+            else:
+                self._append(ROLLING_TABLE, rolling_df)
+            self._set_table(meta, ROLLING_TABLE, rolling_df)
+            self._write_meta(meta)
+            print(f'{ROLLING_TABLE}: {len(rolling_df)} days updated')
+        stats.save(self.rolling_state_path)
+
+    def update_derived(self, since=None):
+        with self.transaction():
+            with span('write', COMBINED_TABLE):
+                self.update_combined(since)
+            with span('write', ROLLING_TABLE):
+                self.update_rolling_stats(since)
+
+
+def copy_store(source:BaseStore, target:BaseStore):
+    """copies every series of one backend into another, e.g. the hd5 file into an ArrowStore,
+    and builds the derived tables of the target, in one transaction of the target"""
+    with target.transaction():
+        for name, df in zip(source.series(), source.load()):
+            target.save({'name': name, 'df': df})
+        target.update_derived()
@@ -1,7 +1,7 @@
+import sys
 
-import os 
-from core.data_handler import scrape_orchestrator, scrape_factory
+from cli import main
 
-alpha_api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
-df_list = scrape_orchestrator(alpha_api_key, hist=False)
-print(df_list)
\ No newline at end of file
+# one collection run, same as `python cli.py scrape`, for cron jobs and scripts that call this file.
+# for a long running service that collects each source at its publication time, see `python cli.py schedule`
+sys.exit(main(['scrape']))
@@ -0,0 +1,64 @@
+# HTTP cache policy for sources that publish on a fixed daily schedule
+#
+# The ECB publishes its reference rates once per working day, around 16:00 CET.
+# A cached page or history file that was fetched after the last publication
+# cannot have changed, so it is served from the cache without a request.
+# Once a new publication is due, the cached copy is revalidated with
+# If-None-Match / If-Modified-Since, so an unchanged file costs a 304.
+
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from scrapy.extensions.httpcache import RFC2616Policy, rfc1123_to_epoch
+
+
+def revalidate_headers(revalidate:bool) -> dict:
+    """request headers that make the cache revalidate a response even before the next publication,
+    for a retry that waits for a publication that came late"""
+    return {'Cache-Control': 'no-cache'} if revalidate else {}
+
+
+class PublicationPolicy(RFC2616Policy):
+    """RFC2616 cache policy that treats a cached response as fresh until the next publication.
+    a request with 'Cache-Control: no-cache' (see revalidate_headers) always revalidates.
+    settings:
+        PUBLICATION_TIME: 'HH:MM' of the daily publication, Default='16:00'
+        PUBLICATION_TIMEZONE: Default='Europe/Berlin'
+        PUBLICATION_MARGIN: seconds after the publication time before the new data
+          is expected to be online, Default=1800
+        PUBLICATION_WEEKDAYS: weekdays with a publication, 0 is Monday. Default=[0, 1, 2, 3, 4]"""
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        hour, minute = settings.get('PUBLICATION_TIME', '16:00').split(':')
+        self.publication_time = time(int(hour), int(minute))
+        self.timezone = ZoneInfo(settings.get('PUBLICATION_TIMEZONE', 'Europe/Berlin'))
+        self.margin = timedelta(seconds=settings.getint('PUBLICATION_MARGIN', 1800))
+        self.weekdays = {int(day) for day in settings.getlist('PUBLICATION_WEEKDAYS', [0, 1, 2, 3, 4])}
+
+    def last_publication(self, now:datetime=None) -> datetime:
+        """the latest scheduled publication (plus the margin) at or before now"""
+        now = now.astimezone(self.timezone) if now else datetime.now(self.timezone)
+        day = now.date()
+        for _ in range(8):
+            published = datetime.combine(day, self.publication_time, self.timezone) + self.margin
+            if day.weekday() in self.weekdays and published <= now:
+                return published
+            day -= timedelta(days=1)
+        raise ValueError('PUBLICATION_WEEKDAYS holds no weekday')
+
+    def should_cache_response(self, response, request):
+        # responses without validators are cached too, their freshness comes from the schedule
+        if response.status == 200 and b'no-store' not in self._parse_cachecontrol(response):
+            return True
+        return super().should_cache_response(response, request)
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        if b'no-cache' not in self._parse_cachecontrol(request):
+            # the Date header holds the time the response was fetched
+            fetched_at = rfc1123_to_epoch(cachedresponse.headers.get(b'Date'))
+            if fetched_at is not None and fetched_at >= self.last_publication().timestamp():
+                return True
+        # a publication is due since the response was fetched: revalidate it
+        self._set_conditional_validators(request, cachedresponse)
+        return False
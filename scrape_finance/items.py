@@ -7,7 +7,22 @@ import scrapy
 
 
 class CurrencyItem(scrapy.Item):
-    # define the fields for your item here like:
-    date = scrapy.Field()
-    spot = scrapy.Field()
-    
+    """one reference rate, from the daily ECB page"""
+    currency = scrapy.Field()
+    date = scrapy.Field()   # iso date string
+    value = scrapy.Field()  # rate as scraped, a string
+
+
+class ObservationsItem(scrapy.Item):
+    """a chunk of observations of one currency, in columns and in date order, from the ECB history file"""
+    currency = scrapy.Field()
+    dates = scrapy.Field()
+    values = scrapy.Field()
+    last = scrapy.Field()   # True on the (empty) item that ends the file of the currency
+
+
+class StoredItem(scrapy.Item):
+    """what StorePipeline passes on once it took over the observations of an item:
+    only their count, the observations themselves go to the store"""
+    currency = scrapy.Field()
+    rows = scrapy.Field()
@@ -4,6 +4,13 @@
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Headers, Response
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet.task import deferLater
+
+from core.replay import Recordings, RecordingNotFound, RECORDINGS_PATH, get_recordings
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -57,47 +64,62 @@ class ScrapeFinanceSpiderMiddleware:
 
 
 class ScrapeFinanceDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    """records the downloaded responses, or replays them from disk without a connection
+    (see core/replay.py). it sits next to the downloader, so the http cache and the
+    retries in front of it work on replayed responses as they do on live ones.
+    settings:
+        REPLAY_MODE: 'record' or 'replay'. Default=None, from the SCRAPE_REPLAY* environment
+        REPLAY_DIR: folder of the recordings
+        REPLAY_LATENCY: seconds added to a replayed response, a number or 'min-max'
+        REPLAY_ERROR_RATE: share of replayed responses that fail with REPLAY_ERROR_STATUS (503)
+        REPLAY_SEED: seed of the injected latency and errors"""
+
+    def __init__(self, recordings:Recordings=None):
+        self.recordings = recordings or get_recordings()
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        settings = crawler.settings
+        recordings = None
+        if settings.get('REPLAY_MODE'):
+            recordings = Recordings(root=settings.get('REPLAY_DIR') or RECORDINGS_PATH,
+                                    mode=settings.get('REPLAY_MODE'),
+                                    latency=settings.get('REPLAY_LATENCY'),
+                                    error_rate=settings.getfloat('REPLAY_ERROR_RATE', 0),
+                                    error_status=settings.getint('REPLAY_ERROR_STATUS', 503),
+                                    seed=settings.get('REPLAY_SEED', 0))
+        s = cls(recordings)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
-    def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
-        return None
+    async def process_request(self, request, spider):
+        if not self.recordings.replaying:
+            return None
+        try:
+            recorded = self.recordings.load(request.method, request.url, request.body)
+        except RecordingNotFound as exc:
+            raise IgnoreRequest(str(exc)) from exc
+        delay, failed = self.recordings.fault(request.method, request.url, request.body)
+        if delay:
+            # waits in the reactor, the other downloads go on meanwhile
+            from twisted.internet import reactor
+            await maybe_deferred_to_future(deferLater(reactor, delay, lambda: None))
+        if failed:
+            return Response(request.url, status=self.recordings.error_status, request=request,
+                            flags=['replayed'])
+        headers = Headers(recorded.headers)
+        respcls = responsetypes.from_args(headers=headers, url=request.url, body=recorded.body)
+        return respcls(url=request.url, status=recorded.status, headers=headers, body=recorded.body,
+                       request=request, flags=['replayed'])
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
-
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        if self.recordings.recording and 'cached' not in response.flags:
+            headers = {name.decode('latin-1'): [value.decode('latin-1') for value in values]
+                       for name, values in response.headers.items()}
+            self.recordings.save(request.method, request.url, response.status, headers,
+                                 response.body, request.body)
         return response
 
-    def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
-
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
-
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
@@ -5,9 +5,126 @@
 
 
 # useful for handling different item types with a single interface
+from bisect import bisect_right
+
 from itemadapter import ItemAdapter
+from twisted.internet import defer, threads
+
+from scrape_finance.items import CurrencyItem, ObservationsItem, StoredItem
+from scrape_finance.sdmx import observations_to_frame, wide_frame
+
+
+class StorePipeline:
+    """writes the scraped observations to the store while the crawl is running.
+    observations are buffered per currency until STORE_BATCH_SIZE of them are collected,
+    then the dates that every currency has reached are converted to one wide frame
+    (a <currency>_value column each) in the schema of the series and saved in a reactor
+    thread, so downloading and parsing go on while a batch is written. 
+    batches are written one after the other, in order, and the crawl only closes once 
+    the last one is written. when the crawl is cut off by its timeout, the batches that did not
+    start yet and the rows that were not flushed are dropped, so no write outlives the crawl.
+    the rows that were written are complete for every currency.
+    active for spiders with a `store` (a core.storage.BaseStore) and a `schema`
+    (a core.schema.SeriesSchema) attribute, optionally a `start_date` to skip older observations.
+    other spiders' items pass through unchanged.
+    the outcome is kept in the crawl stats:
+        store/rows: rows handed to the store
+        store/written_from: earliest date that was written
+        store/dropped: rows that were not written because the crawl timed out
+        store/error: why a write failed"""
 
+    def __init__(self, stats, batch_size:int=5000):
+        self.stats = stats
+        self.batch_size = batch_size
+        self.store = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats, crawler.settings.getint('STORE_BATCH_SIZE', 5000))
+
+    def open_spider(self, spider):
+        self.store = getattr(spider, 'store', None)
+        self.schema = getattr(spider, 'schema', None)
+        self.start_date = getattr(spider, 'start_date', None)
+        self.currencies = getattr(spider, 'currencies', None) or []
+        # currency -> (dates, values) not written yet, in date order
+        self.buffers = {}
+        # currency -> last parsed date, None once its file is complete
+        self.progress = {}
+        self.pending = 0
+        self._writes = defer.succeed(None)
 
-class ScrapeFinancePipeline:
     def process_item(self, item, spider):
-        return item
+        if self.store is None:
+            return item
+        adapter = ItemAdapter(item)
+        if isinstance(item, CurrencyItem):
+            dates, values = [adapter['date']], [adapter['value']]
+        elif isinstance(item, ObservationsItem):
+            dates, values = adapter['dates'], adapter['values']
+        else:
+            return item
+
+        currency = adapter['currency']
+        buffer_dates, buffer_values = self.buffers.setdefault(currency, ([], []))
+        buffer_dates.extend(dates)
+        buffer_values.extend(values)
+        if adapter.get('last'):
+            self.progress[currency] = None
+        elif dates:
+            self.progress[currency] = dates[-1]
+        self.pending += len(dates)
+
+        if self.pending >= self.batch_size and isinstance(item, ObservationsItem):
+            self._flush(self._watermark())
+        return StoredItem(currency=currency, rows=len(dates))
+
+    def _watermark(self):
+        """last date that every currency has reached, so its rows are complete.
+        '' while a currency was not parsed yet, None when every file is complete"""
+        reached = [self.progress.get(currency.upper(), '') for currency in self.currencies] or list(self.progress.values())
+        unfinished = [date for date in reached if date is not None]
+        return min(unfinished) if unfinished else None
+
+    def _flush(self, upto=None):
+        """writes the buffered rows up to and including the date upto, all of them when upto is None"""
+        frames = []
+        for currency, (dates, values) in self.buffers.items():
+            cut = len(dates) if upto is None else bisect_right(dates, upto)
+            if cut:
+                frames.append(observations_to_frame(dates[:cut], values[:cut], currency, self.start_date))
+                del dates[:cut], values[:cut]
+                self.pending -= cut
+        df = wide_frame(frames)
+        if df.empty:
+            return
+        df = self.schema.apply(df)
+        # chained, so the batches are written one at a time and in order
+        self._writes.addCallback(lambda _: self._save(df))
+        self._writes.addCallback(self._written)
+
+    def _timed_out(self):
+        return self.stats.get_value('crawl/timed_out') is not None
+
+    def _save(self, df):
+        if self._timed_out():
+            self.stats.inc_value('store/dropped', len(df))
+            return None
+        self.stats.inc_value('store/rows', len(df))
+        return threads.deferToThread(self.store.save, {'name': self.schema.key, 'df': df})
+
+    def _written(self, written_from):
+        if written_from is not None:
+            self.stats.min_value('store/written_from', written_from)
+
+    def _failed(self, failure):
+        self.stats.set_value('store/error', f'{failure.type.__name__}: {failure.value}')
+
+    def close_spider(self, spider):
+        if self.store is None:
+            return None
+        if self._timed_out():
+            self.stats.inc_value('store/dropped', self.pending)
+        else:
+            self._flush()
+        return self._writes.addErrback(self._failed)
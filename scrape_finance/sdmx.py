@@ -0,0 +1,120 @@
+# Streaming parser for the ECB SDMX exchange rate files (<ccy>.xml)
+#
+# The files hold one <exr:Obs TIME_PERIOD=".." OBS_VALUE=".."/> element per
+# business day since 1999. Observations are streamed with lxml.iterparse into
+# plain lists and converted to numpy arrays in one pass, instead of one XPath
+# query and one Python dict per observation.
+
+import io
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+
+NAMESPACES = {
+    'sdmx': 'http://www.SDMX.org/resources/SDMXML/schemas/v2_0/message',
+    'exr': 'http://www.ecb.europa.eu/vocabulary/stats/exr/1'
+}
+OBS_TAG = f'{{{NAMESPACES["exr"]}}}Obs'
+SERIES_TAG = f'{{{NAMESPACES["exr"]}}}Series'
+
+HIST_URL = 'https://www.ecb.europa.eu/stats/policy_and_exchange_rates/euro_reference_exchange_rates/html/{currency}.xml'
+
+# the euro reference rates published by the ECB every working day
+ECB_CURRENCIES = ['usd', 'jpy', 'bgn', 'czk', 'dkk', 'gbp', 'huf', 'pln', 'ron', 'sek',
+                  'chf', 'isk', 'nok', 'try', 'aud', 'brl', 'cad', 'cny', 'hkd', 'idr',
+                  'ils', 'inr', 'krw', 'mxn', 'myr', 'nzd', 'php', 'sgd', 'thb', 'zar']
+
+
+def history_url(currency:str) -> str:
+    return HIST_URL.format(currency=currency.lower())
+
+
+def parse_currencies(currencies) -> list:
+    """'usd', 'usd,jpy', ['USD', 'jpy'] or 'all' -> list of lower case currency codes"""
+    if isinstance(currencies, str):
+        if currencies.strip().lower() == 'all':
+            return list(ECB_CURRENCIES)
+        currencies = currencies.split(',')
+    return [currency.strip().lower() for currency in currencies if currency.strip()]
+
+
+def iter_observations(source, chunk_size:int=5000):
+    """stream-parses an ECB SDMX file and yields chunks of observations.
+      args:
+        source: file path, file-like object or the raw bytes of the file
+        chunk_size: number of observations per chunk
+    returns:
+        a generator of (currency, dates, values) tuples; dates and values are lists of str"""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    currency = None
+    dates, values = [], []
+    for event, elem in etree.iterparse(source, events=('start', 'end'), tag=(OBS_TAG, SERIES_TAG)):
+        if elem.tag == SERIES_TAG:
+            if event == 'start':
+                currency = elem.get('CURRENCY')
+            continue
+        if event != 'end':
+            continue
+
+        dates.append(elem.get('TIME_PERIOD'))
+        values.append(elem.get('OBS_VALUE'))
+        # free the parsed observation, keeps memory flat on long files
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+        if len(dates) >= chunk_size:
+            yield currency, dates, values
+            dates, values = [], []
+
+    if dates:
+        yield currency, dates, values
+
+
+def observations_to_frame(dates, values, currency:str='USD', start_date=None) -> pd.DataFrame:
+    """converts columnar observations to a DataFrame with one vectorized pass.
+      args:
+        dates, values: sequences of 'YYYY-MM-DD' and numeric strings
+        currency: used to name the value column <currency>_value
+        start_date: optional, observations before it are dropped
+    returns:
+        a DataFrame indexed by 'date', newest first"""
+    index = pd.to_datetime(np.asarray(dates, dtype=object), format='%Y-%m-%d')
+    data = pd.to_numeric(np.asarray(values, dtype=object), errors='coerce')
+
+    if start_date is not None:
+        mask = index >= pd.Timestamp(start_date)
+        index, data = index[mask], data[mask]
+
+    df = pd.DataFrame({f'{currency.lower()}_value': data}, index=index)
+    df.index.name = 'date'
+    return df.sort_index(ascending=False)
+
+
+def wide_frame(frames) -> pd.DataFrame:
+    """outer-joins single currency frames into one table with a <currency>_value column each,
+    aligned on date, newest first"""
+    frames = [df for df in frames if df is not None]
+    if not frames:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='date'))
+    df = frames[0].join(frames[1:], how='outer')
+    df.index.name = 'date'
+    return df.sort_index(ascending=False)
+
+
+def parse_history(source, start_date=None, currency:str=None) -> pd.DataFrame:
+    """parses a whole ECB SDMX file into a DataFrame.
+      args:
+        source: file path, file-like object or the raw bytes of the file
+        start_date: optional, observations before it are dropped
+        currency: name for the value column, defaults to the currency of the file"""
+    dates, values = [], []
+    for file_currency, chunk_dates, chunk_values in iter_observations(source):
+        currency = currency or file_currency
+        dates.extend(chunk_dates)
+        values.extend(chunk_values)
+    return observations_to_frame(dates, values, currency or 'USD', start_date)
@@ -50,9 +50,11 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "scrape_finance.middlewares.ScrapeFinanceDownloaderMiddleware": 543,
-#}
+# records or replays the responses (REPLAY_MODE, see core/replay.py). next to the downloader,
+# behind the http cache (900) and the retries (550)
+DOWNLOADER_MIDDLEWARES = {
+    "scrape_finance.middlewares.ScrapeFinanceDownloaderMiddleware": 950,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -62,9 +64,11 @@ ROBOTSTXT_OBEY = True
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "scrape_finance.pipelines.ScrapeFinancePipeline": 300,
-#}
+ITEM_PIPELINES = {
+    "scrape_finance.pipelines.StorePipeline": 300,
+}
+# observations per write of StorePipeline
+STORE_BATCH_SIZE = 5000
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -81,11 +85,20 @@ ROBOTSTXT_OBEY = True
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = "httpcache"
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+HTTPCACHE_ENABLED = True
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_IGNORE_HTTP_CODES = [403, 404, 429, 500, 502, 503, 504]
+HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+HTTPCACHE_GZIP = True
+# cached ECB responses are fresh until the next publication, then revalidated (304 if unchanged)
+HTTPCACHE_POLICY = "scrape_finance.httpcache.PublicationPolicy"
+PUBLICATION_TIME = "16:00"
+PUBLICATION_TIMEZONE = "Europe/Berlin"
+PUBLICATION_MARGIN = 1800
+
+# accept gzip/deflate/br encoded responses
+COMPRESSION_ENABLED = True
 
 # Set settings whose default value is deprecated to a future-proof value
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
@@ -1,20 +1,40 @@
+from datetime import datetime
+
 import scrapy
 
+from scrape_finance.httpcache import revalidate_headers
+from scrape_finance.items import CurrencyItem
+from scrape_finance.sdmx import parse_currencies
+
 
 class EcbDailySpider(scrapy.Spider):
+    """reads the latest reference rates from the ECB page, every row of the rates table
+    in one pass, and yields a CurrencyItem per currency
+      args:
+        currencies: 'usd', 'usd,jpy', a list, or 'all' (default) for every row of the table
+        revalidate: revalidate a cached page with the ECB even before the next publication"""
     name = "ecb_daily"
     allowed_domains = ["www.ecb.europa.eu"]
     start_urls = ["https://www.ecb.europa.eu/stats/policy_and_exchange_rates/euro_reference_exchange_rates/html/index.en.html"]
 
+    def __init__(self, currencies='all', revalidate=False, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.currencies = None if currencies == 'all' else [c.upper() for c in parse_currencies(currencies)]
+        self.revalidate = revalidate
+
+    def start_requests(self):
+        for url in self.start_urls:
+            yield scrapy.Request(url, headers=revalidate_headers(self.revalidate))
+
     def parse(self, response):
         date = response.xpath("//div[@class = 'content-box']/h3/text()").get()
-        print(date)
-        headers = response.xpath("//table[@class='forextable']/thead/tr/th/text()").getall()[:2]
-
-        usd_row = response.xpath("//table[@class='forextable']/tbody/tr[td[@id='USD']]")
-        spot = usd_row.xpath("td[3]//span[@class='rate']/text()").get().strip()
+        date = datetime.strptime(date.strip(), "%d %B %Y").date().isoformat()
 
-        yield {"date": date,
-               "value": spot}
-        
-        
+        for row in response.xpath("//table[@class='forextable']/tbody/tr"):
+            currency = row.xpath("td[1]/@id").get() or row.xpath("td[1]//text()").get('').strip()
+            if self.currencies is not None and currency not in self.currencies:
+                continue
+            spot = row.xpath("td[3]//span[@class='rate']/text()").get()
+            if spot is None:
+                continue
+            yield CurrencyItem(currency=currency, date=date, value=spot.strip())
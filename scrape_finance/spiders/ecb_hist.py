@@ -1,30 +1,61 @@
+import time
+
 import scrapy
 
+from core.metrics import get_metrics
+from scrape_finance.httpcache import revalidate_headers
+from scrape_finance.items import ObservationsItem
+from scrape_finance.sdmx import history_url, iter_observations, parse_currencies
+
+
 class EcbHistSpider(scrapy.Spider):
+    """downloads the full history of ECB reference rates, one <currency>.xml file per currency,
+    and yields it in columnar chunks of ObservationsItem. the files are requested together and
+    downloaded in parallel, as far as CONCURRENT_REQUESTS_PER_DOMAIN allows.
+    with the `store` and `schema` arguments, StorePipeline writes the chunks to the store
+    while the files are still being downloaded and parsed
+      args:
+        currencies: 'usd', 'usd,jpy', a list, or 'all' for every ECB reference currency
+        revalidate: revalidate cached files with the ECB even before the next publication"""
     name = 'ecb_hist'
     allowed_domains = ["www.ecb.europa.eu"]
-    start_urls = ["https://www.ecb.europa.eu/stats/policy_and_exchange_rates/euro_reference_exchange_rates/html/usd.xml"]
-
-    def parse(self, response):
-        namespaces = {
-            'sdmx': 'http://www.SDMX.org/resources/SDMXML/schemas/v2_0/message',
-            'exr': 'http://www.ecb.europa.eu/vocabulary/stats/exr/1'
-        }
-        group = response.xpath("//exr:Group", namespaces=namespaces).get()
-        attrib = response.xpath("//exr:Group", namespaces=namespaces).attrib
-
-        self.logger.info(f'grpoup attributes: {attrib}')
-
-        observations = response.xpath("//exr:Obs", namespaces=namespaces)
-        for obs in observations:
-            date = obs.xpath("@TIME_PERIOD").get()
-            spot = obs.xpath("@OBS_VALUE").get()
-
-            yield {'date': date, 'value': spot}
-        
-        yield {'group attr': attrib}
-
-
-
 
-       
\ No newline at end of file
+    def __init__(self, currencies='usd', chunk_size=5000, store=None, schema=None, start_date=None, 
+                 revalidate=False, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.revalidate = revalidate
+        self.store = store
+        self.schema = schema
+        self.start_date = start_date
+        self.currencies = [currency.upper() for currency in parse_currencies(currencies)]
+        self.chunk_size = int(chunk_size)
+
+    def start_requests(self):
+        for currency in self.currencies:
+            yield scrapy.Request(history_url(currency), callback=self.parse, errback=self.failed,
+                                 cb_kwargs={'currency': currency}, headers=revalidate_headers(self.revalidate))
+
+    def parse(self, response, currency=None):
+        observations = 0
+        # only the parsing is timed, not the item pipeline that runs while a chunk is yielded
+        seconds = 0
+        t0 = time.perf_counter()
+        for _, dates, values in iter_observations(response.body, chunk_size=self.chunk_size):
+            seconds += time.perf_counter() - t0
+            observations += len(dates)
+            yield ObservationsItem(currency=currency, dates=dates, values=values, last=False)
+            t0 = time.perf_counter()
+        seconds += time.perf_counter() - t0
+        get_metrics().record('parse', f'ecb_{currency.lower()}', seconds)
+        # tells the pipeline that this currency is complete
+        yield ObservationsItem(currency=currency, dates=[], values=[], last=True)
+
+        self.logger.info(f'{currency}: parsed {observations} observations')
+
+    def failed(self, failure):
+        currency = failure.request.cb_kwargs['currency']
+        self.logger.error(f'{currency}: history file failed, {failure.value!r}')
+        # the collector marks the currency as missing, so the next run collects it again
+        self.crawler.stats.set_value(f'ecb/failed/{currency}', repr(failure.value))
+        # nothing more will come for this currency
+        yield ObservationsItem(currency=currency, dates=[], values=[], last=True)
@@ -0,0 +1,97 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import requests
+from requests.adapters import BaseAdapter
+
+from core.alpha_vantage import AlphaVantageClient
+
+
+BRENT = {'name': 'Crude Oil Prices: Brent', 'data': [{'date': '2024-01-02', 'value': '77.1'}]}
+
+
+class ScriptedAdapter(BaseAdapter):
+    """answers the requests of a session with the given (status, payload, headers) replies, in order"""
+
+    def __init__(self, replies):
+        super().__init__()
+        self.replies = list(replies)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        status, payload, headers = self.replies.pop(0)
+        response = requests.Response()
+        response.status_code = status
+        response._content = b'' if payload is None else json.dumps(payload).encode()
+        response.headers.update(headers)
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def client(tmp_path, replies, **kwargs):
+    av = AlphaVantageClient('demo', cache_dir=str(tmp_path), backoff=0, **kwargs)
+    adapter = ScriptedAdapter(replies)
+    av.session.mount('https://', adapter)
+    return av, adapter
+
+
+def age_cache(tmp_path, days=1):
+    for path in tmp_path.glob('*.json'):
+        entry = json.loads(path.read_text())
+        entry['fetched_at'] = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        path.write_text(json.dumps(entry))
+
+
+def test_fresh_reply_is_served_from_the_cache(tmp_path):
+    av, adapter = client(tmp_path, [(200, BRENT, {})])
+    assert av.query('BRENT', interval='daily') == BRENT
+    assert av.query('BRENT', interval='daily') == BRENT
+    assert len(adapter.requests) == 1
+
+
+def test_revalidate_calls_the_api_with_the_validators(tmp_path):
+    av, adapter = client(tmp_path, [(200, BRENT, {'ETag': '"v1"'}), (304, None, {})])
+    av.query('BRENT', interval='daily')
+
+    assert av.query('BRENT', interval='daily', revalidate=True) == BRENT
+    assert len(adapter.requests) == 2
+    assert adapter.requests[1].headers['If-None-Match'] == '"v1"'
+
+
+def test_expired_reply_is_fetched_again(tmp_path):
+    newer = {'data': [{'date': '2024-01-03', 'value': '78.0'}]}
+    av, adapter = client(tmp_path, [(200, BRENT, {}), (200, newer, {})])
+    av.query('BRENT', interval='daily')
+    age_cache(tmp_path)
+
+    assert av.query('BRENT', interval='daily') == newer
+    assert len(adapter.requests) == 2
+
+
+def test_throttled_reply_is_retried(tmp_path):
+    throttled = {'Note': 'Thank you for using Alpha Vantage! Our standard API rate limit is 25 requests per day.'}
+    av, adapter = client(tmp_path, [(200, throttled, {}), (200, BRENT, {})], retries=1)
+    assert av.query('BRENT', interval='daily') == BRENT
+    assert len(adapter.requests) == 2
+
+
+def test_cached_reply_is_the_fallback_when_throttled(tmp_path):
+    throttled = {'Information': 'rate limit'}
+    av, adapter = client(tmp_path, [(200, BRENT, {}), (200, throttled, {})], retries=0)
+    av.query('BRENT', interval='daily')
+    age_cache(tmp_path)
+    assert av.query('BRENT', interval='daily') == BRENT
+
+
+def test_api_key_is_not_part_of_the_cache_key(tmp_path):
+    av, _ = client(tmp_path, [(200, BRENT, {})])
+    av.query('BRENT', interval='daily')
+    other, adapter = client(tmp_path, [])
+    other.api_key = 'another'
+    assert other.query('BRENT', interval='daily') == BRENT
+    assert not adapter.requests
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.analytics import RollingCorrelation, SeriesMatrix, corr, normalized, returns, rolling_corr, rolling_mean, rolling_std
+
+
+def frame(days=200, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2020-01-01', periods=days, name='date')
+    df = pd.DataFrame(100 + rng.standard_normal((days, 4)).cumsum(axis=0), index=dates, columns=list('abcd'))
+    # a forward filled stretch, a constant series and a gap
+    df.iloc[60:100, 0] = df.iloc[60, 0]
+    df['d'] = 7.25
+    df.iloc[150, 1] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('window', [2, 7, 30])
+def test_rolling_mean_matches_pandas(window):
+    df = frame()
+    np.testing.assert_allclose(rolling_mean(df.values, window), df.rolling(window).mean().values,
+                               rtol=1e-10, atol=1e-10, equal_nan=True)
+
+
+def exact_std(values, window):
+    """the std of every window computed on its own, pandas keeps a rounding residue on flat stretches"""
+    out = np.full(values.shape, np.nan)
+    out[window - 1:] = np.lib.stride_tricks.sliding_window_view(values, window, axis=0).std(axis=-1, ddof=1)
+    return out
+
+
+@pytest.mark.parametrize('window', [2, 7, 30])
+def test_rolling_std_matches_pandas(window):
+    df = frame()
+    result = rolling_std(df.values, window)
+    np.testing.assert_allclose(result, exact_std(df.values, window), rtol=1e-7, atol=1e-12, equal_nan=True)
+    np.testing.assert_allclose(result, df.rolling(window).std().values, rtol=1e-7, atol=1e-6, equal_nan=True)
+
+
+def test_rolling_std_of_a_flat_stretch_is_zero():
+    df = frame()
+    stds = rolling_std(df.values, 10)
+    # the windows inside the forward filled stretch, and the constant series
+    assert (stds[69:100, 0] == 0).all()
+    assert (stds[9:, 3] == 0).all()
+    assert stds[100, 0] > 0
+
+
+@pytest.mark.parametrize('window', [5, 30])
+def test_rolling_corr_matches_pandas(window):
+    df = frame().pct_change(fill_method=None)
+    expected = df.rolling(window).corr().values.reshape(len(df), 4, 4)
+    result = rolling_corr(df.values, window)
+    # pandas gives constant windows a correlation from rounding noise, or inf
+    constant = df.rolling(window).std().values == 0
+    expected[constant[:, :, None] | constant[:, None, :]] = np.nan
+    np.testing.assert_allclose(result, expected, atol=1e-9, equal_nan=True)
+
+
+def test_rolling_corr_of_pairs():
+    df = frame().pct_change(fill_method=None)
+    pairs = np.triu_indices(4, 1)
+    full = rolling_corr(df.values, 20)
+    subset = rolling_corr(df.values, 20, pairs=pairs, dtype=np.float32, block_rows=17)
+    np.testing.assert_allclose(subset, full[:, pairs[0], pairs[1]], atol=1e-6, equal_nan=True)
+
+
+def test_corr_matches_pandas():
+    df = frame().iloc[:, :3]
+    np.testing.assert_allclose(corr(df.values), df.corr().values, atol=1e-12)
+
+
+def test_returns_and_normalized():
+    df = frame()
+    np.testing.assert_allclose(returns(df.values), df.pct_change(fill_method=None).values, equal_nan=True)
+    scaled = normalized(df.values[:, :3])
+    np.testing.assert_allclose(np.nanmin(scaled, axis=0), 0)
+    np.testing.assert_allclose(np.nanmax(scaled, axis=0), 100)
+
+
+def test_series_matrix_round_trip():
+    df = frame()
+    matrix = SeriesMatrix.from_frame(df.iloc[::-1])
+    assert matrix.dates.is_monotonic_increasing
+    pd.testing.assert_frame_equal(matrix.to_frame(), df, check_freq=False)
+    assert matrix.select(['b']).columns == ['b']
+    with pytest.raises(ValueError):
+        SeriesMatrix(df.values, df.index[1:], df.columns)
+
+
+def prices(days=300, seed=1):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2021-01-01', periods=days, name='date')
+    return pd.DataFrame(50 + rng.standard_normal((days, 4)).cumsum(axis=0), index=dates, columns=list('wxyz'))
+
+
+def pandas_pairs(df, window):
+    """pandas rolling pairwise correlation of the daily change, as (days, pairs) of the upper triangle"""
+    changes = df.pct_change(fill_method=None)
+    cube = changes.rolling(window).corr().values.reshape(len(df), df.shape[1], df.shape[1])
+    upper = np.triu_indices(df.shape[1], 1)
+    return cube[:, upper[0], upper[1]]
+
+
+def test_rolling_correlation_matches_pandas():
+    df = prices()
+    result = RollingCorrelation.compute(SeriesMatrix.from_frame(df), window=30)
+    np.testing.assert_allclose(result.values, pandas_pairs(df, 30), atol=1e-6, equal_nan=True)
+    assert result.pairs()[0] == ('w', 'x')
+    assert result.pair('y', 'w').iloc[-1] == result.values[-1, 1]
+    np.testing.assert_allclose(result.at().values, result.cube()[-1])
+
+
+@pytest.mark.parametrize('gap', ['none', 'nan', 'zero'])
+def test_update_matches_compute(gap):
+    df = prices()
+    if gap == 'nan':
+        df.iloc[220, 1] = np.nan
+    elif gap == 'zero':
+        df.iloc[230, 2] = 0
+    matrix = SeriesMatrix.from_frame(df)
+    expected = RollingCorrelation.compute(matrix, window=30)
+
+    result = RollingCorrelation.compute(SeriesMatrix.from_frame(df.iloc[:200]), window=30)
+    # overlapping rows are skipped
+    assert result.update(SeriesMatrix.from_frame(df.iloc[150:250])) == 50
+    assert result.update(matrix) == 50
+    assert result.update(matrix) == 0
+    np.testing.assert_allclose(result.values, expected.values, atol=1e-5, equal_nan=True)
+    assert (np.isnan(result.values) == np.isnan(expected.values)).all()
+
+
+def test_save_and_load_keep_updating(tmp_path):
+    df = prices()
+    result = RollingCorrelation.compute(SeriesMatrix.from_frame(df.iloc[:200]), window=30)
+    result.save(tmp_path / 'corr.npz')
+    loaded = RollingCorrelation.load(tmp_path / 'corr.npz')
+    loaded.update(SeriesMatrix.from_frame(df))
+
+    expected = RollingCorrelation.compute(SeriesMatrix.from_frame(df), window=30)
+    np.testing.assert_allclose(loaded.values, expected.values, atol=1e-5, equal_nan=True)
+    assert RollingCorrelation.load(tmp_path / 'missing.npz') is None
+
+
+def test_update_needs_the_same_series():
+    df = prices()
+    result = RollingCorrelation.compute(SeriesMatrix.from_frame(df.iloc[:100]), window=30)
+    with pytest.raises(ValueError):
+        result.update(SeriesMatrix.from_frame(df[['x', 'w', 'y', 'z']]))
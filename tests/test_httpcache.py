@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+from scrapy.http import Request, Response
+from scrapy.settings import Settings
+
+from scrape_finance.httpcache import PublicationPolicy, revalidate_headers
+
+
+BERLIN = ZoneInfo('Europe/Berlin')
+URL = 'https://www.ecb.europa.eu/stats/policy_and_exchange_rates/euro_reference_exchange_rates/html/usd.xml'
+
+
+@pytest.fixture
+def policy():
+    return PublicationPolicy(Settings({'PUBLICATION_TIME': '16:00', 'PUBLICATION_TIMEZONE': 'Europe/Berlin',
+                                       'PUBLICATION_MARGIN': 1800}))
+
+
+def cached(fetched_at, **headers):
+    return Response(URL, status=200, body=b'<xml/>',
+                    headers={'Date': format_datetime(fetched_at.astimezone(timezone.utc), usegmt=True), **headers})
+
+
+def test_last_publication(policy):
+    # wednesday before and after the publication, plus the margin
+    assert policy.last_publication(datetime(2024, 5, 15, 16, 20, tzinfo=BERLIN)) == \
+        datetime(2024, 5, 14, 16, 30, tzinfo=BERLIN)
+    assert policy.last_publication(datetime(2024, 5, 15, 16, 40, tzinfo=BERLIN)) == \
+        datetime(2024, 5, 15, 16, 30, tzinfo=BERLIN)
+    # the weekend falls back to friday
+    assert policy.last_publication(datetime(2024, 5, 19, 12, 0, tzinfo=BERLIN)) == \
+        datetime(2024, 5, 17, 16, 30, tzinfo=BERLIN)
+
+
+def test_no_weekday_is_an_error():
+    policy = PublicationPolicy(Settings({'PUBLICATION_WEEKDAYS': []}))
+    with pytest.raises(ValueError):
+        policy.last_publication()
+
+
+def test_response_fetched_after_the_publication_is_fresh(policy):
+    response = cached(policy.last_publication() + timedelta(minutes=1))
+    assert policy.is_cached_response_fresh(response, Request(URL))
+
+
+def test_response_fetched_before_the_publication_is_revalidated(policy):
+    response = cached(policy.last_publication() - timedelta(minutes=1),
+                      ETag='"abc"', **{'Last-Modified': 'Tue, 14 May 2024 14:30:00 GMT'})
+    request = Request(URL)
+    assert not policy.is_cached_response_fresh(response, request)
+    assert request.headers.get('If-None-Match') == b'"abc"'
+    assert request.headers.get('If-Modified-Since') == b'Tue, 14 May 2024 14:30:00 GMT'
+
+
+def test_no_cache_request_revalidates_a_fresh_response(policy):
+    response = cached(policy.last_publication() + timedelta(minutes=1), ETag='"abc"')
+    request = Request(URL, headers=revalidate_headers(True))
+    assert not policy.is_cached_response_fresh(response, request)
+    assert request.headers.get('If-None-Match') == b'"abc"'
+    assert revalidate_headers(False) == {}
+
+
+def test_responses_without_validators_are_cached(policy):
+    assert policy.should_cache_response(Response(URL, status=200), Request(URL))
+    assert not policy.should_cache_response(Response(URL, status=200, headers={'Cache-Control': 'no-store'}),
+                                            Request(URL))
@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer
+
+from core.schema import SeriesSchema
+from scrape_finance import pipelines
+from scrape_finance.items import CurrencyItem, ObservationsItem, StoredItem
+from scrape_finance.pipelines import StorePipeline
+
+
+class RecordingStore:
+    def __init__(self):
+        self.saved = []
+
+    def save(self, df_dict):
+        self.saved.append(df_dict['df'])
+        return df_dict['df'].index.min()
+
+
+@pytest.fixture(autouse=True)
+def writes_in_line(monkeypatch):
+    # the batches are written in the calling thread, so no reactor has to run
+    monkeypatch.setattr(pipelines.threads, 'deferToThread', defer.maybeDeferred)
+
+
+def open_pipeline(batch_size=4, currencies=('USD', 'JPY')):
+    stats = get_crawler().stats
+    pipeline = StorePipeline(stats, batch_size=batch_size)
+    spider = SimpleNamespace(store=RecordingStore(), currencies=list(currencies), start_date=None,
+                             schema=SeriesSchema('currency', columns=[f'{c.lower()}_value' for c in currencies]))
+    pipeline.open_spider(spider)
+    return pipeline, spider, stats
+
+
+def observations(currency, dates, last=False):
+    return ObservationsItem(currency=currency, dates=list(dates), values=['1.5'] * len(dates), last=last)
+
+
+DATES = [f'2024-01-0{day}' for day in range(2, 7)]
+
+
+def test_batch_is_written_up_to_the_date_every_currency_reached():
+    pipeline, spider, stats = open_pipeline()
+    stored = pipeline.process_item(observations('USD', DATES[:4]), spider)
+    assert isinstance(stored, StoredItem) and stored['rows'] == 4
+    # JPY was not parsed yet, so no date is complete for every currency
+    assert not spider.store.saved
+
+    pipeline.process_item(observations('JPY', DATES[:2]), spider)
+    [batch] = spider.store.saved
+    assert list(batch.index) == list(pd.to_datetime(DATES[:2]))[::-1]
+    assert not batch.isna().any().any()
+    assert stats.get_value('store/rows') == 2
+
+
+def test_close_writes_the_rest():
+    pipeline, spider, stats = open_pipeline()
+    pipeline.process_item(observations('USD', DATES), spider)
+    pipeline.process_item(observations('USD', [], last=True), spider)
+    pipeline.process_item(observations('JPY', DATES[:3]), spider)
+    pipeline.process_item(observations('JPY', [], last=True), spider)
+    pipeline.close_spider(spider)
+
+    written = pd.concat(spider.store.saved).sort_index()
+    assert list(written.index) == list(pd.to_datetime(DATES))
+    assert list(written.columns) == ['usd_value', 'jpy_value']
+    assert np.isnan(written['jpy_value'].iloc[-1])
+    assert stats.get_value('store/rows') == len(DATES)
+    assert stats.get_value('store/written_from') == pd.Timestamp(DATES[0])
+
+
+def test_timed_out_crawl_drops_the_rows_not_written():
+    pipeline, spider, stats = open_pipeline()
+    pipeline.process_item(observations('USD', DATES[:3]), spider)
+    stats.set_value('crawl/timed_out', 10)
+    pipeline.close_spider(spider)
+
+    assert not spider.store.saved
+    assert stats.get_value('store/dropped') == 3
+
+
+def test_failed_write_is_reported():
+    pipeline, spider, stats = open_pipeline(currencies=('USD',))
+
+    def fail(df_dict):
+        raise OSError('disk full')
+    spider.store.save = fail
+    pipeline.process_item(observations('USD', DATES), spider)
+    pipeline.close_spider(spider)
+    assert stats.get_value('store/error') == 'OSError: disk full'
+
+
+def test_daily_items_are_buffered_until_close():
+    pipeline, spider, _ = open_pipeline(batch_size=1, currencies=('USD',))
+    pipeline.process_item(CurrencyItem(currency='USD', date=DATES[0], value='1.1'), spider)
+    assert not spider.store.saved
+    pipeline.close_spider(spider)
+    assert spider.store.saved[0]['usd_value'].iloc[0] == pytest.approx(1.1)
+
+
+def test_items_pass_through_without_a_store():
+    stats = get_crawler().stats
+    pipeline = StorePipeline(stats)
+    spider = SimpleNamespace()
+    pipeline.open_spider(spider)
+    item = observations('USD', DATES)
+    assert pipeline.process_item(item, spider) is item
+    assert pipeline.close_spider(spider) is None
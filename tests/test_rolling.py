@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from core.rolling import RollingStats, RollingWindow
+
+
+def prices(days=120, k=3, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2024-01-01', periods=days, name='date')
+    values = 50 + rng.standard_normal((days, k)).cumsum(axis=0)
+    return pd.DataFrame(values, index=dates, columns=[f's{i}_value' for i in range(k)])
+
+
+def assert_matches_pandas(result, df):
+    changes = df.pct_change(fill_method=None)
+    for column in df.columns:
+        for window in (7, 30):
+            pd.testing.assert_series_equal(result[f'{column}_mean_{window}'], df[column].rolling(window).mean(),
+                                           check_names=False, rtol=1e-9)
+        for window in (20, 30):
+            pd.testing.assert_series_equal(result[f'{column}_volatility_{window}'],
+                                           changes[column].rolling(window).std(),
+                                           check_names=False, rtol=1e-9, atol=1e-12)
+
+
+def test_rolling_stats_match_pandas():
+    df = prices()
+    stats = RollingStats(df.columns)
+    result = pd.concat([stats.update(df.iloc[:40]), stats.update(df.iloc[40:])])
+    assert_matches_pandas(result, df)
+
+
+def test_rolling_stats_recover_after_nan_and_zero():
+    df = prices()
+    df.iloc[20, 1] = np.nan
+    df.iloc[50, 2] = 0
+    result = RollingStats(df.columns).update(df)
+    assert_matches_pandas(result, df)
+
+
+def test_state_round_trip(tmp_path):
+    df = prices()
+    stats = RollingStats(df.columns)
+    stats.update(df.iloc[:60])
+    stats.save(tmp_path / 'state.json')
+    loaded = RollingStats.load(tmp_path / 'state.json')
+
+    pd.testing.assert_frame_equal(loaded.update(df.iloc[60:]), stats.update(df.iloc[60:]))
+
+
+def test_rewind_rebuilds_the_last_day():
+    df = prices()
+    stats = RollingStats(df.columns)
+    stats.update(df)
+
+    revised = df.copy()
+    revised.iloc[-1, 0] += 1
+    assert stats.rewind(df.index[-1])
+    assert stats.last_date == df.index[-2]
+    rebuilt = stats.update(revised)
+
+    expected = RollingStats(df.columns).update(revised).iloc[-1:]
+    pd.testing.assert_frame_equal(rebuilt, expected, rtol=1e-9)
+
+
+def test_rewind_refuses_older_days():
+    df = prices()
+    stats = RollingStats(df.columns)
+    stats.update(df)
+    assert not stats.rewind(df.index[-5])
+    # a date after the last one needs no rewind
+    assert stats.rewind(df.index[-1] + pd.Timedelta(days=1))
+
+
+def test_window_matches_numpy():
+    rng = np.random.default_rng(1)
+    rows = rng.standard_normal((50, 4))
+    rolling = RollingWindow(10, 4)
+    for row in rows:
+        rolling.push(row)
+
+    last = rows[-10:]
+    np.testing.assert_allclose(rolling.means(), last.mean(axis=0))
+    np.testing.assert_allclose(rolling.cov(), np.cov(last, rowvar=False))
+    np.testing.assert_allclose(rolling.corr(), np.corrcoef(last, rowvar=False))
@@ -0,0 +1,76 @@
+import threading
+import time
+
+from core.runner import run_sources
+
+
+def slow(seconds, result=None, done=None):
+    def fetch():
+        time.sleep(seconds)
+        if done is not None:
+            done.set()
+        return result
+    return fetch
+
+
+def failing():
+    raise ValueError('no data')
+
+
+def by_name(report):
+    return {source['name']: source for source in report['sources']}
+
+
+def test_sources_run_concurrently():
+    tasks = {name: slow(0.2, name) for name in ('a', 'b', 'c')}
+    results, report = run_sources(tasks, timeout=5)
+
+    assert results == {'a': 'a', 'b': 'b', 'c': 'c'}
+    assert report['mode'] == 'concurrent'
+    assert report['total'] < 0.5
+
+
+def test_failing_and_slow_sources_do_not_stop_the_others():
+    tasks = {'slow': slow(2, 'late'), 'broken': failing, 'fast': slow(0, 'ok')}
+    results, report = run_sources(tasks, timeout=0.3)
+
+    sources = by_name(report)
+    assert results == {'slow': None, 'broken': None, 'fast': 'ok'}
+    assert sources['slow']['status'] == 'timeout'
+    assert sources['broken']['status'] == 'error'
+    assert 'no data' in sources['broken']['error']
+    assert sources['fast']['status'] == 'ok'
+    assert report['total'] < 1
+
+
+def test_deadlines_are_absolute_from_the_start():
+    # the second source is waited for after the first one timed out, but its deadline
+    # counts from the start, so the run is not 2 x the timeout
+    tasks = {'a': slow(2), 'b': slow(2)}
+    _, report = run_sources(tasks, timeout=0.3)
+    assert report['total'] < 0.6
+
+
+def test_timeout_per_source():
+    tasks = {'quick': slow(0.3, 'quick'), 'patient': slow(0.3, 'patient')}
+    results, _ = run_sources(tasks, timeout={'quick': 0.1, 'patient': 2})
+    assert results == {'quick': None, 'patient': 'patient'}
+
+
+def test_drained_source_is_waited_for_after_its_timeout():
+    done = threading.Event()
+    results, report = run_sources({'writer': slow(0.5, 'written', done)}, timeout=0.1, drain={'writer'})
+
+    assert done.is_set()
+    assert results['writer'] == 'written'
+    assert by_name(report)['writer']['status'] == 'timeout'
+
+
+def test_sequential_mode():
+    order = []
+    tasks = {name: lambda name=name: order.append(name) or name for name in ('a', 'b')}
+    results, report = run_sources(tasks, concurrent=False)
+
+    assert order == ['a', 'b']
+    assert results == {'a': 'a', 'b': 'b'}
+    assert report['mode'] == 'sequential'
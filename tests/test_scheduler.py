@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+import pytest
+
+from core.scheduler import Cadence, Scheduler
+from core.sources import Source, register_fetcher
+from core.storage import ArrowStore
+
+
+BERLIN = ZoneInfo('Europe/Berlin')
+# what the test fetcher returns on each call, and the revalidate flag of each call
+REPLIES = []
+CALLS = []
+
+
+@register_fetcher('test_scheduled')
+def fetch(sources, start_dates, api_key, timeout, store=None, revalidate=False):
+    CALLS.append(revalidate)
+    reply = REPLIES.pop(0)
+    if isinstance(reply, Exception):
+        raise reply
+    # like the real fetchers, only the rows from the start date on
+    start = start_dates.get(sources[0].key)
+    return {sources[0].key: reply if start is None else reply.loc[pd.Timestamp(start):]}
+
+
+def prices(days):
+    dates = pd.bdate_range('2024-01-01', periods=days, name='date')
+    return pd.DataFrame({'t_value': [float(day) for day in range(days)]}, index=dates)
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    REPLIES.clear()
+    CALLS.clear()
+    source = Source('T', 'test_scheduled', '', 't', cadence='weekdays 16:00 Europe/Berlin')
+    return Scheduler(store=ArrowStore(str(tmp_path / 'store')), sources=[source], margin=0,
+                     retries=2, backoff=60, jitter=0.2, concurrent=False)
+
+
+def test_cadence_next_run():
+    cadence = Cadence('weekdays 16:00 Europe/Berlin')
+    # friday after the publication, then the weekend
+    friday = datetime(2024, 5, 17, 17, 0, tzinfo=BERLIN)
+    assert cadence.next_run(friday) == datetime(2024, 5, 20, 16, 0, tzinfo=BERLIN)
+    assert cadence.next_run(friday - timedelta(hours=2), margin=timedelta(minutes=30)) == \
+        datetime(2024, 5, 17, 16, 30, tzinfo=BERLIN)
+    assert Cadence('daily').next_run(datetime(2024, 5, 18, 12, 0, tzinfo=ZoneInfo('UTC'))) == \
+        datetime(2024, 5, 19, 0, 0, tzinfo=ZoneInfo('UTC'))
+
+
+def test_unknown_cadence_is_rejected():
+    with pytest.raises(ValueError):
+        Cadence('hourly')
+
+
+def test_sources_of_a_cadence_run_together(tmp_path):
+    sources = [Source(name, 'test_scheduled', '', name, cadence=cadence)
+               for name, cadence in (('a', 'daily 10:00'), ('b', 'daily 10:00'), ('c', 'weekdays'))]
+    scheduler = Scheduler(store=ArrowStore(str(tmp_path / 'store')), sources=sources)
+    assert [[source.key for source in job.sources] for job in scheduler.jobs] == [['a', 'b'], ['c']]
+
+
+def test_retry_delay_doubles_with_jitter(scheduler):
+    for attempt, base in ((1, 60), (2, 120), (3, 240)):
+        delays = [scheduler.retry_delay(attempt) for _ in range(200)]
+        assert base * 0.8 <= min(delays) and max(delays) <= base * 1.2
+        # jittered, so retries of several schedulers don't line up
+        assert len(set(delays)) > 1
+
+
+def test_source_without_new_rows_is_retried_then_given_up(scheduler):
+    REPLIES.extend([prices(10), prices(10), prices(10)])
+    scheduler.schedule()
+    job = scheduler.jobs[0]
+    job.due = scheduler.now()
+
+    # the first run writes the rows
+    scheduler.run_pending()
+    assert job.attempt == 0
+    assert job.due.astimezone(BERLIN).strftime('%H:%M') == '16:00'
+
+    # the next publication has no new rows: retried with backoff, then waits for the next one
+    job.due = scheduler.now()
+    scheduler.run_pending()
+    assert job.attempt == 1
+    assert timedelta(seconds=40) < job.due - scheduler.now() <= timedelta(seconds=72)
+
+    job.due = scheduler.now()
+    REPLIES.append(prices(10))
+    scheduler.run_pending()
+    assert job.attempt == 2
+
+    job.due = scheduler.now()
+    scheduler.run_pending()
+    assert job.attempt == 0
+    assert job.due == job.cadence.next_run(scheduler.now(), scheduler.margin)
+    # retries ask the sources past their caches
+    assert CALLS == [False, False, True, True]
+
+
+def test_failed_source_is_retried(scheduler):
+    REPLIES.extend([ValueError('not published'), prices(5)])
+    scheduler.schedule()
+    job = scheduler.jobs[0]
+    job.due = scheduler.now()
+
+    scheduler.run_pending()
+    assert job.attempt == 1
+    job.due = scheduler.now()
+    scheduler.run_pending()
+    assert job.attempt == 0
+    assert scheduler.store.last_dates()['t'] == prices(5).index[-1]
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from scrape_finance.sdmx import (iter_observations, observations_to_frame, parse_currencies,
+                                 parse_history, wide_frame)
+
+
+def sdmx(currency, observations):
+    obs = ''.join(f'<exr:Obs TIME_PERIOD="{date}" OBS_VALUE="{value}" OBS_STATUS="A" OBS_CONF="F"/>'
+                  for date, value in observations)
+    return (f'<?xml version="1.0" encoding="UTF-8"?>'
+            f'<message:GenericData xmlns:message="http://www.SDMX.org/resources/SDMXML/schemas/v2_0/message" '
+            f'xmlns:exr="http://www.ecb.europa.eu/vocabulary/stats/exr/1">'
+            f'<message:DataSet><exr:DataSet><exr:Series FREQ="D" CURRENCY="{currency}" CURRENCY_DENOM="EUR">'
+            f'{obs}</exr:Series></exr:DataSet></message:DataSet></message:GenericData>').encode()
+
+
+OBSERVATIONS = [('2024-01-02', '1.0956'), ('2024-01-03', '1.0919'), ('2024-01-04', 'NaN'),
+                ('2024-01-05', '1.0921'), ('2024-01-08', '1.0946')]
+
+
+def test_iter_observations_yields_chunks():
+    chunks = list(iter_observations(sdmx('USD', OBSERVATIONS), chunk_size=2))
+
+    assert [len(dates) for _, dates, _ in chunks] == [2, 2, 1]
+    assert {currency for currency, _, _ in chunks} == {'USD'}
+    dates = [date for _, chunk, _ in chunks for date in chunk]
+    values = [value for _, _, chunk in chunks for value in chunk]
+    assert dates == [date for date, _ in OBSERVATIONS]
+    assert values == [value for _, value in OBSERVATIONS]
+
+
+def test_parse_history():
+    df = parse_history(sdmx('JPY', OBSERVATIONS))
+
+    assert list(df.columns) == ['jpy_value']
+    assert df.index.name == 'date'
+    # newest first, unparseable values are NaN
+    assert df.index[0] == pd.Timestamp('2024-01-08')
+    assert df.loc['2024-01-02', 'jpy_value'] == 1.0956
+    assert np.isnan(df.loc['2024-01-04', 'jpy_value'])
+
+
+def test_start_date_drops_older_observations():
+    dates, values = zip(*OBSERVATIONS)
+    df = observations_to_frame(dates, values, 'usd', start_date='2024-01-04')
+    assert list(df.index) == list(pd.to_datetime(['2024-01-08', '2024-01-05', '2024-01-04']))
+
+
+def test_wide_frame_aligns_currencies():
+    usd = observations_to_frame(['2024-01-02', '2024-01-03'], ['1.1', '1.2'], 'usd')
+    jpy = observations_to_frame(['2024-01-03'], ['155.0'], 'jpy')
+    df = wide_frame([usd, jpy, None])
+
+    assert list(df.columns) == ['usd_value', 'jpy_value']
+    assert len(df) == 2
+    assert np.isnan(df.loc['2024-01-02', 'jpy_value'])
+    assert wide_frame([]).empty
+
+
+def test_parse_currencies():
+    assert parse_currencies('USD, jpy') == ['usd', 'jpy']
+    assert parse_currencies(['GBP']) == ['gbp']
+    assert 'chf' in parse_currencies('all')
@@ -0,0 +1,43 @@
+import pytest
+
+import core.data_handler  # registers the fetchers
+from core.sources import load_sources, parse_params
+
+
+HEADER = 'name,fetcher,target,params,key,cadence\n'
+
+
+def write(tmp_path, rows):
+    path = tmp_path / 'urls.csv'
+    path.write_text(HEADER + ''.join(f'{row}\n' for row in rows))
+    return str(path)
+
+
+def test_load_sources(tmp_path):
+    sources = load_sources(write(tmp_path, [
+        'ECB,scrapy,,currency=usd;dtype=float32,currency,weekdays 16:00 Europe/Berlin',
+        'VIX,yfinance,^VIX,,vix,']))
+
+    ecb, vix = sources
+    assert ecb.schema.columns == ['usd_value']
+    assert vix.target == '^VIX'
+    assert vix.cadence == 'daily'
+
+
+def test_unknown_fetcher_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match='unknown fetcher'):
+        load_sources(write(tmp_path, ['X,ftp,host,,x,']))
+
+
+def test_scrapy_source_takes_no_target(tmp_path):
+    with pytest.raises(ValueError, match='no target'):
+        load_sources(write(tmp_path, ['ECB,scrapy,https://www.ecb.europa.eu/usd.xml,currency=all,currency,']))
+
+
+def test_parse_params():
+    assert parse_params('data_path=data; column=brent_value') == {'data_path': 'data', 'column': 'brent_value'}
+    assert parse_params('') == {}
+
+
+def test_repository_sources_load():
+    assert {source.key for source in load_sources()} == {'currency', 'brent', 'BZ_oil', 'vix'}
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.data_handler import HdfStore
+from core.storage import ArrowStore
+
+
+DATES = pd.bdate_range('2024-01-01', periods=80, name='date')
+COLUMNS = {'brent': 'brent_value', 'usd': 'usd_value', 'vix': 'vix_value'}
+
+
+def series(name, dates=DATES):
+    rng = np.random.default_rng(list(COLUMNS).index(name))
+    values = 50 + rng.standard_normal(len(DATES)).cumsum()
+    return pd.DataFrame({COLUMNS[name]: values[:len(dates)]}, index=dates)
+
+
+@pytest.fixture(params=['hdf', 'arrow'])
+def make_store(request, tmp_path):
+    def make(name='store'):
+        if request.param == 'hdf':
+            return HdfStore(str(tmp_path / f'{name}.h5'))
+        return ArrowStore(str(tmp_path / name))
+    return make
+
+
+def test_saving_twice_is_a_noop(make_store):
+    store = make_store()
+    df = series('brent')
+    assert store.save({'name': 'brent', 'df': df}) == DATES[0]
+    revision = store.revision()
+
+    assert store.save({'name': 'brent', 'df': df}) is None
+    assert store.revision() == revision
+    stored = store.load(series=['brent'])[0]
+    assert len(stored) == len(df)
+
+
+def test_revised_value_updates_the_stored_row(make_store):
+    store = make_store()
+    df = series('brent')
+    store.save({'name': 'brent', 'df': df})
+
+    revised = df.iloc[10:12].copy()
+    revised.iloc[0, 0] = 99.5
+    assert store.save({'name': 'brent', 'df': revised}) == DATES[10]
+
+    stored = store.load(series=['brent'])[0]
+    assert len(stored) == len(df)
+    assert stored.loc[DATES[10], 'brent_value'] == 99.5
+    assert stored.loc[DATES[11], 'brent_value'] == df.iloc[11, 0]
+
+
+def test_nan_does_not_erase_a_stored_value(make_store):
+    store = make_store()
+    df = series('brent')
+    store.save({'name': 'brent', 'df': df})
+
+    gap = df.iloc[5:7].copy()
+    gap.iloc[:, 0] = np.nan
+    assert store.save({'name': 'brent', 'df': gap}) is None
+
+    stored = store.load(series=['brent'])[0]
+    assert stored.loc[DATES[5], 'brent_value'] == df.iloc[5, 0]
+
+
+
+def revised(name, df):
+    """the usd series with a revision of its second to last day"""
+    if name == 'usd' and len(df) > 1:
+        df = df.copy()
+        df.iloc[-2, 0] += 0.25
+    return df
+
+
+def build_incrementally(store):
+    """saves the history but the last 3 days, then those days one source at a time,
+    each followed by an update of the derived tables"""
+    for name in COLUMNS:
+        store.save({'name': name, 'df': series(name, DATES[:-3])})
+    store.update_derived()
+    for end in range(len(DATES) - 2, len(DATES) + 1):
+        for name in COLUMNS:
+            df = series(name, DATES[:end])
+            if end == len(DATES):
+                df = revised(name, df)
+            store.update_derived(since=store.save({'name': name, 'df': df.iloc[-2:]}))
+    return store
+
+
+def build_at_once(store):
+    for name in COLUMNS:
+        store.save({'name': name, 'df': revised(name, series(name))})
+    store.update_derived()
+    return store
+
+
+def test_incremental_combined_equals_full_rebuild(make_store):
+    store = build_incrementally(make_store('incremental'))
+    rebuilt = build_at_once(make_store('rebuilt'))
+    pd.testing.assert_frame_equal(store.load_combined(), rebuilt.load_combined())
+
+
+def test_combined_is_forward_filled(make_store):
+    store = make_store()
+    store.save({'name': 'brent', 'df': series('brent')})
+    # usd misses a day in the middle
+    store.save({'name': 'usd', 'df': series('usd').drop(DATES[40])})
+    store.update_derived()
+
+    combined = store.load_combined()
+    assert list(combined.columns) == ['brent_value', 'usd_value']
+    assert len(combined) == len(DATES)
+    assert combined.loc[DATES[40], 'usd_value'] == combined.loc[DATES[39], 'usd_value']
+
+
+def test_incremental_rolling_stats_equal_full_rebuild(make_store):
+    store = build_incrementally(make_store('incremental'))
+    rebuilt = build_at_once(make_store('rebuilt'))
+    pd.testing.assert_frame_equal(store.load_rolling_stats(), rebuilt.load_rolling_stats(),
+                                  check_exact=False, rtol=1e-9, atol=1e-12)
+
+
+def test_column_added_by_a_migration_is_backfilled(make_store):
+    from core.data_handler import scrape_orchestrator
+    from core.sources import Source, register_fetcher
+
+    wide = pd.concat([series('usd'), series('brent').rename(columns={'brent_value': 'jpy_value'})], axis=1)
+    asked = []
+
+    @register_fetcher('test_currencies', columns=lambda params: params['columns'].split(','))
+    def fetch(sources, start_dates, api_key, timeout, store=None, revalidate=False):
+        start = start_dates.get('currency')
+        asked.append(start)
+        return {'currency': wide.loc[pd.Timestamp(start):, sources[0].schema.columns]}
+
+    store = make_store()
+    store.save({'name': 'currency', 'df': wide.iloc[:40][['usd_value']]})
+    source = Source('ECB', 'test_currencies', '', 'currency', params={'columns': 'usd_value,jpy_value'})
+
+    # the first run widens the table, jpy has no history yet
+    scrape_orchestrator(None, sources=[source], store=store)
+    assert asked[-1] == (DATES[39] + pd.Timedelta(days=1)).date()
+    assert store.missing() == {'currency': {'jpy_value': DATES[0]}}
+    assert store.load(series=['currency'])[0]['jpy_value'].isna().sum() == 40
+
+    # the next run collects it from the first stored date
+    scrape_orchestrator(None, sources=[source], store=store)
+    assert asked[-1] == DATES[0].date()
+    assert store.missing() == {}
+    stored = store.load(series=['currency'])[0].sort_index()
+    pd.testing.assert_frame_equal(stored, wide, check_names=False, check_freq=False, check_index_type=False)
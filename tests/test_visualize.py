@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('matplotlib')
+
+from core.storage import ArrowStore
+from visualize import VisualizeBrent
+
+
+SERIES = {'BZ_oil': 'BZ_oil_value', 'brent': 'brent_value', 'currency': 'usd_value', 'vix': 'vix_value'}
+
+
+def save_days(store, dates):
+    rng = np.random.default_rng(len(dates))
+    for name, column in SERIES.items():
+        df = pd.DataFrame({column: 50 + rng.standard_normal(len(dates)).cumsum()}, index=dates)
+        store.save({'name': name, 'df': df})
+    store.update_derived()
+
+
+def test_cached_frames_follow_the_store(tmp_path):
+    store = ArrowStore(str(tmp_path / 'store'))
+    dates = pd.bdate_range('2024-01-01', periods=60, name='date')
+    save_days(store, dates[:50])
+
+    charts = VisualizeBrent(store=store)
+    assert len(charts.combined_df) == 50
+    normalized = charts.normalize_dfs()
+    # served from the cache while the store is unchanged
+    assert charts.normalize_dfs() is normalized
+
+    save_days(store, dates[50:])
+    assert len(charts.combined_df) == 60
+    assert len(charts.normalize_dfs()) == 60
+    assert len(charts.matrix) == 60
@@ -1,23 +1,96 @@
 
-from core.data_handler import load_from_hdf
+from core.data_handler import HdfStore
+from core.analytics import SeriesMatrix, RollingCorrelation
+from core.sources import load_sources
+import numpy as np
 import pandas as pd
 
 import matplotlib.pyplot as plt
 import seaborn as sns
 
 class VisualizeBrent:
-    def __init__(self):
-        self.combined_df = self.combine_data()
-        self.normalized_df = self.normalize_dfs()
-        self.rolling_weekly = self.rolling_average()
-        self.rolling_monthly = self.rolling_average(window=30)
+    """charts for the stored indexes.
+    the data and every frame derived from it (normalized values, returns, rolling
+    windows, correlations) are computed on first use and cached by their parameters,
+    so drawing several charts computes each transform once. the transforms run on
+    the data as one numpy matrix (core.analytics.SeriesMatrix).
+    the cache is dropped when the store was written since the data was loaded.
+      args: 
+        start, end: optional dates, only this window is loaded from the store
+        store: the storage backend, Default=None, the hd5 file"""
+    def __init__(self, start=None, end=None, store=None):
+        self.store = store or HdfStore()
+        self.start = start
+        self.end = end
+        self._cache = {}
+        self._revision = None
+        # the charted columns, the combined table also holds every other ECB currency
+        self.columns = ['BZ_oil_value', 'brent_value', 'usd_value', 'vix_value']
         self.display_labels = ['BZ Futures', 'Brent Crude', 'EUR/USD', 'VIX Index']
         self.display_colors = ['black', 'violet', 'mediumblue', 'lightseagreen']
         self.fig = None
     
+    def _cached(self, key, compute):
+        """returns the frame cached under key, computes it on first access"""
+        self.refresh()
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def _load(self):
+        self._revision = self.store.revision()
+        matrix = SeriesMatrix.from_frame(self.combine_data())
+        # the frame is a view of the matrix, the data is held once
+        self._cache['matrix'] = matrix
+        return matrix.to_frame()
+
+    @property
+    def combined_df(self):
+        return self._cached('combined', self._load)
+
+    @combined_df.setter
+    def combined_df(self, df):
+        # new data, every derived frame is stale
+        self._cache = {'combined': df}
+
+    def refresh(self):
+        """drops the cached data and derived frames if the store was written since they were loaded.
+        runs before every cache access, so a long-lived instance picks up new data"""
+        if self._revision is not None and self.store.revision() != self._revision:
+            self._cache = {}
+            self._revision = None
+
+    @property
+    def matrix(self):
+        """the data as a SeriesMatrix"""
+        self.refresh()
+        if 'matrix' not in self._cache:
+            self._cache['matrix'] = SeriesMatrix.from_frame(self.combined_df)
+        return self._cache['matrix']
+
+    @property
+    def normalized_df(self):
+        return self.normalize_dfs()
+
+    @property
+    def rolling_weekly(self):
+        return self.rolling_average()
+
+    @property
+    def rolling_monthly(self):
+        return self.rolling_average(window=30)
+
     def combine_data(self):
         
-        self.df_list = load_from_hdf()
+        # the scrape orchestrator keeps the joined and filled table in the store
+        combined_df = self.store.load_combined(start=self.start, end=self.end)
+        if combined_df is not None and set(self.columns).issubset(combined_df.columns):
+            return combined_df[self.columns]
+
+        # series stored by older runs (e.g. 'close_^VIX') are read in the columns of their schema
+        schemas = {source.key: source.schema for source in load_sources()}
+        self.df_list = [schemas[name].apply(df) if name in schemas else df
+                        for name, df in zip(self.store.series(), self.store.load(start=self.start, end=self.end))]
         # join al dfs
         combined_df = self.df_list[0].join(
             self.df_list[1:], how='outer'
@@ -27,24 +100,81 @@ class VisualizeBrent:
         combined_df.ffill(inplace=True)
         combined_df.bfill(inplace=True)
         combined_df.sort_index(ascending=True, inplace=True)
-        combined_df = combined_df[~combined_df.index.duplicated(keep='first')]
-        return combined_df
+        return combined_df[self.columns]
     
+    def _stored_rolling(self, suffix):
+        """rolling statistic kept up to date by the scrape orchestrator, 
+        as a frame shaped like combined_df. None if it is not stored"""
+        rolling = self._cached('stored_rolling', lambda: self.store.load_rolling_stats(start=self.start, end=self.end))
+        if rolling is None:
+            return None
+        columns = [f'{col}_{suffix}' for col in self.combined_df.columns]
+        if not set(columns).issubset(rolling.columns):
+            return None
+        df = rolling[columns].reindex(self.combined_df.index)
+        df.columns = self.combined_df.columns
+        return df
+
     def normalize_dfs(self, factor=100):
         """ normalizes the prices of the different indexes."""
-        offset_value = self.combined_df - self.combined_df.min()
-        range = self.combined_df.max() - self.combined_df.min()
+        def compute():
+            return self.matrix.normalized(factor).to_frame()
 
-        return (offset_value / range) * factor
+        return self._cached(('normalized', factor), compute)
         
         
     def rolling_average(self, window=7, normalized=True):
-        if normalized:    
-            rolling = self.normalized_df.rolling(window=window).mean()
-        else:
-            rolling = self.combined_df.rolling(window=window).mean()
+        def compute():
+            stored = self._stored_rolling(f'mean_{window}')
+            if stored is not None:
+                if not normalized:
+                    return stored
+                # min-max scaling is linear, so it can be applied to the stored means
+                low, high = self.combined_df.min(), self.combined_df.max()
+                return (stored - low) / (high - low) * 100
+            matrix = self.matrix.normalized() if normalized else self.matrix
+            return matrix.rolling_mean(window).to_frame()
         
-        return rolling
+        return self._cached(('rolling_mean', window, normalized), compute)
+
+    def daily_change(self):
+        """daily % change of every index"""
+        return self._cached('daily_change', lambda: self._returns().to_frame())
+
+    def _returns(self):
+        return self._cached('returns', self.matrix.returns)
+
+    def rolling_volatility(self, window=20):
+        """rolling std of the daily % change"""
+        def compute():
+            stored = self._stored_rolling(f'volatility_{window}')
+            if stored is not None:
+                return stored
+            return self._returns().rolling_std(window).to_frame()
+
+        return self._cached(('rolling_std', window), compute)
+
+    def correlation(self, volatility_window=None):
+        """correlation matrix of the values, or of their rolling volatility
+        when volatility_window is given"""
+        def compute():
+            if volatility_window is None:
+                return self.matrix.corr()
+            return SeriesMatrix.from_frame(self.rolling_volatility(volatility_window)).corr()
+
+        return self._cached(('corr', volatility_window), compute)
+
+    def rolling_correlation(self, window=30):
+        """correlation matrices of the daily % change for the window ending on every date,
+        see core.analytics.RollingCorrelation"""
+        return self._cached(('rolling_corr', window), lambda: RollingCorrelation.compute(self.matrix, window))
+
+    def correlation_alerts(self, window=30, change=0.4, days=20, since=None):
+        """the pairs whose rolling correlation moved by at least change within days,
+        on the last date or on every date from since"""
+        alerts = self.rolling_correlation(window).alerts(change=change, days=days, since=since)
+        labels = dict(zip(self.columns, self.display_labels))
+        return alerts.replace({'a': labels, 'b': labels})
 
     @property
     def plot(self):
@@ -99,7 +229,7 @@ class VisualizeBrent:
     
     def heatmap_generator(self):
         """generates a correlation heatmap for all indexes through the entire time period"""
-        ax = sns.heatmap(self.combined_df.corr(), 
+        ax = sns.heatmap(self.correlation(), 
                          annot=True, 
                          cmap="crest", 
                          xticklabels=self.display_labels,
@@ -113,14 +243,8 @@ class VisualizeBrent:
     def heatmap_volatility(self):
         """generates a heatmap for the volatility of each of the indexes, 
         based on the std of the daily change, in relaton to the monthly-average"""
-        # daily changes
-        change = self.combined_df.pct_change()
-
-        # Rolling volatility for each column
-        rolling_vol = change.rolling(window=30).std()
-
-        # Correlation of volatility between assets
-        vol_corr = rolling_vol.corr()
+        # Correlation of the 30 days rolling volatility between assets
+        vol_corr = self.correlation(volatility_window=30)
         ax = sns.heatmap(vol_corr, 
                          annot=True, 
                          cmap="crest", 
@@ -130,25 +254,57 @@ class VisualizeBrent:
         plt.yticks(rotation=0) 
         plt.title('Volatility Correlation Heatmap')
         plt.show()
+        self.figure = ax
+        return self.figure
+
+    def heatmap_rolling(self, window=90, periods=4):
+        """correlation heatmaps of the daily % change over the window ending on periods dates,
+        spread evenly over the time period up to the last date, to show how the relations changed"""
+        rolling = self.rolling_correlation(window)
+        # the first full window ends window days in
+        ends = rolling.dates[window:]
+        dates = ends[np.linspace(0, len(ends) - 1, periods).round().astype(int)] if len(ends) else rolling.dates[-1:]
+
+        self.figure, axes = plt.subplots(ncols=len(dates), figsize=(5 * len(dates), 5), squeeze=False)
+        for n, (ax, date) in enumerate(zip(axes[0], dates)):
+            sns.heatmap(rolling.at(date), ax=ax, annot=True, fmt='.2f', cmap='crest', vmin=-1, vmax=1,
+                        cbar=False, linewidths=0.5,
+                        xticklabels=self.display_labels, yticklabels=self.display_labels if n == 0 else False)
+            ax.set_title(f'{window} days to {date.date()}')
+            ax.tick_params(axis='y', rotation=0)
+        self.figure.suptitle(f'Correlation of the daily % change, {window} days rolling')
+        return self.figure
+
+    def rolling_correlation_chart(self, window=90):
+        """the rolling correlation of the daily % change of every pair of indexes over time"""
+        rolling = self.rolling_correlation(window)
+        labels = dict(zip(self.columns, self.display_labels))
+
+        self.figure, ax = plt.subplots(figsize=(14, 8))
+        for a, b in rolling.pairs():
+            ax.plot(rolling.pair(a, b), label=f'{labels[a]} / {labels[b]}')
+        ax.axhline(0, color='grey', linewidth=0.5)
+        ax.set_ylim(-1, 1)
+        ax.legend(loc='lower left', shadow=True)
+        plt.title(f'Rolling Correlation of the daily % change, {window} days window', weight='bold')
+        plt.ylabel('Correlation')
+        plt.xlabel('Date')
         return self.figure
 
     def recent_volatility_brent(self):
         """get the recent volatility chart
         for each day in the past week, compared to the previous 20 days"""
-        #  calculate daily % change
-        df = self.combined_df[['brent_value']].sort_index()  
-        df['values'] = df.pct_change()
-
-        # claculate 20 days rolling average std for each day
-        df['rolling_volatility'] = df['values'].rolling(window=20).std()
+        # 20 days rolling std of the daily % change
+        df = self.rolling_volatility(window=20)[['brent_value']]
+        df = df.rename(columns={'brent_value': 'rolling_volatility'})
         # compare the last 7 days
-        recent_vol = df[['rolling_volatility']].dropna().iloc[-7:] * 100
+        recent_vol = df.dropna().iloc[-7:] * 100
 
         # plot
         fig, ax = plt.subplots( figsize=(14,8))#, layout='constrained')
 
         # position for ticker next to the last value
-        y_pos = recent_vol.iloc[-1] + 0.02
+        y_pos = recent_vol['rolling_volatility'].iloc[-1] + 0.02
         x_pos = recent_vol.index[-1]
         ax.text(x=x_pos,y=y_pos,s='Brent Crude', fontsize=12, color='violet', weight='bold')
         ax.plot(recent_vol, color='m')
@@ -167,10 +323,10 @@ class VisualizeBrent:
         #  calculate daily % change
         df = self.combined_df.sort_index()  
         print(f'original df: \n{df.tail(10)}')
-        change = df.pct_change()
+        change = self.daily_change()
         print(f'percent change: \n{change.tail(10)}')
         # claculate 20 days rolling average std for each day
-        rolling_vol = change.rolling(window=20).std()
+        rolling_vol = self.rolling_volatility(window=20)
         print(f'rolling volatility 20 days: \n{rolling_vol.tail(10)}')
         # compare the last 7 days
         recent_vol = rolling_vol.dropna().iloc[-7:] * 100
@@ -198,6 +354,7 @@ class VisualizeBrent:
         plt.ylabel('Volatility: (std of value), in %')
         plt.xlabel('Date')   
 
-visual = VisualizeBrent()
-plot = visual.recent_volatility_combined()
-plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    visual = VisualizeBrent()
+    plot = visual.recent_volatility_combined()
+    plt.show()
\ No newline at end of file